@@ -0,0 +1,250 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from task_manager import TaskManager
+
+class AsyncTaskManager:
+    def __init__(self, task_manager: TaskManager, durable: bool = True, delay: float = 0.0):
+        """
+        Asyncio front end for a TaskManager
+
+        Reads are answered from memory. Mutations are applied in memory on
+        the event loop and the file is written on a single worker thread;
+        writes requested while one is running are coalesced into the next.
+        Must be used from the event loop thread only. Use open() to load
+        the file without blocking the loop.
+
+        Args:
+            task_manager: TaskManager to wrap; its saves are taken over
+            durable: Mutations wait until a write covering them finished
+                (and raise if it failed); with False they return at once
+                and flush() waits for the disk
+            delay: Seconds to wait before each write, letting a burst of
+                mutations share it
+        """
+        self.task_manager = task_manager
+        self.durable = durable
+        self.delay = delay
+        self.writes = 0
+        self.last_error = None
+        self._loop = asyncio.get_running_loop()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="task-writer")
+        self._next_write = None  # future resolved by the write covering new changes
+        self._writer = None
+        self._batch_depth = 0
+        task_manager.save_handler = self._request_save
+
+    @classmethod
+    async def open(cls, data_file: str = "tasks.json", clock=None, **kwargs) -> 'AsyncTaskManager':
+        """Load a task file on the worker thread and wrap it"""
+        loop = asyncio.get_running_loop()
+        task_manager = await loop.run_in_executor(None, TaskManager, data_file, clock)
+        return cls(task_manager, **kwargs)
+
+    def _request_save(self):
+        """save_handler for the TaskManager: schedule a coalesced write"""
+        if self._next_write is None:
+            self._next_write = self._loop.create_future()
+        if self._writer is None or self._writer.done():
+            self._writer = self._loop.create_task(self._write_loop())
+
+    async def _write_loop(self):
+        while self._next_write is not None:
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            future, self._next_write = self._next_write, None
+            try:
+                await self._loop.run_in_executor(self._executor, self.task_manager.write_tasks)
+            except Exception as e:
+                print(f"Error saving tasks: {e}")
+                self.last_error = e
+                future.set_exception(e)
+                future.exception()  # non-durable callers never await it
+            else:
+                self.writes += 1
+                self.last_error = None
+                future.set_result(None)
+
+    async def _committed(self):
+        """Wait for the write covering the change just made, if durable"""
+        future = self._next_write
+        if self.durable and not self._batch_depth and future is not None:
+            await asyncio.shield(future)
+
+    @asynccontextmanager
+    async def batch(self):
+        """
+        Apply several mutations with one write
+
+        Usage:
+            async with store.batch():
+                for description in descriptions:
+                    await store.add_task(description)
+        """
+        self._batch_depth += 1
+        try:
+            with self.task_manager.batch():
+                yield self
+        finally:
+            self._batch_depth -= 1
+        await self._committed()
+
+    async def flush(self) -> bool:
+        """Wait until every change made so far is written; False if the last write failed"""
+        while self._writer is not None and not self._writer.done():
+            await asyncio.shield(self._writer)
+        return self.last_error is None
+
+    async def close(self):
+        """Finish pending writes and release the worker thread"""
+        await self.flush()
+        self.task_manager.save_handler = None
+        self._executor.shutdown(wait=False)
+
+    async def load_tasks(self):
+        """Reload the file, reading and parsing on the worker thread"""
+        tasks = await self._loop.run_in_executor(self._executor, self.task_manager.read_tasks)
+        self.task_manager.load_tasks(tasks)
+
+    # Mutations
+
+    async def add_task(self, description: str, due_date: Optional[datetime] = None,
+                       priority: str = "Medium", reminders: Optional[Dict] = None,
+                       recurrence: Optional[Dict] = None, estimate: Optional[int] = None,
+                       tags: Optional[List[str]] = None) -> str:
+        """Add a new task, returns its id"""
+        task_id = self.task_manager.add_task(description, due_date, priority, reminders,
+                                             recurrence, estimate=estimate, tags=tags)
+        await self._committed()
+        return task_id
+
+    async def update_task(self, task_id: str, description: Optional[str] = None,
+                          due_date: Optional[datetime] = None, priority: Optional[str] = None,
+                          reminders: Optional[Dict] = None,
+                          recurrence: Optional[Dict] = None,
+                          estimate: Optional[int] = None,
+                          tags: Optional[List[str]] = None) -> bool:
+        """Update an existing task"""
+        if not self.task_manager.update_task(task_id, description, due_date, priority,
+                                             reminders, recurrence, estimate, tags):
+            return False
+        await self._committed()
+        return True
+
+    async def delete_task(self, task_id: str) -> bool:
+        """Delete a task"""
+        if not self.task_manager.delete_task(task_id):
+            return False
+        await self._committed()
+        return True
+
+    async def mark_complete(self, task_id: str) -> bool:
+        """Mark a task as completed"""
+        if not self.task_manager.mark_complete(task_id):
+            return False
+        await self._committed()
+        return True
+
+    async def mark_incomplete(self, task_id: str) -> bool:
+        """Mark a task as incomplete"""
+        if not self.task_manager.mark_incomplete(task_id):
+            return False
+        await self._committed()
+        return True
+
+    async def add_dependency(self, task_id: str, blocker_id: str) -> bool:
+        """Make a task wait for another one (ValueError on a cycle)"""
+        if not self.task_manager.add_dependency(task_id, blocker_id):
+            return False
+        await self._committed()
+        return True
+
+    async def remove_dependency(self, task_id: str, blocker_id: str) -> bool:
+        """Stop a task waiting for another one"""
+        if not self.task_manager.remove_dependency(task_id, blocker_id):
+            return False
+        await self._committed()
+        return True
+
+    async def set_parent(self, task_id: str, parent_id: Optional[str]) -> bool:
+        """Move a task under another one, or to the top level with None"""
+        if not self.task_manager.set_parent(task_id, parent_id):
+            return False
+        await self._committed()
+        return True
+
+    async def import_tasks(self, tasks: Iterable[Dict], overwrite: bool = False) -> Dict[str, int]:
+        """Merge tasks deduplicated by id, with a single write"""
+        counts = self.task_manager.import_tasks(tasks, overwrite)
+        await self._committed()
+        return counts
+
+    async def set_rules(self, rules: Optional[List[Dict]]) -> int:
+        """Apply auto-tagging rules now and on every change (see rules.py)"""
+        changed = self.task_manager.set_rules(rules)
+        if changed:
+            await self._committed()
+        return changed
+
+    # Reads, served from memory
+
+    async def get_all_tasks(self) -> List[Dict]:
+        """Get all tasks"""
+        return self.task_manager.get_all_tasks()
+
+    async def get_pending_tasks(self) -> List[Dict]:
+        """Get all pending tasks"""
+        return self.task_manager.get_pending_tasks()
+
+    async def get_completed_tasks(self) -> List[Dict]:
+        """Get all completed tasks"""
+        return self.task_manager.get_completed_tasks()
+
+    async def get_overdue_tasks(self) -> List[Dict]:
+        """Get overdue tasks"""
+        return self.task_manager.get_overdue_tasks()
+
+    async def get_tasks_due_soon(self, hours: int = 24) -> List[Dict]:
+        """Get tasks due within specified hours"""
+        return self.task_manager.get_tasks_due_soon(hours)
+
+    async def search_tasks(self, query: str) -> List[Dict]:
+        """Search tasks by description"""
+        return self.task_manager.search_tasks(query)
+
+    async def get_actionable_tasks(self) -> List[Dict]:
+        """Get pending tasks that wait for nothing"""
+        return self.task_manager.get_actionable_tasks()
+
+    async def next_tasks(self, k: int = 5, actionable_only: bool = True) -> List[Dict]:
+        """Get the k pending tasks to do next, best first"""
+        return self.task_manager.next_tasks(k, actionable_only)
+
+    async def plan(self, until: Optional[datetime] = None) -> List[Dict]:
+        """Get the schedule of pending tasks in working hours (see planner.py)"""
+        return self.task_manager.planner.plan(until=until)
+
+    async def query_tasks(self, query: str) -> List[Dict]:
+        """Get the tasks matching a tag and status query (see tags.py)"""
+        return self.task_manager.query_tasks(query)
+
+    async def get_task_as_of(self, task_id: str, when: datetime) -> Optional[Dict]:
+        """Get a task as it was at a time, reading the history on a worker thread"""
+        await self._loop.run_in_executor(None, self.task_manager.history.load)
+        return self.task_manager.get_task_as_of(task_id, when)
+
+    async def get_tasks_as_of(self, when: datetime) -> List[Dict]:
+        """Get every task as it was at a time, reading the history on a worker thread"""
+        await self._loop.run_in_executor(None, self.task_manager.history.load)
+        return self.task_manager.get_tasks_as_of(when)
+
+    async def get_task_by_id(self, task_id: str) -> Optional[Dict]:
+        """Get a specific task by ID"""
+        return self.task_manager.get_task_by_id(task_id)
+
+    async def get_task_stats(self) -> Dict:
+        """Get task statistics"""
+        return self.task_manager.get_task_stats()
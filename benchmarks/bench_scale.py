@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Scaling benchmark for TaskManager and ReminderSystem
+
+Builds synthetic task files (see simulate.synthetic_tasks) of increasing
+size and times the core operations against each, along with the indexes
+built on the tasks (planner, tags, rules, history). Every (size, operation)
+pair runs in its own worker process, so the peak RSS reported for an
+operation is not inflated by the ones before it.
+
+Reports ops/s, p50/p99 latency and peak RSS as JSON; --compare flags
+operations that got slower than a previous report.
+
+Usage:
+    python benchmarks/bench_scale.py
+    python benchmarks/bench_scale.py --sizes 100,1000,10000,100000,1000000 --json scale.json
+    python benchmarks/bench_scale.py --ops search,overdue --compare scale.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from clock import VirtualClock
+from simulate import OBJECTS, VERBS, SimulatedReminderSystem, percentile, synthetic_tasks
+from task_manager import TaskManager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+OPERATIONS = ['load', 'save', 'add', 'search', 'overdue', 'stats', 'check_reminders',
+              'plan', 'replan', 'tag_count', 'rules', 'as_of']
+DEFAULT_SIZES = [100, 1000, 10000, 100000]
+TAGS = ["work", "home", "urgent", "errands", "someday"]
+
+# Start of the synthetic workload; the benchmark clock sits halfway in
+START = datetime(2025, 1, 6, 8, 0)
+DAYS = 14
+NOW = START + timedelta(days=DAYS / 2)
+
+def peak_rss_kb() -> Optional[int]:
+    """Peak resident set size of this process in KiB"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+def build_dataset(path: str, size: int, seed: int):
+    """Write a task file holding a snapshot of the synthetic workload at NOW"""
+    def tasks():
+        for spec in synthetic_tasks(size, START, DAYS, seed):
+            completed = spec['completed_at'] is not None and spec['completed_at'] <= NOW
+            yield {
+                'description': spec['description'],
+                'due_date': spec['due_date'],
+                'priority': spec['priority'],
+                'created_at': spec['created_at'],
+                'completed': completed,
+                'completed_at': spec['completed_at'] if completed else None,
+            }
+
+    task_manager = TaskManager(path, clock=VirtualClock(NOW))
+    task_manager.import_tasks(tasks())
+
+def operation(name: str, path: str, seed: int) -> Callable[[], None]:
+    """Set up one operation and return a callable running it once"""
+    clock = VirtualClock(NOW)
+    task_manager = TaskManager(path, clock=clock)
+    rng = random.Random(seed)
+
+    if name == 'load':
+        return task_manager.load_tasks
+    if name == 'save':
+        return task_manager.save_tasks
+    if name == 'add':
+        # add_task includes the synchronous save, as in the unbatched app
+        return lambda: task_manager.add_task(
+            f"{rng.choice(VERBS)} {rng.choice(OBJECTS)}",
+            NOW + timedelta(hours=rng.uniform(1, 96)), "Medium")
+    if name == 'search':
+        words = [word for phrase in VERBS + OBJECTS for word in phrase.split()]
+        return lambda: task_manager.search_tasks(rng.choice(words))
+    if name == 'overdue':
+        return task_manager.get_overdue_tasks
+    if name == 'stats':
+        return task_manager.get_task_stats
+    if name == 'check_reminders':
+        reminder_system = SimulatedReminderSystem(task_manager, clock=clock)
+
+        def check():
+            clock.advance(60)
+            reminder_system.check_reminders()
+        return check
+    if name == 'plan':
+        # The whole schedule from scratch, as after a reload
+        planner = task_manager.planner
+
+        def plan():
+            planner.rebuild()
+            planner.plan()
+        return plan
+    if name == 'replan':
+        # One change, then the week ahead, which only replans from the change on
+        planner = task_manager.planner
+        planner.plan()
+        ids = [task['id'] for task in task_manager.get_pending_tasks()]
+        task_manager.save_handler = lambda: None  # time the planner, not the save
+
+        def replan():
+            task_manager.update_task(rng.choice(ids),
+                                     due_date=NOW + timedelta(hours=rng.uniform(1, 96)))
+            planner.plan(until=NOW + timedelta(days=7))
+        return replan
+    if name == 'tag_count':
+        with task_manager.batch():
+            for task in list(task_manager.tasks):
+                task_manager.update_task(task['id'], tags=rng.sample(TAGS, 2))
+        task_manager.tag_index
+        return lambda: task_manager.tag_index.count("tag:work AND tag:urgent AND NOT completed")
+    if name == 'rules':
+        # Compiling 301 rules and applying them to every task
+        words = [word for phrase in VERBS + OBJECTS for word in phrase.split()]
+        rules = [{'name': f"rule {i}", 'when': {'contains': rng.sample(words, 2)},
+                  'then': {'tags': [f"r{i}"]}} for i in range(300)]
+        rules.append({'name': "soon", 'when': {'due_within': 1440, 'priority': "Low"},
+                      'then': {'priority': "Medium"}})
+        return lambda: task_manager.set_rules(rules)
+    if name == 'as_of':
+        # A task looked up at random times in a 5000 version chain
+        from history import history_path
+        if os.path.exists(history_path(path)):
+            os.remove(history_path(path))  # left by a smaller size
+        task_manager.history.load()
+        task_id = task_manager.tasks[0]['id']
+        with task_manager.batch():
+            for step in range(5000):
+                clock.advance(60)
+                task_manager.update_task(task_id, description=f"Edited {step}")
+        return lambda: task_manager.get_task_as_of(
+            task_id, NOW + timedelta(minutes=rng.uniform(0, 5000)))
+    raise ValueError(f"Unknown operation: {name}")
+
+def run_worker(name: str, path: str, size: int, seed: int,
+               min_time: float, max_iterations: int) -> Dict:
+    """Time one operation in this process"""
+    rss_before = peak_rss_kb()
+    run = operation(name, path, seed)
+    rss_setup = peak_rss_kb()
+
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < max_iterations:
+        begin = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - begin)
+        if time.perf_counter() - started >= min_time:
+            break
+
+    timings.sort()
+    total = sum(timings)
+    return {
+        'size': size,
+        'op': name,
+        'iterations': len(timings),
+        'ops_per_sec': round(len(timings) / total, 2) if total else None,
+        'mean_ms': round(total / len(timings) * 1000, 4),
+        'p50_ms': round(percentile(timings, 50) * 1000, 4),
+        'p99_ms': round(percentile(timings, 99) * 1000, 4),
+        'max_ms': round(timings[-1] * 1000, 4),
+        'rss_before_kb': rss_before,
+        'rss_after_setup_kb': rss_setup,
+        'peak_rss_kb': peak_rss_kb(),
+    }
+
+def git_commit() -> Optional[str]:
+    """Current commit of the repository, if available"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results: List[Dict], baseline_path: str, threshold: float) -> List[Dict]:
+    """Find operations whose p50 grew by more than threshold versus a baseline"""
+    with open(baseline_path, 'r', encoding='utf-8') as file:
+        baseline = {(entry['size'], entry['op']): entry for entry in json.load(file)['results']}
+    regressions = []
+    for entry in results:
+        before = baseline.get((entry['size'], entry['op']))
+        if before and before['p50_ms'] > 0:
+            ratio = entry['p50_ms'] / before['p50_ms']
+            if ratio > threshold:
+                regressions.append({'size': entry['size'], 'op': entry['op'],
+                                    'p50_ms': entry['p50_ms'], 'baseline_p50_ms': before['p50_ms'],
+                                    'ratio': round(ratio, 2)})
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="TaskManager and ReminderSystem scaling benchmark")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma separated task counts (default: %(default)s)")
+    parser.add_argument("--ops", default=",".join(OPERATIONS),
+                        help="comma separated operations (default: all)")
+    parser.add_argument("--seed", type=int, default=0, help="workload random seed")
+    parser.add_argument("--min-time", type=float, default=1.0,
+                        help="seconds to keep repeating each operation")
+    parser.add_argument("--max-iterations", type=int, default=1000,
+                        help="upper bound on repetitions per operation")
+    parser.add_argument("--json", metavar="PATH", help="write the report to a JSON file")
+    parser.add_argument("--compare", metavar="PATH", help="baseline report to compare against")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="p50 slowdown ratio reported as a regression")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--data", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        size = int(args.sizes)
+        print(json.dumps(run_worker(args.worker, args.data, size, args.seed,
+                                    args.min_time, args.max_iterations)))
+        return 0
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    ops = args.ops.split(",")
+    unknown = [name for name in ops if name not in OPERATIONS]
+    if unknown:
+        parser.error(f"unknown operations: {', '.join(unknown)}")
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            source = os.path.join(tmp, f"tasks_{size}.json")
+            build_dataset(source, size, args.seed)
+            for name in ops:
+                # Workers that write get their own copy of the file
+                data = os.path.join(tmp, "work.json")
+                with open(source, 'rb') as src, open(data, 'wb') as dst:
+                    dst.write(src.read())
+                command = [sys.executable, os.path.abspath(__file__), "--worker", name,
+                           "--data", data, "--sizes", str(size), "--seed", str(args.seed),
+                           "--min-time", str(args.min_time),
+                           "--max-iterations", str(args.max_iterations)]
+                output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+                entry = json.loads(output.strip().splitlines()[-1])
+                results.append(entry)
+                print(f"{size:>8} {name:<16} {entry['ops_per_sec'] or 0:>12,.1f} ops/s  "
+                      f"p50 {entry['p50_ms']:>10.3f} ms  p99 {entry['p99_ms']:>10.3f} ms  "
+                      f"peak {entry['peak_rss_kb'] or 0:>9,} KiB", file=sys.stderr)
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'seed': args.seed,
+            'min_time': args.min_time,
+        },
+        'results': results,
+    }
+    if args.compare:
+        report['regressions'] = compare(results, args.compare, args.threshold)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+    print(json.dumps(report, indent=2))
+    return 1 if report.get('regressions') else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Cold start benchmark for the headless CLI
+
+Runs `python todo.py stats` repeatedly against a temporary task file and
+reports the median wall time and its overhead over a bare interpreter
+start (the part the budget applies to, so slow machines do not fail), plus the
+slowest imports from a `-X importtime` run and whether any GUI or
+notification module was loaded.
+
+Usage:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 20 --budget 50 --json startup.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TODO = os.path.join(ROOT, "todo.py")
+
+# Modules the CLI must never import
+FORBIDDEN = ["tkinter", "plyer", "win10toast", "reminder_system", "main"]
+
+def run_once(command):
+    """Run a command, returning (wall_ms, stderr)"""
+    start = time.perf_counter()
+    result = subprocess.run(command, capture_output=True, text=True, cwd=ROOT)
+    elapsed = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"{command} failed: {result.stderr[-500:]}")
+    return elapsed, result.stderr
+
+def parse_importtime(stderr):
+    """Parse -X importtime output into {module: cumulative_us}"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        modules[fields[2].strip()] = int(fields[1])
+    return modules
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CLI cold start benchmark")
+    parser.add_argument("--runs", type=int, default=15, help="number of timed runs")
+    parser.add_argument("--budget", type=float, default=50.0, help="budget for the overhead over a bare interpreter, in ms")
+    parser.add_argument("--json", metavar="PATH", help="also write the report to a JSON file")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_file = os.path.join(tmp, "tasks.json")
+        run_once([sys.executable, TODO, "--file", data_file, "add", "Benchmark task"])
+
+        baseline = [run_once([sys.executable, "-c", "pass"])[0] for _ in range(args.runs)]
+        command = [sys.executable, TODO, "--file", data_file, "stats"]
+        timings = [run_once(command)[0] for _ in range(args.runs)]
+
+        # One extra run with -X importtime to see what was imported
+        _, stderr = run_once(command[:1] + ["-X", "importtime"] + command[1:])
+        modules = parse_importtime(stderr)
+
+    loaded = set(modules)
+    median = statistics.median(timings)
+    baseline_median = statistics.median(baseline)
+    report = {
+        'command': "todo.py stats",
+        'runs': args.runs,
+        'median_ms': round(median, 2),
+        'min_ms': round(min(timings), 2),
+        'interpreter_baseline_ms': round(baseline_median, 2),
+        'overhead_ms': round(median - baseline_median, 2),
+        'budget_ms': args.budget,
+        'slowest_imports_us': dict(sorted(modules.items(), key=lambda item: -item[1])[:10]),
+        'forbidden_imports': [name for name in FORBIDDEN if name in loaded],
+    }
+    report['within_budget'] = report['overhead_ms'] <= args.budget and not report['forbidden_imports']
+
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+    return 0 if report['within_budget'] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
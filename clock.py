@@ -0,0 +1,62 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional, Union
+
+class SystemClock:
+    """Wall clock used by default by TaskManager and ReminderSystem"""
+
+    def now(self) -> datetime:
+        """Get the current local time"""
+        return datetime.now()
+
+    def sleep(self, seconds: float):
+        """Block the calling thread for the given number of seconds"""
+        time.sleep(seconds)
+
+    def wait(self, event: threading.Event, timeout: Optional[float] = None) -> bool:
+        """Wait for an event or until the timeout expires"""
+        return event.wait(timeout)
+
+class VirtualClock:
+    def __init__(self, start: Optional[datetime] = None):
+        """
+        Deterministic clock for tests and simulations
+
+        Time only moves when advance() or set() is called, or when a caller
+        sleeps or waits on it, in which case it jumps forward instantly.
+
+        Args:
+            start: Initial time, defaults to the current wall clock time
+        """
+        self._now = start or datetime.now()
+        self._lock = threading.Lock()
+
+    def now(self) -> datetime:
+        """Get the current virtual time"""
+        return self._now
+
+    def set(self, when: datetime):
+        """Move the clock to an absolute time (never backwards)"""
+        with self._lock:
+            if when > self._now:
+                self._now = when
+
+    def advance(self, delta: Union[float, timedelta]):
+        """Move the clock forward by seconds or a timedelta"""
+        if not isinstance(delta, timedelta):
+            delta = timedelta(seconds=delta)
+        with self._lock:
+            self._now += delta
+
+    def sleep(self, seconds: float):
+        """Advance the clock instead of blocking"""
+        self.advance(seconds)
+
+    def wait(self, event: threading.Event, timeout: Optional[float] = None) -> bool:
+        """Return at once, advancing by the timeout unless the event is set"""
+        if event.is_set():
+            return True
+        if timeout is not None:
+            self.advance(timeout)
+        return event.is_set()
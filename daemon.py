@@ -0,0 +1,591 @@
+#!/usr/bin/env python3
+"""
+Local JSON-RPC daemon for Personal To-Do List Assistant
+
+One process owns the TaskManager and the ReminderSystem; GUI windows,
+scripts and CLI invocations talk to it instead of each loading and saving
+tasks.json on their own. Requests are JSON-RPC 2.0 objects, one per line,
+over a Unix domain socket (or localhost TCP where Unix sockets are not
+available). Clients may pipeline requests and subscribe to change events.
+
+Usage:
+    python daemon.py --socket ~/.todo.sock
+    python daemon.py --port 8765
+"""
+
+import argparse
+import asyncio
+import errno
+import inspect
+import json
+import os
+import signal
+import socket
+import stat
+import sys
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from async_task_manager import AsyncTaskManager
+from metrics import METRICS
+from task_manager import check_task, task_from_json, task_to_json
+
+DEFAULT_SOCKET = os.path.join(os.path.expanduser("~"), ".todo.sock")
+
+# JSON-RPC 2.0 error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+TOPICS = ('tasks', 'notifications')
+
+# Largest request line accepted, large enough for bulk imports
+LINE_LIMIT = 64 * 1024 * 1024
+
+# A subscriber whose unread output grows past this is disconnected rather
+# than letting its buffer grow without bound
+SUBSCRIBER_BUFFER_LIMIT = 8 * 1024 * 1024
+
+class RPCError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+def parse_date(value: Optional[str]) -> Optional[datetime]:
+    """Parse an ISO date parameter"""
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise RPCError(INVALID_PARAMS, f"Invalid date: {value!r}")
+
+def remove_stale_socket(path: str):
+    """
+    Remove a Unix socket left behind by a daemon that is gone
+
+    Raises OSError if a daemon still answers on it, or if path is not a socket.
+    """
+    if not stat.S_ISSOCK(os.stat(path).st_mode):
+        raise OSError(errno.EEXIST, f"{path} exists and is not a socket")
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except ConnectionRefusedError:
+        os.remove(path)  # nobody listening, e.g. after a crash
+        return
+    finally:
+        probe.close()
+    raise OSError(errno.EADDRINUSE, f"A daemon is already listening on {path}")
+
+def encode(message: Dict) -> bytes:
+    """Encode one message as a JSON line"""
+    return json.dumps(message, ensure_ascii=False).encode('utf-8') + b"\n"
+
+class LoopEventQueue:
+    def __init__(self, loop: asyncio.AbstractEventLoop, handler: Callable[[str, Any], None]):
+        """
+        Stand-in for UIEventQueue that hands events to an asyncio loop
+
+        ReminderSystem posts from its own thread; the handler runs on the
+        loop thread.
+        """
+        self._loop = loop
+        self._handler = handler
+
+    def post(self, kind: str, payload: Any = None):
+        """Queue an event from any thread"""
+        try:
+            self._loop.call_soon_threadsafe(self._handler, kind, payload)
+        except RuntimeError:
+            pass  # loop already closed during shutdown
+
+class TaskDaemon:
+    def __init__(self, data_file: str = "tasks.json", reminders: bool = True,
+                 save_delay: float = 0.05):
+        """
+        Serve one in-memory TaskManager to many local clients
+
+        The tasks are held by a non-durable AsyncTaskManager: mutations run
+        on the event loop and are written on its worker thread, so a
+        response never waits for the disk (call 'flush' to wait for
+        durability). The file is loaded by start().
+
+        Args:
+            data_file: JSON file the tasks are stored in
+            reminders: Run a ReminderSystem and publish its notifications
+            save_delay: Seconds the writer waits to coalesce bursts of changes
+        """
+        self.data_file = data_file
+        self.save_delay = save_delay
+        self.store = None
+        self.task_manager = None
+        self.reminders = reminders
+        self.reminder_system = None
+        self._reminder_task = None
+        self.requests = 0
+        self._clients = {}  # StreamWriter -> subscribed topics
+        self._server = None
+        self._socket_path = None
+        self._methods = {name[len('rpc_'):]: getattr(self, name)
+                         for name in dir(self) if name.startswith('rpc_')}
+        self._signatures = {name: inspect.signature(method)
+                            for name, method in self._methods.items()}
+
+    async def start(self, socket_path: Optional[str] = None,
+                    host: str = "127.0.0.1", port: Optional[int] = None):
+        """
+        Start listening
+
+        Args:
+            socket_path: Unix socket path (used unless port is given)
+            host: TCP host, localhost by default
+            port: TCP port; 0 picks a free port (see address)
+        """
+        if port is None:
+            socket_path = socket_path or DEFAULT_SOCKET
+            if os.path.exists(socket_path):
+                remove_stale_socket(socket_path)
+
+        self.store = await AsyncTaskManager.open(self.data_file, durable=False,
+                                                 delay=self.save_delay)
+        self.task_manager = self.store.task_manager
+        self.task_manager.history  # record every change from now on
+        self.task_manager.add_listener(self._on_task_changed)
+
+        if port is None:
+            self._server = await asyncio.start_unix_server(
+                self._handle_client, socket_path, limit=LINE_LIMIT)
+            self._socket_path = socket_path
+        else:
+            self._server = await asyncio.start_server(
+                self._handle_client, host, port, limit=LINE_LIMIT)
+
+        if self.reminders:
+            from reminder_system import ReminderSystem
+            loop = asyncio.get_running_loop()
+            self.reminder_system = ReminderSystem(
+                self.task_manager, event_queue=LoopEventQueue(loop, self._on_reminder_event))
+            self._reminder_task = loop.create_task(self.reminder_system.run_async())
+
+    @property
+    def address(self):
+        """Socket path or (host, port) the daemon listens on"""
+        return self._server.sockets[0].getsockname()
+
+    async def serve_forever(self):
+        """Serve until cancelled, then shut down cleanly"""
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def stop(self):
+        """Stop serving, disconnect clients and finish pending writes"""
+        if self.reminder_system is not None:
+            self.reminder_system.stop()
+            await self._reminder_task
+            self.reminder_system = None
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._clients):
+                writer.close()
+            self._clients.clear()
+            await self._server.wait_closed()
+            self._server = None
+            if self._socket_path and os.path.exists(self._socket_path):
+                os.remove(self._socket_path)
+        if self.store is not None:
+            await self.store.close()
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._clients[writer] = set()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    writer.write(encode(self._error(None, INVALID_REQUEST, "Request too large")))
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                response = await self.handle_line(line, writer)
+                if response is not None:
+                    writer.write(response)
+                # Pipelined requests keep being read while responses queue
+                # up; only wait for the client once its buffer is large
+                if writer.transport.get_write_buffer_size() > SUBSCRIBER_BUFFER_LIMIT:
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._clients.pop(writer, None)
+            writer.close()
+
+    async def handle_line(self, line: bytes, client=None) -> Optional[bytes]:
+        """
+        Handle one request line (a request or a batch)
+
+        Returns:
+            The encoded response, or None if nothing should be sent back
+        """
+        try:
+            message = json.loads(line)
+        except ValueError as e:
+            return encode(self._error(None, PARSE_ERROR, f"Parse error: {e}"))
+
+        if isinstance(message, list):
+            if not message:
+                return encode(self._error(None, INVALID_REQUEST, "Empty batch"))
+            responses = []
+            # Run the batch as one write
+            async with self.store.batch():
+                for request in message:
+                    response = await self._dispatch(request, client)
+                    if response is not None:
+                        responses.append(response)
+            return (json.dumps(responses, ensure_ascii=False).encode('utf-8') + b"\n"
+                    if responses else None)
+
+        response = await self._dispatch(message, client)
+        return encode(response) if response is not None else None
+
+    async def _dispatch(self, request: Any, client) -> Optional[Dict]:
+        if not isinstance(request, dict) or request.get('jsonrpc') != "2.0" \
+                or not isinstance(request.get('method'), str):
+            return self._error(None, INVALID_REQUEST, "Invalid request")
+
+        request_id = request.get('id')
+        method = self._methods.get(request['method'])
+        params = request.get('params', {})
+        self.requests += 1
+        try:
+            if method is None:
+                raise RPCError(METHOD_NOT_FOUND, f"Method not found: {request['method']}")
+            if isinstance(params, list):
+                args, kwargs = params, {}
+            elif isinstance(params, dict):
+                args, kwargs = [], params
+            else:
+                raise RPCError(INVALID_PARAMS, "params must be an array or object")
+            try:
+                self._signatures[request['method']].bind(client, *args, **kwargs)
+            except TypeError as e:
+                raise RPCError(INVALID_PARAMS, str(e))
+            result = method(client, *args, **kwargs)
+            if asyncio.iscoroutine(result):
+                result = await result
+        except RPCError as e:
+            return self._error(request_id, e.code, e.message) if 'id' in request else None
+        except Exception as e:
+            print(f"Error handling {request['method']}: {e}")
+            return self._error(request_id, INTERNAL_ERROR, str(e)) if 'id' in request else None
+
+        if 'id' not in request:
+            return None  # notification
+        return {'jsonrpc': "2.0", 'id': request_id, 'result': result}
+
+    def _error(self, request_id, code: int, message: str) -> Dict:
+        return {'jsonrpc': "2.0", 'id': request_id, 'error': {'code': code, 'message': message}}
+
+    def publish(self, topic: str, method: str, params: Any):
+        """Push a notification to every client subscribed to topic"""
+        data = None
+        for writer, topics in list(self._clients.items()):
+            if topic not in topics:
+                continue
+            if data is None:
+                data = encode({'jsonrpc': "2.0", 'method': method, 'params': params})
+            if writer.transport.get_write_buffer_size() > SUBSCRIBER_BUFFER_LIMIT:
+                print("Disconnecting a subscriber that stopped reading")
+                self._clients.pop(writer, None)
+                writer.close()
+                continue
+            writer.write(data)
+
+    def _on_task_changed(self, event: str, task: Optional[Dict]):
+        self.publish('tasks', 'task_changed',
+                     {'event': event, 'task': task_to_json(task) if task else None})
+
+    def _on_reminder_event(self, kind: str, payload: Any):
+        if kind == 'notification':
+            self.publish('notifications', 'notification', payload)
+        elif kind == 'status':
+            self.publish('notifications', 'status', {'text': payload})
+
+    def _task(self, task_id: str) -> Dict:
+        task = self.task_manager.get_task_by_id(task_id)
+        if task is None:
+            raise RPCError(INVALID_PARAMS, f"No task with id {task_id!r}")
+        return task
+
+    # RPC methods: each takes the calling client first, then the params
+
+    def rpc_ping(self, client) -> str:
+        return "pong"
+
+    async def rpc_add_task(self, client, description: str, due_date: Optional[str] = None,
+                           priority: str = "Medium", reminders: Optional[Dict] = None,
+                           recurrence: Optional[Dict] = None, estimate: Optional[int] = None,
+                           tags: Optional[List[str]] = None) -> str:
+        try:
+            return await self.store.add_task(description, parse_date(due_date), priority,
+                                             reminders, recurrence, estimate, tags)
+        except ValueError as e:
+            raise RPCError(INVALID_PARAMS, str(e))
+
+    async def rpc_update_task(self, client, task_id: str, description: Optional[str] = None,
+                              due_date: Optional[str] = None, priority: Optional[str] = None,
+                              reminders: Optional[Dict] = None,
+                              recurrence: Optional[Dict] = None,
+                              estimate: Optional[int] = None,
+                              tags: Optional[List[str]] = None) -> bool:
+        try:
+            return await self.store.update_task(task_id, description, parse_date(due_date),
+                                                priority, reminders, recurrence, estimate, tags)
+        except ValueError as e:
+            raise RPCError(INVALID_PARAMS, str(e))
+
+    async def rpc_delete_task(self, client, task_id: str) -> bool:
+        return await self.store.delete_task(task_id)
+
+    async def rpc_mark_complete(self, client, task_id: str) -> bool:
+        return await self.store.mark_complete(task_id)
+
+    async def rpc_mark_incomplete(self, client, task_id: str) -> bool:
+        return await self.store.mark_incomplete(task_id)
+
+    async def rpc_add_dependency(self, client, task_id: str, blocker_id: str) -> bool:
+        try:
+            return await self.store.add_dependency(task_id, blocker_id)
+        except ValueError as e:
+            raise RPCError(INVALID_PARAMS, str(e))
+
+    async def rpc_remove_dependency(self, client, task_id: str, blocker_id: str) -> bool:
+        return await self.store.remove_dependency(task_id, blocker_id)
+
+    async def rpc_set_parent(self, client, task_id: str, parent_id: Optional[str] = None) -> bool:
+        try:
+            return await self.store.set_parent(task_id, parent_id)
+        except ValueError as e:
+            raise RPCError(INVALID_PARAMS, str(e))
+
+    def rpc_get_task(self, client, task_id: str) -> Dict:
+        return task_to_json(self._task(task_id))
+
+    def rpc_list_tasks(self, client, status: str = "all", limit: Optional[int] = None) -> List[Dict]:
+        getters = {
+            'all': self.task_manager.get_all_tasks,
+            'pending': self.task_manager.get_pending_tasks,
+            'completed': self.task_manager.get_completed_tasks,
+            'overdue': self.task_manager.get_overdue_tasks,
+            'actionable': self.task_manager.get_actionable_tasks,
+        }
+        if status not in getters:
+            raise RPCError(INVALID_PARAMS, f"Unknown status {status!r}")
+        tasks = getters[status]()
+        if limit is not None:
+            tasks = tasks[:limit]
+        return [task_to_json(task) for task in tasks]
+
+    def rpc_next_tasks(self, client, k: int = 5, actionable_only: bool = True) -> List[Dict]:
+        return [task_to_json(task) for task in self.task_manager.next_tasks(k, actionable_only)]
+
+    async def rpc_plan(self, client, until: Optional[str] = None) -> List[Dict]:
+        plan = await self.store.plan(parse_date(until))
+        return [{'task_id': entry['task_id'], 'start': entry['start'].isoformat(),
+                 'end': entry['end'].isoformat(), 'late': entry['late'],
+                 'blocks': [[start.isoformat(), end.isoformat()] for start, end in entry['blocks']]}
+                for entry in plan]
+
+    async def rpc_query_tasks(self, client, query: str) -> List[Dict]:
+        try:
+            tasks = await self.store.query_tasks(query)
+        except ValueError as e:
+            raise RPCError(INVALID_PARAMS, str(e))
+        return [task_to_json(task) for task in tasks]
+
+    async def rpc_task_as_of(self, client, task_id: str, when: str) -> Optional[Dict]:
+        task = await self.store.get_task_as_of(task_id, parse_date(when))
+        return task_to_json(task) if task else None
+
+    async def rpc_tasks_as_of(self, client, when: str) -> List[Dict]:
+        return [task_to_json(task) for task in await self.store.get_tasks_as_of(parse_date(when))]
+
+    def rpc_due_soon(self, client, hours: int = 24) -> List[Dict]:
+        return [task_to_json(task) for task in self.task_manager.get_tasks_due_soon(hours)]
+
+    def rpc_search(self, client, query: str) -> List[Dict]:
+        return [task_to_json(task) for task in self.task_manager.search_tasks(query)]
+
+    def rpc_stats(self, client) -> Dict:
+        return self.task_manager.get_task_stats()
+
+    async def rpc_import_tasks(self, client, tasks: List[Dict], overwrite: bool = False) -> Dict[str, int]:
+        try:
+            parsed = [check_task(task_from_json(task)) for task in tasks]
+        except (KeyError, ValueError) as e:
+            raise RPCError(INVALID_PARAMS, f"Invalid task: {e}")
+        return await self.store.import_tasks(parsed, overwrite)
+
+    async def rpc_set_rules(self, client, rules: Optional[List[Dict]] = None) -> int:
+        try:
+            return await self.store.set_rules(rules)
+        except ValueError as e:
+            raise RPCError(INVALID_PARAMS, f"Invalid rules: {e}")
+
+    def rpc_export(self, client) -> List[Dict]:
+        return self.task_manager.serialize_tasks()
+
+    async def rpc_flush(self, client, timeout: Optional[float] = None) -> bool:
+        """Wait until every change made so far is on disk"""
+        try:
+            return await asyncio.wait_for(self.store.flush(), timeout)
+        except asyncio.TimeoutError:
+            return False
+
+    def rpc_subscribe(self, client, topics: Optional[List[str]] = None) -> List[str]:
+        topics = list(TOPICS) if topics is None else topics
+        unknown = [topic for topic in topics if topic not in TOPICS]
+        if unknown:
+            raise RPCError(INVALID_PARAMS, f"Unknown topics: {unknown}")
+        if client not in self._clients:
+            raise RPCError(INVALID_REQUEST, "Subscriptions need a connection")
+        self._clients[client].update(topics)
+        return sorted(self._clients[client])
+
+    def rpc_unsubscribe(self, client, topics: Optional[List[str]] = None) -> List[str]:
+        subscribed = self._clients.get(client, set())
+        subscribed.difference_update(TOPICS if topics is None else topics)
+        return sorted(subscribed)
+
+class TaskClient:
+    def __init__(self, socket_path: Optional[str] = None, host: str = "127.0.0.1",
+                 port: Optional[int] = None, timeout: Optional[float] = 10.0):
+        """
+        Blocking client for TaskDaemon
+
+        Args:
+            socket_path: Unix socket path (used unless port is given)
+            host: TCP host
+            port: TCP port
+            timeout: Socket timeout in seconds
+        """
+        if port is None:
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._sock.settimeout(timeout)
+            self._sock.connect(socket_path or DEFAULT_SOCKET)
+        else:
+            self._sock = socket.create_connection((host, port), timeout)
+        self._file = self._sock.makefile('rb')
+        self._next_id = 0
+        self._notifications = []  # pushed while waiting for a response
+
+    def close(self):
+        """Close the connection"""
+        self._file.close()
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def call(self, method: str, **params) -> Any:
+        """Call one method and return its result, raising RPCError on failure"""
+        return self.pipeline([(method, params)])[0]
+
+    def pipeline(self, calls: List[Tuple[str, Dict]]) -> List[Any]:
+        """
+        Send several requests at once, then read all responses
+
+        One round trip instead of one per call. A failed call raises
+        RPCError after all responses have been read.
+        """
+        ids = []
+        data = []
+        for method, params in calls:
+            self._next_id += 1
+            ids.append(self._next_id)
+            data.append(encode({'jsonrpc': "2.0", 'id': self._next_id,
+                                'method': method, 'params': params}))
+        self._sock.sendall(b"".join(data))
+
+        responses = {}
+        while len(responses) < len(ids):
+            message = self._read()
+            if 'id' in message:
+                responses[message['id']] = message
+            else:
+                self._notifications.append(message)
+
+        results = []
+        for request_id in ids:
+            response = responses[request_id]
+            if 'error' in response:
+                raise RPCError(response['error']['code'], response['error']['message'])
+            results.append(response['result'])
+        return results
+
+    def notifications(self) -> Iterator[Dict]:
+        """Yield pushed notifications as {'method': ..., 'params': ...}"""
+        while True:
+            if self._notifications:
+                message = self._notifications.pop(0)
+            else:
+                message = self._read()
+                if 'id' in message:
+                    continue
+            yield {'method': message['method'], 'params': message.get('params')}
+
+    def _read(self) -> Dict:
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("Daemon closed the connection")
+        return json.loads(line)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Personal To-Do List Assistant daemon")
+    parser.add_argument("--file", default="tasks.json", help="task data file (default: tasks.json)")
+    parser.add_argument("--socket", help=f"Unix socket path (default: {DEFAULT_SOCKET})")
+    parser.add_argument("--host", default="127.0.0.1", help="TCP host when --port is given")
+    parser.add_argument("--port", type=int, help="listen on localhost TCP instead of a Unix socket")
+    parser.add_argument("--no-reminders", action="store_true", help="do not run reminders")
+    args = parser.parse_args(argv)
+
+    if args.port is None and not hasattr(socket, 'AF_UNIX'):
+        parser.error("Unix sockets are not available here, use --port")
+
+    async def serve():
+        daemon = TaskDaemon(args.file, reminders=not args.no_reminders)
+        await daemon.start(args.socket, args.host, args.port)
+        print(f"Serving {args.file} on {daemon.address}")
+        # SIGTERM shuts down like Ctrl+C, so pending writes are flushed
+        try:
+            asyncio.get_running_loop().add_signal_handler(
+                signal.SIGTERM, asyncio.current_task().cancel)
+        except NotImplementedError:
+            pass
+        await daemon.serve_forever()
+
+    METRICS.configure_from_env()
+    try:
+        asyncio.run(serve())
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    except OSError as e:
+        print(f"Cannot start the daemon: {e}")
+        return 1
+    finally:
+        METRICS.stop_exporter()
+    print("Daemon stopped")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
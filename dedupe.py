@@ -0,0 +1,227 @@
+"""
+Near duplicate detection for task descriptions
+
+Each description is reduced to its hashed character 3-gram shingles and a
+MinHash signature of NUM_PERM values; the signature is split into BANDS
+bands whose hashes index the task in locality sensitive hash buckets.
+Descriptions sharing a bucket are candidates, and candidates are
+confirmed with the exact Jaccard similarity of their shingles. A lookup
+touches BANDS buckets and at most MAX_CANDIDATES tasks, however many
+tasks are stored.
+
+Signatures use one permutation hashing: every shingle hash goes to one of
+NUM_PERM bins by its low bits and each bin keeps its minimum, with empty
+bins filled from their right neighbour (densification). That is one hash
+per shingle instead of one per shingle and permutation, with the same
+estimate of similarity. With 32 bins in 8 bands of 4 rows, pairs with a
+similarity of 0.6 become candidates about 90% of the time.
+"""
+
+import re
+import threading
+import zlib
+from functools import lru_cache
+from itertools import islice
+from typing import Dict, List, Optional, Set
+
+NUM_PERM = 32  # a power of two, the bin is taken from the low bits
+BANDS = 8
+ROWS = NUM_PERM // BANDS
+# Descriptions at least this similar are reported as duplicates
+DEFAULT_THRESHOLD = 0.6
+# Bucket members looked at and candidates confirmed per lookup, so a huge
+# bucket cannot make inserts slow
+MAX_CANDIDATES = 16
+
+_BIN_BITS = NUM_PERM.bit_length() - 1
+# Keeps densified values apart from real ones (hash values are 32 bit)
+_DENSIFY_OFFSET = 1 << (32 - _BIN_BITS)
+
+NON_WORD_RE = re.compile(r"[\W_]+")
+
+def shingles(text: str) -> Set[int]:
+    """Hashed character 3-grams of a normalized description"""
+    normalized = NON_WORD_RE.sub(" ", text.lower()).strip()
+    if len(normalized) < 3:
+        grams = [normalized] if normalized else []
+    else:
+        grams = [normalized[i:i + 3] for i in range(len(normalized) - 2)]
+    # crc32 mixes its low bits poorly, a multiplicative hash spreads them
+    return {(zlib.crc32(gram.encode()) * 0x9E3779B1) & 0xFFFFFFFF for gram in grams}
+
+def signature(hashed: Set[int]) -> tuple:
+    """One permutation MinHash signature of a shingle set"""
+    if not hashed:
+        return ()
+    mask = NUM_PERM - 1
+    bins = [None] * NUM_PERM
+    for value in hashed:
+        slot = value & mask
+        value >>= _BIN_BITS
+        current = bins[slot]
+        if current is None or value < current:
+            bins[slot] = value
+    if None in bins:
+        # An empty bin takes the nearest filled bin to its right (wrapping
+        # around), offset by the distance
+        dense = list(bins)
+        nearest = None
+        for i in range(2 * NUM_PERM - 1, -1, -1):
+            value = bins[i % NUM_PERM]
+            if value is not None:
+                nearest = (value, i)
+            elif nearest is not None and i < NUM_PERM:
+                dense[i] = nearest[0] + (nearest[1] - i) * _DENSIFY_OFFSET
+        bins = dense
+    return tuple(bins)
+
+@lru_cache(maxsize=1024)
+def band_keys(description: str) -> tuple:
+    """LSH bucket key of a description in every band"""
+    values = signature(shingles(description))
+    if not values:
+        return ()
+    return tuple(hash(values[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS))
+
+def jaccard(first: Set[int], second: Set[int]) -> float:
+    """Exact Jaccard similarity of two shingle sets"""
+    if not first or not second:
+        return 0.0
+    common = len(first & second)
+    return common / (len(first) + len(second) - common)
+
+class DuplicateIndex:
+    def __init__(self, task_manager, threshold: float = DEFAULT_THRESHOLD):
+        """
+        LSH index over task descriptions, maintained through a listener
+
+        Args:
+            task_manager: TaskManager to index
+            threshold: Jaccard similarity from which tasks count as duplicates
+        """
+        self.task_manager = task_manager
+        self.threshold = threshold
+        self._lock = threading.RLock()
+        self.rebuild()
+        task_manager.add_listener(self._on_task_changed)
+
+    def rebuild(self):
+        """Re-index every task"""
+        with self._lock:
+            self._buckets = [{} for _ in range(BANDS)]  # per band: band hash -> set of task ids
+            self._keys = {}                            # task_id -> [description, band hashes, completed]
+            for task in list(self.task_manager.tasks):
+                self._add(task)
+
+    def _on_task_changed(self, event: str, task: Optional[Dict]):
+        with self._lock:
+            if event == 'loaded':
+                self.rebuild()
+            elif event == 'deleted':
+                self._remove(task['id'])
+            else:
+                indexed = self._keys.get(task['id'])
+                if indexed is None or indexed[0] != task['description']:
+                    self._remove(task['id'])
+                    self._add(task)
+                else:
+                    indexed[2] = task['completed']
+
+    def _add(self, task: Dict):
+        keys = band_keys(task['description'])
+        self._keys[task['id']] = [task['description'], keys, task['completed']]
+        for bucket, key in zip(self._buckets, keys):
+            members = bucket.get(key)
+            if members is None:
+                bucket[key] = {task['id']}
+            else:
+                members.add(task['id'])
+
+    def _remove(self, task_id: str):
+        indexed = self._keys.pop(task_id, None)
+        if indexed is None:
+            return
+        for bucket, key in zip(self._buckets, indexed[1]):
+            members = bucket[key]
+            members.discard(task_id)
+            if not members:
+                del bucket[key]
+
+    def _candidates(self, keys: tuple) -> List[str]:
+        """Ids sharing at least one band, most shared bands first"""
+        counts = {}
+        for bucket, key in zip(self._buckets, keys):
+            for task_id in islice(bucket.get(key, ()), MAX_CANDIDATES):
+                counts[task_id] = counts.get(task_id, 0) + 1
+        return sorted(counts, key=counts.get, reverse=True)[:MAX_CANDIDATES]
+
+    def find_duplicates(self, description: str, exclude: Optional[str] = None,
+                        include_completed: bool = False) -> List[tuple]:
+        """
+        Tasks similar to a description, as (similarity, task_id), most similar first
+
+        Args:
+            description: Text to look up
+            exclude: Task id to leave out (the task itself)
+            include_completed: Also match completed tasks
+        """
+        hashed = shingles(description)
+        matches = []
+        with self._lock:
+            for task_id in self._candidates(band_keys(description)):
+                other, _, completed = self._keys[task_id]
+                if task_id == exclude or (completed and not include_completed):
+                    continue
+                similarity = jaccard(hashed, shingles(other))
+                if similarity >= self.threshold:
+                    matches.append((similarity, task_id))
+        matches.sort(key=lambda match: -match[0])
+        return matches
+
+    def report(self, include_completed: bool = False) -> List[List[str]]:
+        """
+        Groups of near duplicate tasks across the whole store, largest first
+
+        Bucket members are compared pairwise (only against the first
+        member in very large buckets) and similar pairs are merged with
+        union-find, so a group holds tasks linked by a chain of matches.
+        """
+        parent = {}
+
+        def find(task_id):
+            while parent.setdefault(task_id, task_id) != task_id:
+                parent[task_id] = parent[parent[task_id]]
+                task_id = parent[task_id]
+            return task_id
+
+        cache = {}
+
+        def shingles_of(task_id):
+            if task_id not in cache:
+                cache[task_id] = shingles(self._keys[task_id][0])
+            return cache[task_id]
+
+        checked = set()
+        with self._lock:
+            keys = self._keys
+            for bucket in self._buckets:
+                for members in bucket.values():
+                    if len(members) < 2:
+                        continue
+                    ids = sorted(task_id for task_id in members
+                                 if include_completed or not keys[task_id][2])
+                    for i, first in enumerate(ids):
+                        others = ids[i + 1:] if len(ids) <= MAX_CANDIDATES or i == 0 else ()
+                        for second in others:
+                            if (first, second) in checked:
+                                continue
+                            checked.add((first, second))
+                            if find(first) != find(second) and \
+                                    jaccard(shingles_of(first), shingles_of(second)) >= self.threshold:
+                                parent[find(second)] = find(first)
+
+        groups = {}
+        for task_id in parent:
+            groups.setdefault(find(task_id), []).append(task_id)
+        return sorted((sorted(group) for group in groups.values() if len(group) > 1),
+                      key=len, reverse=True)
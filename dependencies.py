@@ -0,0 +1,185 @@
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Set
+
+class DependencyGraph:
+    def __init__(self, task_manager):
+        """
+        Subtask and "blocked by" edges between tasks
+
+        A task lists the tasks it waits for in 'blocked_by' and its parent
+        in 'parent_id'; a parent waits for all of its subtasks. For every
+        task the graph counts blockers that are still open (existing and
+        incomplete), and keeps the set of pending tasks whose count is zero,
+        so completing a task only touches the tasks that depend on it.
+        Blockers that do not exist (deleted tasks) do not block.
+
+        Like TaskIndex, the graph follows the TaskManager through a
+        listener, and queries may be called from any thread.
+
+        Args:
+            task_manager: TaskManager whose tasks are linked
+        """
+        self.task_manager = task_manager
+        self._lock = threading.RLock()
+        self.rebuild()
+        task_manager.add_listener(self._on_task_changed)
+
+    def rebuild(self):
+        """Rebuild the graph from the task list"""
+        with self._lock:
+            self._edges = {}       # task_id -> (blocker, dependent) edges its fields declare
+            self._dependents = {}  # blocker id -> {dependent id: edge count}
+            self._waiting = {}     # task_id -> number of edges from open blockers
+            self._open = set()     # ids of existing incomplete tasks
+            self._actionable = {}  # open task ids with nothing to wait for (a dict keeps the order stable)
+            self._parents = {}     # task_id -> parent id
+            self._children = {}    # parent id -> set of subtask ids
+            for task in list(self.task_manager.tasks):
+                self._update(task)
+
+    def _on_task_changed(self, event: str, task: Optional[Dict]):
+        with self._lock:
+            if event == 'loaded':
+                self.rebuild()
+            elif event == 'deleted':
+                self._set_edges(task['id'], set())
+                self._set_parent(task['id'], None)
+                self._set_open(task['id'], False)
+            else:
+                self._update(task)
+
+    @staticmethod
+    def declared_edges(task: Dict) -> Set[tuple]:
+        """(blocker, dependent) edges declared by a task's own fields"""
+        edges = {(blocker, task['id']) for blocker in task.get('blocked_by') or ()}
+        if task.get('parent_id'):
+            edges.add((task['id'], task['parent_id']))
+        return edges
+
+    def _update(self, task: Dict):
+        self._set_edges(task['id'], self.declared_edges(task))
+        self._set_parent(task['id'], task.get('parent_id'))
+        self._set_open(task['id'], not task['completed'])
+
+    def _set_edges(self, task_id: str, edges: Set[tuple]):
+        old = self._edges.get(task_id, set())
+        for edge in old - edges:
+            self._remove_edge(*edge)
+        for edge in edges - old:
+            self._add_edge(*edge)
+        if edges:
+            self._edges[task_id] = edges
+        else:
+            self._edges.pop(task_id, None)
+
+    def _set_parent(self, task_id: str, parent_id: Optional[str]):
+        old = self._parents.pop(task_id, None)
+        if old is not None:
+            children = self._children[old]
+            children.discard(task_id)
+            if not children:
+                del self._children[old]
+        if parent_id:
+            self._parents[task_id] = parent_id
+            self._children.setdefault(parent_id, set()).add(task_id)
+
+    def _add_edge(self, blocker: str, dependent: str):
+        counts = self._dependents.setdefault(blocker, {})
+        counts[dependent] = counts.get(dependent, 0) + 1
+        if blocker in self._open:
+            self._waiting[dependent] = self._waiting.get(dependent, 0) + 1
+            self._refresh(dependent)
+
+    def _remove_edge(self, blocker: str, dependent: str):
+        counts = self._dependents[blocker]
+        counts[dependent] -= 1
+        if not counts[dependent]:
+            del counts[dependent]
+            if not counts:
+                del self._dependents[blocker]
+        if blocker in self._open:
+            self._waiting[dependent] -= 1
+            self._refresh(dependent)
+
+    def _set_open(self, task_id: str, is_open: bool):
+        """Open or close a task, adjusting the counts of its dependents"""
+        if (task_id in self._open) != is_open:
+            if is_open:
+                self._open.add(task_id)
+            else:
+                self._open.discard(task_id)
+            change = 1 if is_open else -1
+            for dependent, count in self._dependents.get(task_id, {}).items():
+                self._waiting[dependent] = self._waiting.get(dependent, 0) + change * count
+                self._refresh(dependent)
+        self._refresh(task_id)
+
+    def _refresh(self, task_id: str):
+        if task_id in self._open and not self._waiting.get(task_id):
+            self._actionable[task_id] = None
+        else:
+            self._actionable.pop(task_id, None)
+
+    def creates_cycle(self, blocker: str, dependent: str) -> bool:
+        """Whether adding the edge blocker -> dependent would close a cycle"""
+        with self._lock:
+            if blocker == dependent:
+                return True
+            # A cycle exists if the blocker already (transitively) waits for the dependent
+            seen = {dependent}
+            stack = [dependent]
+            while stack:
+                for node in self._dependents.get(stack.pop(), ()):
+                    if node == blocker:
+                        return True
+                    if node not in seen:
+                        seen.add(node)
+                        stack.append(node)
+            return False
+
+    def is_actionable(self, task_id: str) -> bool:
+        """Whether a task is pending and waits for nothing"""
+        with self._lock:
+            return task_id in self._actionable
+
+    def actionable_ids(self) -> List[str]:
+        """Ids of pending tasks whose blockers and subtasks are all complete"""
+        with self._lock:
+            return list(self._actionable)
+
+    def blocker_count(self, task_id: str) -> int:
+        """Number of open tasks a task is waiting for"""
+        with self._lock:
+            return self._waiting.get(task_id, 0)
+
+    def children(self, task_id: str) -> Set[str]:
+        """Ids of the direct subtasks of a task"""
+        with self._lock:
+            return set(self._children.get(task_id, ()))
+
+    def dependents(self, task_id: str) -> Set[str]:
+        """Ids of the tasks waiting for a task (including its parent)"""
+        with self._lock:
+            return set(self._dependents.get(task_id, ()))
+
+    def topological_order(self) -> List[str]:
+        """
+        Open task ids ordered so every task comes after what it waits for
+
+        Kahn's algorithm seeded with the actionable set; tasks on a cycle
+        (only possible through hand-edited or imported files) are left out.
+        """
+        with self._lock:
+            waiting = {task_id: self._waiting.get(task_id, 0) for task_id in self._open}
+            queue = deque(self._actionable)
+            order = []
+            while queue:
+                task_id = queue.popleft()
+                order.append(task_id)
+                for dependent, count in self._dependents.get(task_id, {}).items():
+                    if dependent in waiting:
+                        waiting[dependent] -= count
+                        if waiting[dependent] == 0:
+                            queue.append(dependent)
+            return order
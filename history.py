@@ -0,0 +1,270 @@
+"""
+Version history of every task, with time travel queries
+
+Each change to a task is stored as a version in that task's chain: a
+delta of the fields that changed ('set' and 'unset'), a deletion, or a
+keyframe holding the whole task. A chain starts with a keyframe, and
+every KEYFRAME_INTERVAL versions (and after a deletion) another one is
+written, so the state at any time is the nearest keyframe before it plus
+at most KEYFRAME_INTERVAL - 1 deltas, however long the history is.
+
+Versions are found by binary search over the chain's timestamps, so
+"task X at time T" costs O(log versions + KEYFRAME_INTERVAL), and "the
+whole list as of D" that per task, without replaying anything from the
+beginning.
+
+Versions are appended to a JSON Lines file next to the task data (see
+history_path) by TaskManager.write_tasks, so on the same thread as the
+task data. The file is only read on the first query (see load); until
+then, the first change to a task is written as a keyframe. Changes made
+while no history was kept (e.g. by hand) are recorded as one version
+once the file has been read.
+"""
+
+import bisect
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from task_manager import task_from_json, task_to_json
+
+# Versions between keyframes, which bounds the deltas replayed per lookup
+KEYFRAME_INTERVAL = 16
+# State of a task whose history has not been read yet
+_UNKNOWN = object()
+
+def history_path(data_file: str) -> str:
+    """History file of a task data file, e.g. tasks.json -> tasks.history.jsonl"""
+    return os.path.splitext(data_file)[0] + ".history.jsonl"
+
+def diff(old: Dict, new: Dict) -> Dict:
+    """Delta turning one JSON task into another ('set' and 'unset', when not empty)"""
+    delta = {}
+    changed = {field: value for field, value in new.items()
+               if field not in old or old[field] != value}
+    if changed:
+        delta['set'] = changed
+    removed = [field for field in old if field not in new]
+    if removed:
+        delta['unset'] = removed
+    return delta
+
+def patch(state: Dict, version: Dict):
+    """Apply a delta version to a JSON task in place"""
+    state.update(version.get('set', ()))
+    for field in version.get('unset', ()):
+        state.pop(field, None)
+
+class TaskHistory:
+    def __init__(self, task_manager, path: Optional[str] = None,
+                 keyframe_interval: int = KEYFRAME_INTERVAL):
+        """
+        Per task version chains, maintained through a listener
+
+        Args:
+            task_manager: TaskManager whose changes are recorded
+            path: History file, history_path(data_file) by default
+            keyframe_interval: Versions between keyframes
+        """
+        self.task_manager = task_manager
+        self.path = path or history_path(task_manager.data_file)
+        self.keyframe_interval = keyframe_interval
+        self._lock = threading.RLock()
+        self._file_lock = threading.Lock()  # held while the file is read or appended to
+        self._loaded = False
+        self._times = {}      # task_id -> version timestamps, ascending
+        self._versions = {}   # task_id -> versions ({'key': task}, a delta or {'deleted': True})
+        self._keyframes = {}  # task_id -> positions of the keyframes in the chain
+        self._latest = {}     # task_id -> JSON task as last recorded, None once deleted
+        self._pending = []    # lines not yet appended to the file
+        task_manager.add_listener(self._on_task_changed)
+
+    def load(self):
+        """
+        Read the history file, if not done yet
+
+        Called by every query; call it on a worker thread first to keep a
+        long history from being read on the caller's.
+        """
+        if self._loaded:
+            return
+        with self._file_lock:
+            if self._loaded:
+                return
+            records = []
+            if os.path.exists(self.path):
+                with open(self.path, 'r', encoding='utf-8') as file:
+                    records = [self._parse(line) for line in file]
+            with self._lock:
+                # The file and the lines not written yet hold every version
+                # recorded so far, this session's included
+                records.extend(self._parse(line) for line in self._pending)
+                self._times, self._versions, self._keyframes = {}, {}, {}
+                for record in records:
+                    if record is not None:
+                        self._append(*record)
+                self._latest = {task_id: self._state(task_id, len(times) - 1)
+                                for task_id, times in self._times.items()}
+                self._loaded = True
+                self.reconcile()
+
+    @staticmethod
+    def _parse(line: str):
+        try:
+            record = json.loads(line)
+            return record.pop('id'), datetime.fromisoformat(record.pop('at')), record
+        except (ValueError, KeyError):
+            return None  # a line cut short by a crash
+
+    def _append(self, task_id: str, at: datetime, version: Dict):
+        times = self._times.get(task_id)
+        if times is None:
+            times = self._times[task_id] = []
+            self._versions[task_id] = []
+            self._keyframes[task_id] = []
+        elif at < times[-1]:
+            at = times[-1]  # keep the chain sorted if the clock went back
+        if 'key' in version:
+            self._keyframes[task_id].append(len(times))
+        times.append(at)
+        self._versions[task_id].append(version)
+        return at
+
+    def _record(self, task_id: str, version: Dict):
+        at = self._append(task_id, self.task_manager.clock.now(), version)
+        self._pending.append(json.dumps({'id': task_id, 'at': at.isoformat(), **version}))
+
+    def _record_state(self, task_id: str, new: Optional[Dict]):
+        """Record a task's new JSON state (None when deleted), if it changed"""
+        old = self._latest.get(task_id, None if self._loaded else _UNKNOWN)
+        if new is None:
+            if old is not None:
+                self._record(task_id, {'deleted': True})
+                self._latest[task_id] = None
+            return
+        keyframes = self._keyframes.get(task_id)
+        if old is None or old is _UNKNOWN \
+                or len(self._times[task_id]) - keyframes[-1] >= self.keyframe_interval:
+            if old != new:
+                self._record(task_id, {'key': new})
+        else:
+            delta = diff(old, new)
+            if delta:
+                self._record(task_id, delta)
+        self._latest[task_id] = new
+
+    def reconcile(self):
+        """Record how the current tasks differ from the history, e.g. after a reload"""
+        with self._lock:
+            current = {}
+            for task in list(self.task_manager.tasks):
+                current[task['id']] = task_to_json(task)
+            for task_id, state in self._latest.items():
+                if state is not None and task_id not in current:
+                    self._record_state(task_id, None)
+            for task_id, state in current.items():
+                self._record_state(task_id, state)
+
+    def _on_task_changed(self, event: str, task: Optional[Dict]):
+        with self._lock:
+            if event == 'loaded':
+                if self._loaded:
+                    self.reconcile()
+                else:
+                    self._latest.clear()  # reloaded tasks are keyframed again
+            elif event == 'deleted':
+                self._record_state(task['id'], None)
+            else:
+                self._record_state(task['id'], task_to_json(task))
+
+    def flush(self):
+        """Append the versions recorded since the last flush to the file"""
+        with self._file_lock:
+            with self._lock:
+                if not self._pending:
+                    return
+                lines, self._pending = self._pending, []
+            try:
+                with open(self.path, 'a', encoding='utf-8') as file:
+                    file.write("\n".join(lines) + "\n")
+            except OSError as e:
+                print(f"Error saving history: {e}")
+                with self._lock:
+                    self._pending = lines + self._pending
+
+    def _state(self, task_id: str, position: int) -> Optional[Dict]:
+        """JSON task after the version at position, None if it was deleted"""
+        versions = self._versions[task_id]
+        if 'deleted' in versions[position]:
+            return None
+        keyframes = self._keyframes[task_id]
+        start = keyframes[bisect.bisect_right(keyframes, position) - 1]
+        state = dict(versions[start]['key'])
+        for version in versions[start + 1:position + 1]:
+            patch(state, version)
+        return state
+
+    def _position(self, task_id: str, when: datetime) -> int:
+        """Position of the last version at or before when, -1 if none"""
+        return bisect.bisect_right(self._times.get(task_id, ()), when) - 1
+
+    def as_of(self, task_id: str, when: datetime) -> Optional[Dict]:
+        """A task as it was at a time, None if it did not exist then"""
+        self.load()
+        with self._lock:
+            position = self._position(task_id, when)
+            if position < 0:
+                return None
+            state = self._state(task_id, position)
+            return task_from_json(state) if state is not None else None
+
+    def tasks_as_of(self, when: datetime) -> List[Dict]:
+        """Every task that existed at a time, as it was then, oldest first"""
+        self.load()
+        tasks = []
+        with self._lock:
+            for task_id, times in self._times.items():
+                if times[0] > when:
+                    continue
+                state = self._state(task_id, bisect.bisect_right(times, when) - 1)
+                if state is not None:
+                    tasks.append(task_from_json(state))
+        return tasks
+
+    def versions(self, task_id: str) -> List[Dict]:
+        """
+        The changes to a task, oldest first
+
+        Returns:
+            Dicts with 'at' and either 'task' (the whole task, when it was
+            created or restored), 'changes' (new values of the changed
+            fields in their JSON form, removed ones as None) or 'deleted'
+        """
+        self.load()
+        entries = []
+        state = None
+        with self._lock:
+            for at, version in zip(self._times.get(task_id, ()), self._versions.get(task_id, ())):
+                if 'deleted' in version:
+                    entries.append({'at': at, 'deleted': True})
+                    state = None
+                    continue
+                if 'key' in version:
+                    if state is None:
+                        state = dict(version['key'])
+                        entries.append({'at': at, 'task': task_from_json(state)})
+                        continue
+                    version = diff(state, version['key'])
+                patch(state, version)
+                changes = dict(version.get('set', {}))
+                changes.update(dict.fromkeys(version.get('unset', ())))
+                entries.append({'at': at, 'changes': changes})
+        return entries
+
+    def task_ids(self) -> List[str]:
+        """Ids of every task with a history, deleted ones included"""
+        self.load()
+        with self._lock:
+            return list(self._times)
@@ -0,0 +1,409 @@
+"""
+Streaming import and export of tasks
+
+Formats:
+    json   the tasks.json layout (a JSON array)
+    jsonl  one JSON task per line
+    csv    one row per task with a header line
+    ics    iCalendar VTODO components
+
+Readers are generators yielding task dicts with datetime fields (the form
+TaskManager keeps in memory); writers consume any iterable of such dicts.
+Except for reading a json array, no format holds more than one task in
+memory at a time. A task that cannot be read (a bad date, number or JSON
+field) raises ValueError, or is skipped and described in the errors list
+when one is passed.
+"""
+
+import csv
+import json
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, TextIO
+
+from recurrence import from_rrule, to_rrule, with_start
+from tags import clean_tags
+from task_manager import DATE_FIELDS, check_task, task_from_json, task_to_json
+
+FORMATS = ('json', 'jsonl', 'csv', 'ics')
+
+CSV_FIELDS = ['id', 'description', 'due_date', 'priority', 'completed',
+              'created_at', 'completed_at', 'reminders', 'recurrence', 'estimate', 'tags']
+
+# iCalendar PRIORITY: 1-4 high, 5 medium, 6-9 low, 0 undefined
+ICS_PRIORITY = {"High": 1, "Medium": 5, "Low": 9}
+ICS_DATE_FORMAT = "%Y%m%dT%H%M%S"
+
+def detect_format(path: str, default: str = "json") -> str:
+    """Guess the format from a file extension"""
+    extension = path.rsplit('.', 1)[-1].lower() if '.' in path else ""
+    if extension == "ical":
+        return "ics"
+    return extension if extension in FORMATS else default
+
+def parse_task(data: Dict) -> Dict:
+    """
+    Convert one JSON task to its in-memory form, tolerating missing fields
+
+    Raises ValueError if add_task would not accept it (see check_task).
+    """
+    return check_task(task_from_json({**{field: None for field in DATE_FIELDS}, **data}))
+
+def _invalid(errors: Optional[List[str]], where: str, error: Exception):
+    """Skip a task that cannot be read, noting why, or raise without an errors list"""
+    message = f"{where}: {error}"
+    if errors is None:
+        raise ValueError(message)
+    errors.append(message)
+
+# JSON
+
+def read_json(file: TextIO, errors: Optional[List[str]] = None) -> Iterator[Dict]:
+    """Read a tasks.json style array (parsed at once, use jsonl for huge files)"""
+    for number, data in enumerate(json.load(file), 1):
+        try:
+            task = parse_task(data)
+        except (TypeError, ValueError) as e:
+            _invalid(errors, f"task {number}", e)
+            continue
+        yield task
+
+def write_json(tasks: Iterable[Dict], file: TextIO) -> int:
+    """Write a tasks.json style array, one task at a time"""
+    count = 0
+    file.write("[")
+    for task in tasks:
+        text = json.dumps(task_to_json(task), indent=2, ensure_ascii=False)
+        file.write(("\n" if count == 0 else ",\n") + "  " + text.replace("\n", "\n  "))
+        count += 1
+    file.write("\n]\n" if count else "]\n")
+    return count
+
+# JSON Lines
+
+def read_jsonl(file: TextIO, errors: Optional[List[str]] = None) -> Iterator[Dict]:
+    """Read one JSON task per line, skipping blank lines"""
+    for number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            task = parse_task(json.loads(line))
+        except (TypeError, ValueError) as e:
+            _invalid(errors, f"line {number}", e)
+            continue
+        yield task
+
+def write_jsonl(tasks: Iterable[Dict], file: TextIO) -> int:
+    """Write one JSON task per line"""
+    count = 0
+    for task in tasks:
+        file.write(json.dumps(task_to_json(task), ensure_ascii=False) + "\n")
+        count += 1
+    return count
+
+# CSV
+
+def _csv_task(row: Dict[str, str]) -> Dict:
+    data = {key: value for key, value in row.items() if key in CSV_FIELDS and value}
+    if 'completed' in data:
+        data['completed'] = data['completed'].strip().lower() in ("1", "true", "yes", "x")
+    for field in ('reminders', 'recurrence'):
+        if field in data:
+            data[field] = json.loads(data[field])
+    if 'estimate' in data:
+        data['estimate'] = int(data['estimate'])
+    if 'tags' in data:
+        data['tags'] = clean_tags(data['tags'].split(","))
+    return parse_task(data)
+
+def read_csv(file: TextIO, errors: Optional[List[str]] = None) -> Iterator[Dict]:
+    """Read tasks from CSV; only the description column is required"""
+    reader = csv.DictReader(file)
+    for row in reader:
+        try:
+            task = _csv_task(row)
+        except (TypeError, ValueError) as e:
+            _invalid(errors, f"line {reader.line_num}", e)
+            continue
+        yield task
+
+def write_csv(tasks: Iterable[Dict], file: TextIO) -> int:
+    """Write tasks as CSV with a header row"""
+    writer = csv.DictWriter(file, fieldnames=CSV_FIELDS, extrasaction='ignore')
+    writer.writeheader()
+    count = 0
+    for task in tasks:
+        row = task_to_json(task)
+        row['completed'] = "true" if row.get('completed') else "false"
+        for field in ('reminders', 'recurrence'):
+            row[field] = json.dumps(row[field]) if row.get(field) else ""
+        row['tags'] = ",".join(row.get('tags') or ())
+        writer.writerow(row)
+        count += 1
+    return count
+
+# iCalendar
+
+def _ics_escape(text: str) -> str:
+    return (text.replace("\\", "\\\\").replace(";", "\\;")
+            .replace(",", "\\,").replace("\n", "\\n"))
+
+def _ics_unescape(text: str) -> str:
+    result = []
+    chars = iter(text)
+    for char in chars:
+        if char == "\\":
+            char = next(chars, "")
+            result.append("\n" if char in ("n", "N") else char)
+        else:
+            result.append(char)
+    return "".join(result)
+
+def _ics_fold(line: str) -> str:
+    """Fold a content line to 75 octets as RFC 5545 requires"""
+    if len(line.encode('utf-8')) <= 75:
+        return line + "\r\n"
+    parts = []
+    current = ""
+    limit = 75
+    for char in line:
+        if len((current + char).encode('utf-8')) > limit:
+            parts.append(current)
+            current = ""
+            limit = 74  # continuation lines start with a space
+        current += char
+    parts.append(current)
+    return "\r\n ".join(parts) + "\r\n"
+
+def _ics_date(value: str, params: Dict[str, str]) -> datetime:
+    """Parse DATE / DATE-TIME values; UTC times become local naive times"""
+    if params.get('VALUE') == "DATE" or len(value) == 8:
+        return datetime.strptime(value[:8], "%Y%m%d")
+    if value.endswith("Z"):
+        utc = datetime.strptime(value[:-1], ICS_DATE_FORMAT).replace(tzinfo=timezone.utc)
+        return utc.astimezone().replace(tzinfo=None)
+    return datetime.strptime(value, ICS_DATE_FORMAT)
+
+def _ics_lines(file: TextIO) -> Iterator[str]:
+    """Yield unfolded content lines"""
+    pending = None
+    for raw in file:
+        line = raw.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and pending is not None:
+            pending += line[1:]
+            continue
+        if pending is not None:
+            yield pending
+        pending = line
+    if pending:
+        yield pending
+
+def read_ics(file: TextIO, errors: Optional[List[str]] = None) -> Iterator[Dict]:
+    """Read VTODO components from an iCalendar file"""
+    data = None
+    number = 0
+    for line in _ics_lines(file):
+        name_part, _, value = line.partition(":")
+        name, *param_list = name_part.split(";")
+        name = name.upper()
+        params = dict(param.split("=", 1) for param in param_list if "=" in param)
+
+        if name == "BEGIN" and value.upper() == "VTODO":
+            data = {}
+            series_start = None
+            number += 1
+            continue
+        if data is None:
+            continue
+        task = None
+        try:
+            if name == "END" and value.upper() == "VTODO":
+                # The series is anchored at DTSTART, or at the due date without one
+                anchor = series_start or data.get('due_date')
+                if 'recurrence' in data and anchor:
+                    data['recurrence'] = with_start(data['recurrence'], datetime.fromisoformat(anchor))
+                else:
+                    data.pop('recurrence', None)
+                task = parse_task(data)
+            elif name == "UID":
+                data['id'] = value
+            elif name == "SUMMARY":
+                data['description'] = _ics_unescape(value)
+            elif name == "DUE":
+                data['due_date'] = _ics_date(value, params).isoformat()
+            elif name == "DTSTART":
+                series_start = _ics_date(value, params).isoformat()
+            elif name == "CREATED":
+                data['created_at'] = _ics_date(value, params).isoformat()
+            elif name == "COMPLETED":
+                data['completed_at'] = _ics_date(value, params).isoformat()
+            elif name == "STATUS":
+                data['completed'] = value.upper() == "COMPLETED"
+            elif name == "PRIORITY" and value.strip().isdigit():
+                level = int(value)
+                if level:
+                    data['priority'] = "High" if level < 5 else "Medium" if level == 5 else "Low"
+            elif name == "RRULE":
+                try:
+                    data['recurrence'] = from_rrule(value)
+                except ValueError:
+                    pass  # rules beyond the supported subset import as one-off tasks
+            elif name == "X-TODO-REMINDERS":
+                data['reminders'] = json.loads(_ics_unescape(value))
+            elif name == "X-TODO-ESTIMATE" and value.strip().isdigit():
+                data['estimate'] = int(value)
+            elif name == "CATEGORIES":
+                data['tags'] = clean_tags(data.get('tags', []) + _ics_unescape(value).split(","))
+        except (TypeError, ValueError) as e:
+            _invalid(errors, f"VTODO {number}", e)
+            data = None  # skip the rest of it
+            continue
+        if task is not None:
+            yield task
+            data = None
+
+def write_ics(tasks: Iterable[Dict], file: TextIO) -> int:
+    """Write tasks as iCalendar VTODO components"""
+    file.write("BEGIN:VCALENDAR\r\nVERSION:2.0\r\n"
+               "PRODID:-//Personal To-Do List Assistant//EN\r\n")
+    stamp = datetime.now(timezone.utc).strftime(ICS_DATE_FORMAT) + "Z"
+    count = 0
+    for task in tasks:
+        lines = ["BEGIN:VTODO", f"UID:{task['id']}", f"DTSTAMP:{stamp}",
+                 f"SUMMARY:{_ics_escape(task['description'])}"]
+        if task.get('created_at'):
+            lines.append(f"CREATED:{task['created_at'].strftime(ICS_DATE_FORMAT)}")
+        if task.get('due_date'):
+            lines.append(f"DUE:{task['due_date'].strftime(ICS_DATE_FORMAT)}")
+        lines.append(f"PRIORITY:{ICS_PRIORITY.get(task.get('priority'), 0)}")
+        lines.append("STATUS:COMPLETED" if task.get('completed') else "STATUS:NEEDS-ACTION")
+        if task.get('recurrence'):
+            start = datetime.fromisoformat(task['recurrence']['start'])
+            lines.append(f"DTSTART:{start.strftime(ICS_DATE_FORMAT)}")
+            lines.append(f"RRULE:{to_rrule(task['recurrence'])}")
+        if task.get('completed_at'):
+            lines.append(f"COMPLETED:{task['completed_at'].strftime(ICS_DATE_FORMAT)}")
+        if task.get('reminders'):
+            lines.append(f"X-TODO-REMINDERS:{_ics_escape(json.dumps(task['reminders']))}")
+        if task.get('estimate'):
+            lines.append(f"X-TODO-ESTIMATE:{task['estimate']}")
+        if task.get('tags'):
+            lines.append("CATEGORIES:" + ",".join(task['tags']))
+        lines.append("END:VTODO")
+        file.write("".join(_ics_fold(line) for line in lines))
+        count += 1
+    file.write("END:VCALENDAR\r\n")
+    return count
+
+READERS = {'json': read_json, 'jsonl': read_jsonl, 'csv': read_csv, 'ics': read_ics}
+WRITERS = {'json': write_json, 'jsonl': write_jsonl, 'csv': write_csv, 'ics': write_ics}
+
+class Progress:
+    def __init__(self, callback: Optional[Callable[['Progress'], None]] = None,
+                 every: int = 10000):
+        """
+        Count items flowing through an import or export
+
+        Args:
+            callback: Called with this object every `every` items and once
+                at the end
+            every: Reporting interval in items
+        """
+        self.callback = callback
+        self.every = every
+        self.count = 0
+        self.started = None
+        self.finished = None
+
+    def track(self, items: Iterable) -> Iterator:
+        """Pass items through, counting them"""
+        self.started = time.perf_counter()
+        callback = self.callback
+        every = self.every
+        for item in items:
+            yield item
+            self.count += 1
+            if callback and self.count % every == 0:
+                callback(self)
+        self.finished = time.perf_counter()
+        if callback:
+            callback(self)
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds since tracking started"""
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def rate(self) -> float:
+        """Items per second"""
+        elapsed = self.elapsed
+        return self.count / elapsed if elapsed > 0 else 0.0
+
+@contextmanager
+def _open(path: str, mode: str):
+    """Open a file for streaming, with - meaning stdin or stdout"""
+    if path == "-":
+        yield sys.stdin if 'r' in mode else sys.stdout
+        return
+    # csv and ics manage their own line endings
+    with open(path, mode, encoding='utf-8', newline='') as file:
+        yield file
+
+def read_file(path: str, fmt: Optional[str] = None,
+              errors: Optional[List[str]] = None) -> Iterator[Dict]:
+    """
+    Stream tasks from a file (- for stdin) in the given or detected format
+
+    Tasks that cannot be read are skipped and described in errors if given,
+    otherwise they raise ValueError.
+    """
+    fmt = fmt or detect_format(path)
+    with _open(path, 'r') as file:
+        yield from READERS[fmt](file, errors)
+
+def write_file(tasks: Iterable[Dict], path: str, fmt: Optional[str] = None) -> int:
+    """Stream tasks to a file (- for stdout), returns the number written"""
+    fmt = fmt or detect_format(path)
+    with _open(path, 'w') as file:
+        return WRITERS[fmt](tasks, file)
+
+def import_file(task_manager, path: str, fmt: Optional[str] = None, overwrite: bool = False,
+                progress: Optional[Progress] = None, flag_duplicates: bool = False) -> Dict:
+    """
+    Import a file through TaskManager.import_tasks (one batched save)
+
+    Tasks that cannot be read are skipped rather than ending the import
+    halfway through.
+
+    Returns:
+        import_tasks counts (with unreadable tasks counted as 'skipped'),
+        'errors' describing those, 'seconds' (including the save) and
+        'rate' in tasks per second
+    """
+    progress = progress or Progress()
+    errors = []
+    start = time.perf_counter()
+    counts = task_manager.import_tasks(progress.track(read_file(path, fmt, errors)), overwrite,
+                                       flag_duplicates)
+    counts['skipped'] += len(errors)
+    counts['errors'] = errors
+    counts['seconds'] = time.perf_counter() - start
+    counts['rate'] = progress.count / counts['seconds'] if counts['seconds'] > 0 else 0.0
+    return counts
+
+def export_file(task_manager, path: str, fmt: Optional[str] = None,
+                progress: Optional[Progress] = None) -> Dict:
+    """
+    Export all tasks to a file
+
+    Returns:
+        'exported' count plus 'seconds' and 'rate' in tasks per second
+    """
+    progress = progress or Progress()
+    count = write_file(progress.track(task_manager.get_all_tasks()), path, fmt)
+    return {'exported': count, 'seconds': progress.elapsed, 'rate': progress.rate}
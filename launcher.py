@@ -61,13 +61,14 @@ def check_files():
     print("✓ All required files found")
     return True
 
-def launch_app():
-    """Launch the main application"""
+def launch_app(argv=None):
+    """Launch the main application, passing on options such as --profile"""
     try:
         print("🚀 Starting Personal To-Do List Assistant...")
 
         # Import and run the main app
-        import main
+        import main as todo_app
+        todo_app.main(argv)
 
     except ImportError as e:
         print(f"❌ Import error: {e}")
@@ -104,7 +105,7 @@ def main():
     print("\n" + "=" * 40)
 
     # Launch the app
-    if not launch_app():
+    if not launch_app(sys.argv[1:]):
         input("Press Enter to exit...")
         sys.exit(1)
 
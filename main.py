@@ -3,22 +3,98 @@ from tkinter import ttk, messagebox
 from tkinter import font
 import json
 import os
+import re
 from datetime import datetime, timedelta
 import threading
 import time
 from task_manager import TaskManager
 from reminder_system import ReminderSystem
+from ui_bridge import UIEventQueue, FrameTimer, LatestOnlyWorker
+from optimistic_store import OptimisticStore
+from task_list_view import VirtualTaskList
+from task_index import TaskIndex
+from metrics import METRICS
+from nl_parser import parse as parse_quick_add
+from recurrence import describe, parse_repeat
+
+# How often the "Next up" line is re-ranked
+NEXT_UP_INTERVAL_MS = 5000
+
+# Search words naming a tag, e.g. #work
+TAG_WORD_RE = re.compile(r"^#[\w-]+$")
+
+# Repeat dropdown labels and the phrases they stand for
+REPEAT_CHOICES = {"None": None, "Daily": "daily", "Weekdays": "weekdays",
+                  "Weekly": "weekly", "Monthly": "monthly"}
+
+def repeat_choice(rule) -> str:
+    """Dropdown label for a task's rule; 'Custom' for rules it cannot show"""
+    if not rule:
+        return "None"
+    if rule.get('interval', 1) != 1 or rule.get('count') or rule.get('until'):
+        return "Custom"
+    if rule['freq'] == 'weekly':
+        weekdays = rule.get('weekdays') or []
+        if weekdays == [0, 1, 2, 3, 4]:
+            return "Weekdays"
+        return "Weekly" if len(weekdays) == 1 else "Custom"
+    return rule['freq'].capitalize()
 
 class TodoApp:
-    def __init__(self, root):
+    def __init__(self, root, profiler=None):
+        """
+        Args:
+            root: Tk root window
+            profiler: Optional profiling.Profiler; the reminder thread is
+                then profiled too
+        """
         self.root = root
+        self.profiler = profiler
         self.root.title("Personal To-Do List Assistant")
         self.root.geometry("800x600")
         self.root.configure(bg='#f0f0f0')
 
-        # Initialize task manager and reminder system
+        # Events from background threads are applied on the main thread
+        self.ui_queue = UIEventQueue()
+
+        # Records how long each handler blocks the main loop
+        self.frame_timer = FrameTimer()
+
+        # Periodic metrics snapshots when TODO_METRICS names a file; started
+        # before the task manager so the initial load is measured
+        METRICS.configure_from_env()
+
+        # Initialize task manager and reminder system. Tasks are loaded
+        # before the main loop starts; later writes go through the store
+        # facade so disk I/O never runs on the Tk thread.
         self.task_manager = TaskManager()
-        self.reminder_system = ReminderSystem(self.task_manager)
+        self.store = OptimisticStore(self.task_manager, self.ui_queue)
+        self.reminder_system = ReminderSystem(self.task_manager, event_queue=self.ui_queue)
+
+        # Search and filters query the indexes on a background thread, so
+        # the dependency graph and tag index are created here rather than
+        # on that thread
+        self.task_manager.dependencies
+        self.task_manager.tag_index
+        self.task_index = TaskIndex(self.task_manager)
+        threading.Thread(target=self.task_index.warm_sort_keys, daemon=True).start()
+        # Related tasks and planned times are shown on the Tk thread; the
+        # indexes behind them are built in the background and used once ready
+        self.ready_indexes = set()
+        self._plan_signature = None
+        for name in ('similarity', 'planner'):
+            threading.Thread(target=self.warm_index, args=(name,), daemon=True).start()
+        self.query_worker = LatestOnlyWorker(self.ui_queue)
+        self.filter_active = False
+        self._search_after = None
+        self.sort_key = None
+        self.sort_reverse = False
+
+        # Every change is kept in the version history (see history.py)
+        self.task_manager.history
+
+        # Auto-tagging and prioritising rules, if a rules file exists
+        self.load_rules()
 
         # Start reminder system in background
         self.start_reminder_thread()
@@ -26,6 +102,14 @@ class TodoApp:
         # Create GUI elements
         self.create_widgets()
         self.refresh_task_list()
+        self.ui_queue.attach(self.root, self.frame_timer.wrap('ui_events', self.handle_ui_events))
+
+        # Rows are updated from the ids each mutation touches
+        self.task_manager.add_listener(self.on_task_changed)
+
+        self.frame_timer.start_heartbeat(self.root)
+        self.refresh_next_up()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def create_widgets(self):
         # Title
@@ -40,9 +124,16 @@ class TodoApp:
 
         # Task input
         tk.Label(input_frame, text="Task:", bg='#f0f0f0').grid(row=0, column=0, sticky='w', padx=5)
-        self.task_entry = tk.Entry(input_frame, width=40, font=("Arial", 10))
+        self.task_var = tk.StringVar()
+        self.task_entry = tk.Entry(input_frame, textvariable=self.task_var, width=40, font=("Arial", 10))
         self.task_entry.grid(row=0, column=1, padx=5, pady=2)
 
+        # Live preview of the quick add parse, e.g. "call Sam tomorrow 5pm !high"
+        self.preview_var = tk.StringVar()
+        tk.Label(input_frame, textvariable=self.preview_var, bg='#f0f0f0', fg='#666',
+                 anchor='w').grid(row=0, column=2, sticky='w', padx=5)
+        self.task_var.trace_add('write', lambda *args: self.update_quick_add_preview())
+
         # Due date input
         tk.Label(input_frame, text="Due Date (YYYY-MM-DD HH:MM):", bg='#f0f0f0').grid(row=1, column=0, sticky='w', padx=5)
         self.due_date_entry = tk.Entry(input_frame, width=40, font=("Arial", 10))
@@ -55,53 +146,112 @@ class TodoApp:
                                      values=["High", "Medium", "Low"], state="readonly")
         priority_combo.grid(row=2, column=1, padx=5, pady=2, sticky='w')
 
+        # Repeat dropdown
+        tk.Label(input_frame, text="Repeat:", bg='#f0f0f0').grid(row=3, column=0, sticky='w', padx=5)
+        self.repeat_var = tk.StringVar(value="None")
+        repeat_combo = ttk.Combobox(input_frame, textvariable=self.repeat_var,
+                                    values=list(REPEAT_CHOICES), state="readonly")
+        repeat_combo.grid(row=3, column=1, padx=5, pady=2, sticky='w')
+
+        # Effort estimate, used to plan the task into working hours
+        tk.Label(input_frame, text="Estimate (minutes):", bg='#f0f0f0').grid(row=4, column=0, sticky='w', padx=5)
+        self.estimate_entry = tk.Entry(input_frame, width=10, font=("Arial", 10))
+        self.estimate_entry.grid(row=4, column=1, padx=5, pady=2, sticky='w')
+
+        # Tags, e.g. "work, urgent"
+        tk.Label(input_frame, text="Tags:", bg='#f0f0f0').grid(row=5, column=0, sticky='w', padx=5)
+        self.tags_entry = tk.Entry(input_frame, width=40, font=("Arial", 10))
+        self.tags_entry.grid(row=5, column=1, padx=5, pady=2)
+
         # Buttons
         button_frame = tk.Frame(input_frame, bg='#f0f0f0')
-        button_frame.grid(row=3, column=0, columnspan=2, pady=10)
+        button_frame.grid(row=6, column=0, columnspan=2, pady=10)
 
-        add_btn = tk.Button(button_frame, text="Add Task", command=self.add_task, 
+        add_btn = tk.Button(button_frame, text="Add Task", command=self.frame_timer.wrap('add_task', self.add_task), 
                            bg='#4CAF50', fg='white', padx=20)
         add_btn.pack(side='left', padx=5)
 
-        update_btn = tk.Button(button_frame, text="Update Task", command=self.update_task, 
+        update_btn = tk.Button(button_frame, text="Update Task", command=self.frame_timer.wrap('update_task', self.update_task), 
                               bg='#2196F3', fg='white', padx=20)
         update_btn.pack(side='left', padx=5)
 
-        delete_btn = tk.Button(button_frame, text="Delete Task", command=self.delete_task, 
+        delete_btn = tk.Button(button_frame, text="Delete Task", command=self.frame_timer.wrap('delete_task', self.delete_task), 
                               bg='#f44336', fg='white', padx=20)
         delete_btn.pack(side='left', padx=5)
 
+        # Search and filter bar
+        filter_frame = tk.Frame(self.root, bg='#f0f0f0')
+        filter_frame.pack(padx=20, fill='x')
+
+        tk.Label(filter_frame, text="Search:", bg='#f0f0f0').pack(side='left', padx=5)
+        self.search_var = tk.StringVar()
+        tk.Entry(filter_frame, textvariable=self.search_var, width=25,
+                 font=("Arial", 10)).pack(side='left', padx=5)
+
+        self.filter_priority_var = tk.StringVar(value="All")
+        ttk.Combobox(filter_frame, textvariable=self.filter_priority_var, width=8,
+                     values=["All", "High", "Medium", "Low"], state="readonly").pack(side='left', padx=5)
+
+        self.filter_status_var = tk.StringVar(value="All")
+        ttk.Combobox(filter_frame, textvariable=self.filter_status_var, width=10,
+                     values=["All", "Pending", "Actionable", "Completed"],
+                     state="readonly").pack(side='left', padx=5)
+
+        self.filter_due_var = tk.StringVar(value="Any time")
+        ttk.Combobox(filter_frame, textvariable=self.filter_due_var, width=12,
+                     values=["Any time", "Overdue", "Today", "Next 7 days", "No due date"],
+                     state="readonly").pack(side='left', padx=5)
+
+        tk.Button(filter_frame, text="Clear", command=self.clear_filters).pack(side='left', padx=5)
+
+        for var in (self.search_var, self.filter_priority_var,
+                    self.filter_status_var, self.filter_due_var):
+            var.trace_add('write', lambda *args: self.schedule_search())
+
         # Task list frame
         list_frame = tk.Frame(self.root, bg='#f0f0f0')
         list_frame.pack(pady=10, padx=20, fill='both', expand=True)
 
-        # Task listbox with scrollbar
-        list_container = tk.Frame(list_frame, bg='#f0f0f0')
-        list_container.pack(fill='both', expand=True)
-
-        scrollbar = tk.Scrollbar(list_container)
-        scrollbar.pack(side='right', fill='y')
-
-        self.task_listbox = tk.Listbox(list_container, yscrollcommand=scrollbar.set, 
-                                      font=("Arial", 10), selectmode='single')
-        self.task_listbox.pack(side='left', fill='both', expand=True)
-        scrollbar.config(command=self.task_listbox.yview)
+        # Sortable column headers
+        header_frame = tk.Frame(list_frame, bg='#f0f0f0')
+        header_frame.pack(fill='x')
+        self.sort_buttons = {}
+        for key, label in [(None, "Added"), ('status', "Status"), ('priority', "Priority"),
+                           ('due', "Due"), ('created', "Created")]:
+            button = tk.Button(header_frame, text=label, relief='groove', bg='#e0e0e0',
+                               command=lambda key=key: self.sort_by(key))
+            button.pack(side='left', fill='x', expand=True)
+            self.sort_buttons[key] = (button, label)
+
+        # Virtualized task list, only the visible rows are drawn
+        self.task_list = VirtualTaskList(list_frame, self.format_task_row, bg='#f0f0f0')
+        self.task_list.pack(fill='both', expand=True)
 
         # Bind double-click to select task for editing
-        self.task_listbox.bind('<Double-1>', self.load_selected_task)
+        self.task_list.bind_double_click(self.load_selected_task)
 
         # Control buttons
         control_frame = tk.Frame(self.root, bg='#f0f0f0')
         control_frame.pack(pady=10)
 
         complete_btn = tk.Button(control_frame, text="Mark Complete", 
-                                command=self.mark_complete, bg='#8BC34A', fg='white', padx=20)
+                                command=self.frame_timer.wrap('mark_complete', self.mark_complete), bg='#8BC34A', fg='white', padx=20)
         complete_btn.pack(side='left', padx=5)
 
         refresh_btn = tk.Button(control_frame, text="Refresh", 
-                               command=self.refresh_task_list, bg='#9E9E9E', fg='white', padx=20)
+                               command=self.frame_timer.wrap('refresh', self.refresh_task_list), bg='#9E9E9E', fg='white', padx=20)
         refresh_btn.pack(side='left', padx=5)
 
+        # Suggested next tasks, refreshed as time passes
+        self.next_up_var = tk.StringVar()
+        tk.Label(self.root, textvariable=self.next_up_var, anchor='w', bg='#f0f0f0',
+                 fg='#333').pack(side='bottom', fill='x', padx=20)
+
+        # Tasks like the one being edited
+        self.related_var = tk.StringVar()
+        tk.Label(self.root, textvariable=self.related_var, anchor='w', bg='#f0f0f0',
+                 fg='#666').pack(side='bottom', fill='x', padx=20)
+
         # Status bar
         self.status_var = tk.StringVar()
         self.status_var.set("Ready")
@@ -127,19 +277,49 @@ class TodoApp:
                 messagebox.showerror("Error", "Invalid date format. Use YYYY-MM-DD HH:MM")
                 return
 
+        recurrence = self.selected_repeat()
+        estimate = self.entered_estimate()
+        tags = self.entered_tags()
+        if estimate is None or tags is None:
+            return
+
+        # Without a due date field, dates, repeats and !priority are read
+        # from the description itself
+        if not due_date_str:
+            quick = parse_quick_add(task_desc, self.task_manager.clock.now())
+            task_desc = quick['description']
+            if not task_desc:
+                messagebox.showerror("Error", "Please enter a task description")
+                return
+            due_date = quick['due_date']
+            priority = quick['priority'] or priority
+            recurrence = quick['recurrence'] or recurrence
+            tags = sorted(set(tags) | set(quick['tags']))
+
+        if recurrence and due_date is None:
+            messagebox.showerror("Error", "A repeating task needs a due date")
+            return
+
         # Add task
-        self.task_manager.add_task(task_desc, due_date, priority)
+        task_id = self.store.add_task(task_desc, due_date, priority,
+                                      on_done=self.report_save_result(f"Task '{task_desc}' saved"),
+                                      recurrence=recurrence, flag_duplicates=True,
+                                      estimate=estimate or None, tags=tags)
         self.clear_inputs()
-        self.refresh_task_list()
-        self.status_var.set(f"Task '{task_desc}' added successfully")
+        duplicate_of = self.task_manager.get_task_by_id(task_id).get('duplicate_of')
+        original = self.task_manager.get_task_by_id(duplicate_of) if duplicate_of else None
+        if original is not None:
+            self.status_var.set(f"Task '{task_desc}' added - possible duplicate of "
+                                f"'{original['description']}'")
+        else:
+            self.status_var.set(f"Task '{task_desc}' added successfully")
 
     def update_task(self):
-        selection = self.task_listbox.curselection()
-        if not selection:
+        task_id = self.task_list.selected_id()
+        if not task_id:
             messagebox.showerror("Error", "Please select a task to update")
             return
 
-        task_index = selection[0]
         task_desc = self.task_entry.get().strip()
         due_date_str = self.due_date_entry.get().strip()
         priority = self.priority_var.get()
@@ -157,90 +337,454 @@ class TodoApp:
                 messagebox.showerror("Error", "Invalid date format. Use YYYY-MM-DD HH:MM")
                 return
 
-        # Update task
-        tasks = self.task_manager.get_all_tasks()
-        if task_index < len(tasks):
-            task_id = tasks[task_index]['id']
-            self.task_manager.update_task(task_id, task_desc, due_date, priority)
+        recurrence = self.selected_repeat()
+        if recurrence and due_date is None:
+            messagebox.showerror("Error", "A repeating task needs a due date")
+            return
+        estimate = self.entered_estimate()
+        tags = self.entered_tags()
+        if estimate is None or tags is None:
+            return
+
+        # Update task; an empty rule stops the task repeating
+        if self.store.update_task(task_id, task_desc, due_date, priority,
+                                  on_done=self.report_save_result("Task update saved"),
+                                  recurrence=recurrence or self.kept_repeat(),
+                                  estimate=estimate, tags=tags):
             self.clear_inputs()
-            self.refresh_task_list()
             self.status_var.set("Task updated successfully")
 
     def delete_task(self):
-        selection = self.task_listbox.curselection()
-        if not selection:
+        task_id = self.task_list.selected_id()
+        if not task_id:
             messagebox.showerror("Error", "Please select a task to delete")
             return
 
         if messagebox.askyesno("Confirm", "Are you sure you want to delete this task?"):
-            task_index = selection[0]
-            tasks = self.task_manager.get_all_tasks()
-            if task_index < len(tasks):
-                task_id = tasks[task_index]['id']
-                self.task_manager.delete_task(task_id)
-                self.refresh_task_list()
+            if self.store.delete_task(task_id, on_done=self.report_save_result("Task deletion saved")):
                 self.status_var.set("Task deleted successfully")
 
     def mark_complete(self):
-        selection = self.task_listbox.curselection()
-        if not selection:
+        task_id = self.task_list.selected_id()
+        if not task_id:
             messagebox.showerror("Error", "Please select a task to mark as complete")
             return
 
-        task_index = selection[0]
-        tasks = self.task_manager.get_all_tasks()
-        if task_index < len(tasks):
-            task_id = tasks[task_index]['id']
-            self.task_manager.mark_complete(task_id)
-            self.refresh_task_list()
+        if self.store.mark_complete(task_id, on_done=self.report_save_result("Task completion saved")):
             self.status_var.set("Task marked as complete")
 
     def load_selected_task(self, event):
-        selection = self.task_listbox.curselection()
-        if selection:
-            task_index = selection[0]
-            tasks = self.task_manager.get_all_tasks()
-            if task_index < len(tasks):
-                task = tasks[task_index]
-                self.task_entry.delete(0, tk.END)
-                self.task_entry.insert(0, task['description'])
+        task_id = self.task_list.selected_id()
+        task = self.task_manager.get_task_by_id(task_id) if task_id else None
+        if task:
+            self.task_entry.delete(0, tk.END)
+            self.task_entry.insert(0, task['description'])
 
-                if task['due_date']:
-                    self.due_date_entry.delete(0, tk.END)
-                    self.due_date_entry.insert(0, task['due_date'].strftime("%Y-%m-%d %H:%M"))
+            self.due_date_entry.delete(0, tk.END)
+            if task['due_date']:
+                self.due_date_entry.insert(0, task['due_date'].strftime("%Y-%m-%d %H:%M"))
 
-                self.priority_var.set(task['priority'])
+            self.priority_var.set(task['priority'])
+            self.repeat_var.set(repeat_choice(task.get('recurrence')))
+
+            self.estimate_entry.delete(0, tk.END)
+            if task.get('estimate'):
+                self.estimate_entry.insert(0, str(task['estimate']))
+
+            self.tags_entry.delete(0, tk.END)
+            self.tags_entry.insert(0, ", ".join(task.get('tags') or ()))
+
+            self.show_related_tasks(task_id)
+
+    def show_related_tasks(self, task_id):
+        """Show the tasks most similar to the selected one, once the index is built"""
+        related = []
+        if task_id and 'similarity' in self.ready_indexes:
+            related = self.task_manager.get_related_tasks(task_id, 3)
+        self.related_var.set("Related: " + "  •  ".join(other['description'] for other in related)
+                             if related else "")
+
+    def update_quick_add_preview(self):
+        """Show what quick add understood, on every keystroke"""
+        text = self.task_var.get().strip()
+        if not text or self.due_date_entry.get().strip():
+            self.preview_var.set("")
+            return
+        quick = parse_quick_add(text, self.task_manager.clock.now())
+        parts = []
+        if quick['due_date']:
+            parts.append("📅 " + quick['due_date'].strftime("%a %Y-%m-%d %H:%M"))
+        if quick['recurrence']:
+            parts.append("↻ " + describe(quick['recurrence']))
+        if quick['priority']:
+            parts.append(quick['priority'])
+        if quick['tags']:
+            parts.append(" ".join("#" + tag for tag in quick['tags']))
+        self.preview_var.set("  ".join(parts))
+
+    def selected_repeat(self):
+        """Repeat rule chosen in the dropdown, None for 'None' and 'Custom'"""
+        phrase = REPEAT_CHOICES.get(self.repeat_var.get())
+        return parse_repeat(phrase) if phrase else None
+
+    def kept_repeat(self):
+        """Update argument when no preset is chosen: keep a custom rule, else clear it"""
+        return None if self.repeat_var.get() == "Custom" else {}
+
+    def entered_estimate(self):
+        """Minutes in the estimate field, 0 when empty, None (after an error) if invalid"""
+        text = self.estimate_entry.get().strip()
+        if not text:
+            return 0
+        if not text.isdigit():
+            messagebox.showerror("Error", "The estimate must be a whole number of minutes")
+            return None
+        return int(text)
+
+    def entered_tags(self):
+        """Tags in the tags field, None (after an error) if one is invalid"""
+        from tags import normalize_tags
+        try:
+            return normalize_tags(self.tags_entry.get().replace(",", " ").split())
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return None
 
     def clear_inputs(self):
         self.task_entry.delete(0, tk.END)
         self.due_date_entry.delete(0, tk.END)
+        self.estimate_entry.delete(0, tk.END)
+        self.tags_entry.delete(0, tk.END)
         self.priority_var.set("Medium")
+        self.repeat_var.set("None")
 
-    def refresh_task_list(self):
-        self.task_listbox.delete(0, tk.END)
-        tasks = self.task_manager.get_all_tasks()
+    def format_task_row(self, task_id):
+        task = self.task_manager.get_task_by_id(task_id)
+        if task is None:
+            return ""
 
-        for task in tasks:
-            status = "✓" if task['completed'] else "○"
-            due_str = ""
-            if task['due_date']:
-                due_str = f" (Due: {task['due_date'].strftime('%Y-%m-%d %H:%M')})"
+        if task['completed']:
+            status = "✓"
+        else:
+            status = "○" if self.task_manager.dependencies.is_actionable(task_id) else "⏳"
+        indent = "    ↳ " if task.get('parent_id') else ""
+        due_str = ""
+        if task['due_date']:
+            due_str = f" (Due: {task['due_date'].strftime('%Y-%m-%d %H:%M')})"
 
-            priority_symbol = {"High": "🔴", "Medium": "🟡", "Low": "🟢"}.get(task['priority'], "🟡")
+        priority_symbol = {"High": "🔴", "Medium": "🟡", "Low": "🟢"}.get(task['priority'], "🟡")
 
-            display_text = f"{status} {priority_symbol} {task['description']}{due_str}"
-            self.task_listbox.insert(tk.END, display_text)
+        repeat_str = ""
+        if task.get('recurrence'):
+            repeat_str = f" ↻ {describe(task['recurrence'])}"
 
-        # Update status
-        total_tasks = len(tasks)
-        completed_tasks = len([t for t in tasks if t['completed']])
+        duplicate_str = " ⧉" if task.get('duplicate_of') else ""
+        tags_str = "".join(f" #{tag}" for tag in task.get('tags') or ())
+
+        plan_str = ""
+        if not task['completed'] and 'planner' in self.ready_indexes:
+            entry = self.task_manager.planner.scheduled(task_id)
+            if entry is not None:
+                plan_str = f" 🗓 {entry['start'].strftime('%a %H:%M')}" + (" ⚠️" if entry['late'] else "")
+
+        return (f"{indent}{status} {priority_symbol} {task['description']}{due_str}"
+                f"{tags_str}{repeat_str}{duplicate_str}{plan_str}")
+
+    def refresh_task_list(self):
+        if self.filter_active:
+            self.run_search()
+            return
+
+        # Rows are formatted lazily by the view, only ids are collected here,
+        # in the order of the cached sort permutation
+        tasks = self.task_manager.tasks
+        self.task_list.set_ids(self.task_index.sorted_ids(self.sort_key, self.sort_reverse),
+                               clear_cache=True)
+        self.completed_ids = {task['id'] for task in tasks if task['completed']}
+        self.update_status_counts()
+
+    def update_status_counts(self):
+        total_tasks = len(self.task_manager.tasks)
+        completed_tasks = len(self.completed_ids)
         self.status_var.set(f"Total: {total_tasks}, Completed: {completed_tasks}, Pending: {total_tasks - completed_tasks}")
 
+    def load_rules(self):
+        """Apply the rules file next to the task data (see rules.py), if any"""
+        from rules import read_rules, rules_path
+        path = rules_path(self.task_manager.data_file)
+        if os.path.exists(path):
+            try:
+                self.task_manager.set_rules(read_rules(path))
+            except ValueError as e:
+                print(f"Error loading rules: {e}")
+
+    def warm_index(self, name):
+        """Create a TaskManager index (background thread) and report it ready"""
+        getattr(self.task_manager, name)
+        self.ui_queue.post('index_ready', name)
+
+    def refresh_next_up(self):
+        """Show the top ranked tasks; cheap enough to rerun every few seconds"""
+        # Tasks coming due may now match a rule
+        self.task_manager.check_rules()
+        tasks = self.task_manager.next_tasks(3)
+        if tasks:
+            self.next_up_var.set("Next up: " + "  •  ".join(task['description'] for task in tasks))
+        else:
+            self.next_up_var.set("")
+        self.refresh_plan()
+        self.root.after(NEXT_UP_INTERVAL_MS, self.frame_timer.wrap('next_up', self.refresh_next_up))
+
+    def refresh_plan(self):
+        """Format the visible rows again if planned times moved since the last call"""
+        if 'planner' not in self.ready_indexes:
+            return
+        signature = self.task_manager.planner.signature()
+        if signature != self._plan_signature:
+            self._plan_signature = signature
+            self.task_list.invalidate()
+
+    def on_task_changed(self, event, task):
+        """TaskManager listener, may be called from any thread"""
+        task_id = task['id'] if task else None
+        if threading.current_thread() is threading.main_thread():
+            self.apply_task_changes({task_id} if task_id else None)
+        else:
+            self.ui_queue.post('task_changed', task_id)
+
+    def apply_task_changes(self, task_ids):
+        """Insert, update or remove only the rows of the given task ids"""
+        if task_ids is None:
+            self.refresh_task_list()
+            return
+
+        for task_id in task_ids:
+            # Tasks waiting for this one may have become blocked or actionable
+            for dependent in self.task_manager.dependencies.dependents(task_id):
+                if self.task_list.has_row(dependent):
+                    self.task_list.update_row(dependent)
+
+            task = self.task_manager.get_task_by_id(task_id)
+            if task is None:
+                self.task_list.remove_row(task_id)
+                self.completed_ids.discard(task_id)
+                continue
+
+            if self.sort_key is not None and not self.filter_active:
+                # The sort value may have changed: move the row to its new place
+                self.task_list.remove_row(task_id)
+                self.task_list.insert_row(task_id, self.task_index.sort_position(
+                    self.sort_key, task_id, self.sort_reverse))
+            elif self.task_list.has_row(task_id):
+                self.task_list.update_row(task_id)
+            elif not self.filter_active:
+                self.task_list.insert_row(task_id)
+
+            if task['completed']:
+                self.completed_ids.add(task_id)
+            else:
+                self.completed_ids.discard(task_id)
+
+        # Whether changed tasks still match is decided by a fresh query
+        if self.filter_active and task_ids:
+            self.schedule_search()
+
+    def sort_by(self, key):
+        """Column header click: sort by key, clicking again reverses"""
+        if key == self.sort_key and key is not None:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_key = key
+            self.sort_reverse = False
+
+        for button_key, (button, label) in self.sort_buttons.items():
+            if button_key == key:
+                label += " ▼" if self.sort_reverse else " ▲"
+            button.config(text=label)
+        self.refresh_task_list()
+
+    def current_filters(self):
+        """Filters for TaskIndex.query, or None when nothing is filtered"""
+        filters = {}
+        # "#work" words filter by tag, the other words by description
+        words = self.search_var.get().split()
+        tags = [word[1:].lower() for word in words if TAG_WORD_RE.match(word)]
+        text = " ".join(word for word in words if not TAG_WORD_RE.match(word))
+        if text:
+            filters['text'] = text
+        if tags:
+            filters['tags'] = tags
+        if self.filter_priority_var.get() != "All":
+            filters['priority'] = self.filter_priority_var.get()
+        if self.filter_status_var.get() != "All":
+            filters['status'] = self.filter_status_var.get().lower()
+
+        due = self.filter_due_var.get()
+        now = self.task_manager.clock.now()
+        if due == "Overdue":
+            filters['due_to'] = now
+            filters.setdefault('status', 'pending')
+        elif due == "Today":
+            filters['due_from'] = now.replace(hour=0, minute=0, second=0, microsecond=0)
+            filters['due_to'] = filters['due_from'] + timedelta(days=1)
+        elif due == "Next 7 days":
+            filters['due_from'] = now
+            filters['due_to'] = now + timedelta(days=7)
+        elif due == "No due date":
+            filters['has_due'] = False
+        return filters or None
+
+    def schedule_search(self):
+        """Debounce keystrokes and filter changes"""
+        if self._search_after is not None:
+            self.root.after_cancel(self._search_after)
+        self._search_after = self.root.after(150, self.run_search)
+
+    def run_search(self):
+        self._search_after = None
+        filters = self.current_filters()
+        if filters is None:
+            self.query_worker.cancel()
+            self.filter_active = False
+            self.refresh_task_list()
+            return
+
+        self.filter_active = True
+        sort, reverse = self.sort_key, self.sort_reverse
+        self.query_worker.submit(
+            lambda cancelled: self.task_index.query(sort=sort, reverse=reverse,
+                                                    cancelled=cancelled, **filters),
+            self.show_search_results)
+
+    def show_search_results(self, task_ids):
+        if task_ids is None or not self.filter_active:
+            return
+        self.task_list.set_ids(task_ids, clear_cache=True)
+        self.status_var.set(f"Showing {len(task_ids)} of {len(self.task_manager.tasks)} tasks")
+
+    def clear_filters(self):
+        self.search_var.set("")
+        self.filter_priority_var.set("All")
+        self.filter_status_var.set("All")
+        self.filter_due_var.set("Any time")
+
+    def handle_ui_events(self, events):
+        """Apply a batch of events posted by background threads"""
+        notifications = []
+        status = None
+        refresh = False
+        changed_ids = set()
+        store_results = []
+        for kind, payload in events:
+            if kind == 'notification':
+                notifications.append(payload)
+            elif kind == 'status':
+                status = payload
+            elif kind == 'tasks_changed':
+                refresh = True
+            elif kind == 'task_changed':
+                if payload is None:
+                    refresh = True
+                else:
+                    changed_ids.add(payload)
+            elif kind == 'store_result':
+                store_results.append(payload)
+            elif kind == 'query_result':
+                self.query_worker.deliver(payload)
+            elif kind == 'index_ready':
+                self.ready_indexes.add(payload)
+                if payload == 'similarity':
+                    self.show_related_tasks(self.task_list.selected_id())
+                elif payload == 'planner':
+                    self.refresh_plan()
+
+        # Confirm writes, rolling back changes that could not be saved
+        if store_results:
+            self.store.handle_results(store_results)
+
+        # A burst of events costs a single redraw
+        if refresh or len(changed_ids) > 500:
+            self.refresh_task_list()
+        elif changed_ids:
+            self.apply_task_changes(changed_ids)
+            self.update_status_counts()
+
+        if len(notifications) > 3:
+            titles = [n['title'] for n in notifications]
+            summary = "\n".join(titles[:5])
+            if len(titles) > 5:
+                summary += f"\n... and {len(titles) - 5} more"
+            self.show_reminder_popup(f"{len(titles)} reminders", summary)
+        else:
+            for n in notifications:
+                self.show_reminder_popup(n['title'], n['message'])
+
+        if status is not None:
+            self.status_var.set(status)
+
+    def report_save_result(self, success_message):
+        def on_done(ok, error):
+            if ok:
+                self.status_var.set(success_message)
+            else:
+                self.status_var.set(f"Could not save changes, reverted: {error}")
+        return on_done
+
+    def on_close(self):
+        self.reminder_system.stop()
+        self.store.close(timeout=10)
+        METRICS.stop_exporter()
+        if os.environ.get("TODO_FRAME_REPORT"):
+            for name, stats in sorted(self.frame_timer.report().items()):
+                print(f"{name}: {stats}")
+        self.root.destroy()
+
+    def show_reminder_popup(self, title, message):
+        popup = tk.Toplevel(self.root)
+        popup.title("Task Reminder")
+        popup.geometry("300x120")
+        popup.attributes('-topmost', True)
+
+        tk.Label(popup, text=title, font=("Arial", 10, "bold"), wraplength=280).pack(pady=5)
+        tk.Label(popup, text=message, wraplength=280, justify='left').pack(pady=5)
+
+        tk.Button(popup, text="OK", command=popup.destroy).pack(pady=10)
+
+        # Auto-close after 10 seconds
+        popup.after(10000, lambda: popup.winfo_exists() and popup.destroy())
+
     def start_reminder_thread(self):
-        reminder_thread = threading.Thread(target=self.reminder_system.start, daemon=True)
+        target = self.reminder_system.start
+        if self.profiler is not None:
+            target = self.profiler.wrap_thread('reminders', target)
+        reminder_thread = threading.Thread(target=target, name='reminders', daemon=True)
         reminder_thread.start()
 
-if __name__ == "__main__":
+def main(argv=None):
+    """Run the application; --profile records a profile of the session"""
+    import argparse
+    parser = argparse.ArgumentParser(description="Personal To-Do List Assistant")
+    parser.add_argument("--profile", action="store_true",
+                        help="profile the GUI and reminder threads until the window closes")
+    parser.add_argument("--profile-dir", default="profiles",
+                        help="where profiles are written (default: profiles)")
+    parser.add_argument("--profile-keep", type=int, default=5,
+                        help="number of profiles kept (default: 5)")
+    args, _ = parser.parse_known_args(argv)
+
+    profiler = None
+    if args.profile:
+        from profiling import Profiler
+        profiler = Profiler(args.profile_dir, keep=args.profile_keep)
+        profiler.start()
+
     root = tk.Tk()
-    app = TodoApp(root)
-    root.mainloop()
+    app = TodoApp(root, profiler=profiler)
+    try:
+        root.mainloop()
+    finally:
+        if profiler is not None:
+            print(f"Profile written to {profiler.stop()}")
+
+if __name__ == "__main__":
+    main()
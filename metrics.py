@@ -0,0 +1,225 @@
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+# Histogram bucket upper bounds in seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _key(name: str, labels: Dict[str, str]) -> Tuple[str, Tuple]:
+    return name, tuple(sorted(labels.items()))
+
+def _format_labels(labels: Tuple, extra: str = "") -> str:
+    parts = [f'{key}="{str(value)}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Metrics:
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        """
+        Counters and latency histograms for the hot paths
+
+        Disabled by default: instrumented code then pays one attribute check
+        per call. Enable with enable() or the TODO_METRICS environment
+        variable (see configure_from_env).
+
+        Args:
+            buckets: Histogram bucket upper bounds in seconds
+        """
+        self.enabled = False
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters = {}  # (name, labels) -> value
+        self._timers = {}    # (name, labels) -> [count, sum, max, per-bucket counts]
+        self._exporter = None
+        self._stop = threading.Event()
+
+    def enable(self):
+        """Start recording"""
+        self.enabled = True
+
+    def disable(self):
+        """Stop recording (collected values are kept)"""
+        self.enabled = False
+
+    def reset(self):
+        """Drop all collected values"""
+        with self._lock:
+            self._counters = {}
+            self._timers = {}
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        """Add to a counter"""
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        """Record one duration in a histogram"""
+        if self.enabled:
+            self._observe(_key(name, labels), seconds)
+
+    def _observe(self, key: Tuple, seconds: float):
+        with self._lock:
+            entry = self._timers.get(key)
+            if entry is None:
+                entry = self._timers[key] = [0, 0.0, 0.0, [0] * (len(self.buckets) + 1)]
+            entry[0] += 1
+            entry[1] += seconds
+            if seconds > entry[2]:
+                entry[2] = seconds
+            entry[3][bisect.bisect_left(self.buckets, seconds)] += 1
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Time a block into a histogram"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def timed(self, name: str, **labels) -> Callable:
+        """
+        Decorator timing every call of a function into a histogram
+
+        Usage:
+            @METRICS.timed('todo_operation_seconds', op='load_tasks')
+            def load_tasks(self): ...
+        """
+        key = _key(name, labels)
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self._observe(key, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def snapshot(self) -> Dict:
+        """Copy of all values as a JSON-friendly dict"""
+        with self._lock:
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self._counters.items())]
+            timers = []
+            for (name, labels), (count, total, worst, buckets) in sorted(self._timers.items()):
+                timers.append({
+                    'name': name,
+                    'labels': dict(labels),
+                    'count': count,
+                    'sum': total,
+                    'max': worst,
+                    'mean': total / count if count else 0.0,
+                    'buckets': {str(bound): hits for bound, hits
+                                in zip(list(self.buckets) + ["+Inf"], buckets)},
+                })
+        return {'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'counters': counters, 'timers': timers}
+
+    def to_prometheus(self) -> str:
+        """All values in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{name}{_format_labels(labels)} {value:g}")
+
+            for (name, labels), (count, total, worst, buckets) in sorted(self._timers.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                cumulative = 0
+                for bound, hits in zip(list(self.buckets) + ["+Inf"], buckets):
+                    cumulative += hits
+                    bucket_labels = _format_labels(labels, f'le="{bound}"')
+                    lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {total:.6f}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str, fmt: Optional[str] = None):
+        """
+        Write a snapshot to a file atomically
+
+        Args:
+            path: Output file
+            fmt: 'json' or 'prometheus'; by default json for .json files,
+                prometheus otherwise
+        """
+        fmt = fmt or ('json' if path.endswith('.json') else 'prometheus')
+        text = json.dumps(self.snapshot(), indent=2) if fmt == 'json' else self.to_prometheus()
+        temp_file = path + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as file:
+            file.write(text)
+        os.replace(temp_file, path)
+
+    def start_exporter(self, path: str, interval: float = 15.0, fmt: Optional[str] = None):
+        """Enable recording and write a snapshot every interval seconds"""
+        self.stop_exporter()
+        self.enable()
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.write(path, fmt)
+                except OSError as e:
+                    print(f"Error writing metrics: {e}")
+
+        self._exporter = (threading.Thread(target=run, name="metrics-exporter", daemon=True),
+                          path, fmt)
+        self._exporter[0].start()
+
+    def stop_exporter(self):
+        """Stop the exporter, writing a final snapshot"""
+        if self._exporter is None:
+            return
+        thread, path, fmt = self._exporter
+        self._exporter = None
+        self._stop.set()
+        thread.join()
+        try:
+            self.write(path, fmt)
+        except OSError as e:
+            print(f"Error writing metrics: {e}")
+
+    def configure_from_env(self) -> bool:
+        """
+        Start exporting if TODO_METRICS names an output file
+
+        TODO_METRICS_INTERVAL sets the snapshot period in seconds (default
+        15). Returns True if metrics were enabled.
+        """
+        path = os.environ.get("TODO_METRICS")
+        if not path:
+            return False
+        try:
+            interval = float(os.environ.get("TODO_METRICS_INTERVAL", "15"))
+        except ValueError:
+            interval = 15.0
+        self.start_exporter(path, interval)
+        return True
+
+# Process-wide registry used by the instrumented modules
+METRICS = Metrics()
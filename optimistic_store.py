@@ -0,0 +1,97 @@
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+from persistence import WriteBehindSaver
+
+class OptimisticStore:
+    def __init__(self, task_manager, event_queue, delay: float = 0.05):
+        """
+        GUI-facing facade that keeps disk writes off the Tk main thread
+
+        Each mutation is applied to the in-memory TaskManager right away and
+        persisted by a WriteBehindSaver. When the write finishes, a
+        'store_result' event is posted to the event queue; the GUI hands it
+        to handle_results() on the main thread, which rolls the change back
+        if the write failed and then calls the optional on_done callback.
+
+        Args:
+            task_manager: TaskManager to wrap
+            event_queue: UIEventQueue drained by the GUI
+            delay: Seconds the writer waits to coalesce bursts of changes
+        """
+        self.task_manager = task_manager
+        self.event_queue = event_queue
+        self.saver = WriteBehindSaver(task_manager, delay)
+        task_manager.save_handler = self.saver.request_save
+
+    def add_task(self, description: str, due_date: Optional[datetime] = None,
+                 priority: str = "Medium", on_done: Optional[Callable] = None,
+                 recurrence: Optional[Dict] = None, flag_duplicates: bool = False,
+                 estimate: Optional[int] = None, tags: Optional[List[str]] = None) -> str:
+        """Add a task optimistically, returns its id"""
+        task_id = self.task_manager.add_task(description, due_date, priority,
+                                             recurrence=recurrence,
+                                             flag_duplicates=flag_duplicates,
+                                             estimate=estimate, tags=tags)
+        self._persist(lambda: self.task_manager.delete_task(task_id), on_done)
+        return task_id
+
+    def update_task(self, task_id: str, description: Optional[str] = None,
+                    due_date: Optional[datetime] = None, priority: Optional[str] = None,
+                    on_done: Optional[Callable] = None,
+                    recurrence: Optional[Dict] = None, estimate: Optional[int] = None,
+                    tags: Optional[List[str]] = None) -> bool:
+        """Update a task optimistically"""
+        before = self.task_manager.get_task_by_id(task_id)
+        if before is None:
+            return False
+        self.task_manager.update_task(task_id, description, due_date, priority,
+                                      recurrence=recurrence, estimate=estimate, tags=tags)
+        self._persist(lambda: self.task_manager.restore_task(before), on_done)
+        return True
+
+    def delete_task(self, task_id: str, on_done: Optional[Callable] = None) -> bool:
+        """Delete a task optimistically"""
+        before = self.task_manager.get_task_by_id(task_id)
+        if before is None:
+            return False
+        index = next(i for i, task in enumerate(self.task_manager.tasks) if task['id'] == task_id)
+        self.task_manager.delete_task(task_id)
+        self._persist(lambda: self.task_manager.restore_task(before, index), on_done)
+        return True
+
+    def mark_complete(self, task_id: str, on_done: Optional[Callable] = None) -> bool:
+        """Mark a task complete optimistically"""
+        before = self.task_manager.get_task_by_id(task_id)
+        if before is None:
+            return False
+        self.task_manager.mark_complete(task_id)
+        self._persist(lambda: self.task_manager.restore_task(before), on_done)
+        return True
+
+    def handle_results(self, results: List[tuple]):
+        """
+        Confirm or roll back finished writes (main thread only)
+
+        Failed changes are undone newest first, so changes that shared a
+        failed write unwind in the reverse order they were made.
+        """
+        for ok, error, undo, on_done in reversed(results):
+            if not ok:
+                undo()
+        for ok, error, undo, on_done in results:
+            if on_done is not None:
+                on_done(ok, error)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait for pending writes, e.g. before the window closes"""
+        return self.saver.flush(timeout)
+
+    def close(self, timeout: Optional[float] = None):
+        """Finish pending writes and restore synchronous saving"""
+        self.saver.stop(timeout)
+        self.task_manager.save_handler = None
+
+    def _persist(self, undo: Callable, on_done: Optional[Callable]):
+        def saved(ok, error):
+            self.event_queue.post('store_result', (ok, error, undo, on_done))
+        self.saver.request_save(saved)
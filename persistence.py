@@ -0,0 +1,91 @@
+import threading
+from typing import Callable, List, Optional
+
+class WriteBehindSaver:
+    def __init__(self, task_manager, delay: float = 0.0):
+        """
+        Persist a TaskManager on a background thread
+
+        Save requests are coalesced: however many arrive while a write is in
+        progress, they are all covered by the next single write.
+
+        Args:
+            task_manager: TaskManager whose tasks are written
+            delay: Seconds to wait after the first request before writing,
+                letting a burst of mutations share one write
+        """
+        self.task_manager = task_manager
+        self.delay = delay
+        self._condition = threading.Condition()
+        self._pending = False
+        self._callbacks = []
+        self._writing = False
+        self._running = True
+        self.writes = 0
+        self.last_error = None
+        self._thread = threading.Thread(target=self._run, name="store-writer", daemon=True)
+        self._thread.start()
+
+    def request_save(self, callback: Optional[Callable[[bool, Optional[Exception]], None]] = None):
+        """
+        Schedule a write of the current tasks
+
+        Args:
+            callback: Called on the writer thread as callback(ok, error) once
+                a write covering this request has finished
+        """
+        with self._condition:
+            self._pending = True
+            if callback is not None:
+                self._callbacks.append(callback)
+            self._condition.notify()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until every requested write has finished"""
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: not self._pending and not self._writing, timeout)
+
+    def stop(self, timeout: Optional[float] = None):
+        """Finish pending writes and stop the writer thread"""
+        self.flush(timeout)
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending or not self._running)
+                if not self._pending and not self._running:
+                    return
+
+            if self.delay:
+                with self._condition:
+                    self._condition.wait_for(lambda: not self._running, self.delay)
+
+            with self._condition:
+                self._pending = False
+                self._writing = True
+                callbacks: List[Callable] = self._callbacks
+                self._callbacks = []
+
+            error = None
+            try:
+                self.task_manager.write_tasks()
+                self.writes += 1
+            except Exception as e:
+                error = e
+                print(f"Error saving tasks: {e}")
+            self.last_error = error
+
+            for callback in callbacks:
+                try:
+                    callback(error is None, error)
+                except Exception as e:
+                    print(f"Error in save callback: {e}")
+
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
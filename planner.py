@@ -0,0 +1,357 @@
+"""
+Auto-scheduling of pending tasks into working hours
+
+Tasks are planned earliest deadline first (EDF): ordered by due date
+(tasks without one last, then by priority and age) and packed back to
+back into free working time from now on. With every task available now,
+EDF on one worker minimizes the worst lateness, so if any order meets all
+due dates this one does. A task takes its 'estimate' in minutes, or
+DEFAULT_ESTIMATE.
+
+Free time is measured in minutes along a timeline of working hours minus
+busy blocks, so a task's place in the plan is the sum of the estimates
+before it in EDF order. The order is a sorted list; when a task changes,
+only the offsets after its old or new position are recomputed, and busy
+blocks or a new "now" only rebuild the timeline, never the order.
+Offsets are turned into calendar blocks on demand, with a binary search
+over the timeline.
+
+Blockers and subtasks are not taken into account.
+"""
+
+import bisect
+import threading
+from datetime import datetime, time, timedelta
+from itertools import accumulate
+from typing import Dict, List, Optional
+
+from ranking import PRIORITY_LEVEL
+
+DEFAULT_ESTIMATE = 30  # minutes
+WORK_DAYS = (0, 1, 2, 3, 4)
+DAY_START = time(9, 0)
+DAY_END = time(17, 0)
+# Tasks that do not fit in this many days from now are left unplanned
+HORIZON_DAYS = 3 * 365
+
+def minutes_between(start: datetime, end: datetime) -> int:
+    """Whole minutes from start to end"""
+    return int((end - start).total_seconds() // 60)
+
+class BusyCalendar:
+    def __init__(self):
+        """
+        Busy blocks (meetings, appointments) as disjoint sorted intervals
+
+        Overlapping and touching blocks are merged when added, so the
+        blocks overlapping any window are found with two binary searches,
+        as with an interval tree.
+        """
+        self._starts = []
+        self._ends = []
+
+    def add(self, start: datetime, end: datetime):
+        """Mark [start, end) busy"""
+        if end <= start:
+            raise ValueError("A busy block must end after it starts")
+        first = bisect.bisect_left(self._ends, start)   # first block ending at or after start
+        last = bisect.bisect_right(self._starts, end)   # blocks starting after end are untouched
+        if first < last:
+            start = min(start, self._starts[first])
+            end = max(end, self._ends[last - 1])
+        self._starts[first:last] = [start]
+        self._ends[first:last] = [end]
+
+    def remove(self, start: datetime, end: datetime):
+        """Mark [start, end) free again, splitting blocks as needed"""
+        first = bisect.bisect_right(self._ends, start)
+        last = bisect.bisect_left(self._starts, end)
+        starts, ends = [], []
+        for block_start, block_end in zip(self._starts[first:last], self._ends[first:last]):
+            if block_start < start:
+                starts.append(block_start)
+                ends.append(start)
+            if block_end > end:
+                starts.append(end)
+                ends.append(block_end)
+        self._starts[first:last] = starts
+        self._ends[first:last] = ends
+
+    def overlapping(self, start: datetime, end: datetime) -> List[tuple]:
+        """Busy blocks overlapping [start, end), in order"""
+        first = bisect.bisect_right(self._ends, start)
+        last = bisect.bisect_left(self._starts, end)
+        return list(zip(self._starts[first:last], self._ends[first:last]))
+
+    def __iter__(self):
+        return iter(zip(self._starts, self._ends))
+
+    def __len__(self):
+        return len(self._starts)
+
+class Timeline:
+    def __init__(self, origin: datetime, busy: BusyCalendar, work_days=WORK_DAYS,
+                 day_start: time = DAY_START, day_end: time = DAY_END):
+        """
+        Free working time from origin on, built a day at a time as needed
+
+        A point of the timeline is a number of free minutes after origin.
+        """
+        self.origin = origin
+        self.busy = busy
+        self.work_days = work_days
+        self.day_start = day_start
+        self.day_end = day_end
+        self._slot_starts = []   # start of every free slot
+        self._slot_ends = []
+        self._offsets = [0]      # free minutes before each slot, plus the total
+        self._day = origin.date()
+        self._last_day = self._day + timedelta(days=HORIZON_DAYS)
+
+    @property
+    def total(self) -> int:
+        """Free minutes built so far"""
+        return self._offsets[-1]
+
+    def extend_to(self, minutes: int) -> bool:
+        """Build slots until at least minutes are free; False past the horizon"""
+        while self._offsets[-1] < minutes:
+            if not self._build_day():
+                return False
+        return True
+
+    def _build_day(self) -> bool:
+        """Add the free slots of the next day, False past the horizon"""
+        if self._day > self._last_day:
+            return False
+        day = self._day
+        self._day += timedelta(days=1)
+        if day.weekday() in self.work_days:
+            start = max(datetime.combine(day, self.day_start), self.origin)
+            end = datetime.combine(day, self.day_end)
+            for busy_start, busy_end in self.busy.overlapping(start, end):
+                self._add_slot(start, busy_start)
+                start = max(start, busy_end)
+            self._add_slot(start, end)
+        return True
+
+    def _add_slot(self, start: datetime, end: datetime):
+        length = minutes_between(start, end)
+        if length > 0:
+            self._slot_starts.append(start)
+            self._slot_ends.append(end)
+            self._offsets.append(self._offsets[-1] + length)
+
+    def blocks(self, start: int, end: int) -> List[tuple]:
+        """Calendar blocks (start, end) covering free minutes [start, end)"""
+        if not self.extend_to(end):
+            return []
+        index = bisect.bisect_right(self._offsets, start) - 1
+        blocks = []
+        while start < end:
+            slot_start = self._slot_starts[index]
+            offset = self._offsets[index]
+            block_end = min(end, self._offsets[index + 1])
+            blocks.append((slot_start + timedelta(minutes=start - offset),
+                           slot_start + timedelta(minutes=block_end - offset)))
+            start = block_end
+            index += 1
+        return blocks
+
+    def end_time(self, minutes: int) -> datetime:
+        """Time at which the first minutes of free time have passed"""
+        if minutes <= 0:
+            return self.origin
+        if not self.extend_to(minutes):
+            return datetime.max
+        index = bisect.bisect_left(self._offsets, minutes) - 1
+        return self._slot_starts[index] + timedelta(minutes=minutes - self._offsets[index])
+
+    def offset_at(self, when: datetime) -> int:
+        """Free minutes between origin and a time"""
+        while self._day <= when.date() and self._build_day():
+            pass
+        index = bisect.bisect_right(self._slot_starts, when) - 1
+        if index < 0:
+            return 0
+        return self._offsets[index] + max(0, minutes_between(
+            self._slot_starts[index], min(when, self._slot_ends[index])))
+
+class Planner:
+    def __init__(self, task_manager, work_days=WORK_DAYS, day_start: time = DAY_START,
+                 day_end: time = DAY_END):
+        """
+        Plan of pending tasks in working hours, maintained through a listener
+
+        Args:
+            task_manager: TaskManager to plan
+            work_days: Weekdays worked on (0 = Monday)
+            day_start: Start of the working day
+            day_end: End of the working day
+        """
+        self.task_manager = task_manager
+        self.work_days = tuple(work_days)
+        self.day_start = day_start
+        self.day_end = day_end
+        self.busy = BusyCalendar()
+        self._timeline = None
+        self.revision = 0  # bumped whenever the plan may have changed
+        self._lock = threading.RLock()
+        # Listen before reading the tasks so the plan can be built on a
+        # background thread: changes made meanwhile wait for the lock
+        with self._lock:
+            task_manager.add_listener(self._on_task_changed)
+            self.rebuild()
+
+    def rebuild(self):
+        """Re-read every pending task"""
+        with self._lock:
+            self._keys = {}      # task_id -> EDF sort key
+            self._minutes = {}   # task_id -> planned length
+            for task in list(self.task_manager.tasks):
+                if not task['completed']:
+                    self._keys[task['id']] = self.key(task)
+                    self._minutes[task['id']] = self.estimate(task)
+            self._order = sorted(self._keys.values())
+            self._ends = []      # free minute offset at which each task of _order ends
+            self._dirty = 0      # _ends is valid before this position
+            self.revision += 1
+
+    @staticmethod
+    def key(task: Dict) -> tuple:
+        """EDF order: due date, then priority, then age"""
+        return (task['due_date'] or datetime.max, -PRIORITY_LEVEL.get(task['priority'], 1),
+                task['created_at'] or datetime.min, task['id'])
+
+    @staticmethod
+    def estimate(task: Dict) -> int:
+        """Minutes planned for a task"""
+        return task.get('estimate') or DEFAULT_ESTIMATE
+
+    def _on_task_changed(self, event: str, task: Optional[Dict]):
+        with self._lock:
+            if event == 'loaded':
+                self.rebuild()
+                return
+            task_id = task['id']
+            old = self._keys.pop(task_id, None)
+            old_minutes = self._minutes.get(task_id)
+            if old is not None:
+                position = bisect.bisect_left(self._order, old)
+                del self._order[position]
+                self._dirty = min(self._dirty, position)
+            self._minutes.pop(task_id, None)
+            if event != 'deleted' and not task['completed']:
+                key = self._keys[task_id] = self.key(task)
+                self._minutes[task_id] = self.estimate(task)
+                position = bisect.bisect_left(self._order, key)
+                self._order.insert(position, key)
+                self._dirty = min(self._dirty, position)
+            if self._keys.get(task_id) != old or self._minutes.get(task_id) != old_minutes:
+                self.revision += 1
+
+    def _refresh(self):
+        """Recompute the end offsets after the first change since the last query"""
+        dirty = self._dirty
+        if dirty < len(self._ends) or dirty < len(self._order):
+            del self._ends[dirty:]
+            minutes = self._minutes
+            start = self._ends[-1] if self._ends else 0
+            self._ends.extend(start + end for end in
+                              accumulate(minutes[key[-1]] for key in self._order[dirty:]))
+        self._dirty = len(self._order)
+
+    def timeline(self, now: Optional[datetime] = None) -> Timeline:
+        """Free time from now (the task manager clock by default), cached per minute"""
+        origin = (now or self.task_manager.clock.now()).replace(second=0, microsecond=0)
+        if self._timeline is None or self._timeline.origin != origin:
+            self._timeline = Timeline(origin, self.busy, self.work_days,
+                                      self.day_start, self.day_end)
+        return self._timeline
+
+    def add_busy(self, start: datetime, end: datetime):
+        """Keep [start, end) free of tasks"""
+        with self._lock:
+            self.busy.add(start, end)
+            self._timeline = None
+            self.revision += 1
+
+    def remove_busy(self, start: datetime, end: datetime):
+        """Make [start, end) available for tasks again"""
+        with self._lock:
+            self.busy.remove(start, end)
+            self._timeline = None
+            self.revision += 1
+
+    def signature(self, now: Optional[datetime] = None) -> tuple:
+        """
+        Value that changes whenever the plan does: a task or busy time
+        changed, or time passed the first free minute
+        """
+        with self._lock:
+            first = self.timeline(now).blocks(0, 1)
+            return (self.revision, first[0][0] if first else None)
+
+    def _entry(self, position: int, timeline: Timeline) -> Optional[Dict]:
+        key = self._order[position]
+        end = self._ends[position]
+        start = end - self._minutes[key[-1]]
+        blocks = timeline.blocks(start, end)
+        if not blocks:
+            return None
+        due = key[0] if key[0] != datetime.max else None
+        return {'task_id': key[-1], 'start': blocks[0][0], 'end': blocks[-1][1],
+                'blocks': blocks, 'late': due is not None and blocks[-1][1] > due}
+
+    def plan(self, now: Optional[datetime] = None, until: Optional[datetime] = None) -> List[Dict]:
+        """
+        The schedule in order, one entry per task
+
+        Args:
+            now: Time planning starts from, the clock by default
+            until: Only return tasks starting before this time
+
+        Returns:
+            Dicts with 'task_id', 'start', 'end', 'blocks' (the (start, end)
+            pieces of working time the task is split into) and 'late' (ends
+            after its due date); tasks beyond the horizon are left out
+        """
+        with self._lock:
+            self._refresh()
+            timeline = self.timeline(now)
+            count = len(self._order)
+            if until is not None:
+                # Tasks are contiguous in free time: the first task ending
+                # after the offset of until is the last one starting before it
+                offset = timeline.offset_at(until)
+                count = min(count, bisect.bisect_right(self._ends, offset) + 1)
+            entries = []
+            for position in range(count):
+                entry = self._entry(position, timeline)
+                if entry is None:
+                    break
+                if until is None or entry['start'] < until:
+                    entries.append(entry)
+            return entries
+
+    def scheduled(self, task_id: str, now: Optional[datetime] = None) -> Optional[Dict]:
+        """The plan entry of one task, or None if it is not planned"""
+        with self._lock:
+            key = self._keys.get(task_id)
+            if key is None:
+                return None
+            self._refresh()
+            return self._entry(bisect.bisect_left(self._order, key), self.timeline(now))
+
+    def late_tasks(self, now: Optional[datetime] = None) -> List[str]:
+        """Ids of the tasks the plan cannot finish by their due date"""
+        with self._lock:
+            self._refresh()
+            timeline = self.timeline(now)
+            late = []
+            for position, key in enumerate(self._order):
+                if key[0] == datetime.max:
+                    break  # undated tasks come last and are never late
+                if timeline.end_time(self._ends[position]) > key[0]:
+                    late.append(key[-1])
+            return late
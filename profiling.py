@@ -0,0 +1,146 @@
+"""
+Opt-in profiling for the GUI and its background threads
+
+Profiler runs cProfile on the Tk main thread and on threads started via
+wrap_thread(), plus a low-rate stack sampler covering every thread. On
+stop() it writes one capture directory holding, per thread:
+
+    <thread>.pstats      cProfile data (python -m pstats, snakeviz, ...)
+    <thread>.collapsed   sampled stacks in the collapsed format read by
+                         flamegraph.pl and speedscope
+    summary.txt          the top functions of every profiled thread
+
+Only the newest `keep` captures are kept.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import re
+import shutil
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+def _safe_name(name: str) -> str:
+    return re.sub(r"[^\w.-]+", "_", name) or "thread"
+
+class Profiler:
+    def __init__(self, directory: str = "profiles", keep: int = 5,
+                 sample_interval: float = 0.005):
+        """
+        Args:
+            directory: Where capture directories are created
+            keep: Number of captures kept; older ones are deleted
+            sample_interval: Seconds between stack samples
+        """
+        self.directory = directory
+        self.keep = keep
+        self.sample_interval = sample_interval
+        self.profiles = {}   # thread name -> cProfile.Profile
+        self.samples = {}    # thread name -> {collapsed stack: count}
+        self._lock = threading.Lock()
+        self._running = False
+        self._sampler = None
+        self._main_profile = None
+
+    def start(self):
+        """Start profiling the calling (main) thread and sampling all threads"""
+        self._running = True
+        self._main_profile = cProfile.Profile()
+        self.profiles[threading.current_thread().name] = self._main_profile
+        self._main_profile.enable()
+        self._sampler = threading.Thread(target=self._sample_loop, name="profiler-sampler",
+                                         daemon=True)
+        self._sampler.start()
+
+    def wrap_thread(self, name: str, target: Callable) -> Callable:
+        """Wrap a thread target so it runs under its own cProfile"""
+        def profiled(*args, **kwargs):
+            threading.current_thread().name = name
+            profile = cProfile.Profile()
+            with self._lock:
+                self.profiles[name] = profile
+            profile.enable()
+            try:
+                return target(*args, **kwargs)
+            finally:
+                profile.disable()
+        return profiled
+
+    def _sample_loop(self):
+        me = threading.get_ident()
+        while self._running:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:"
+                                 f"{code.co_firstlineno})")
+                    frame = frame.f_back
+                key = ";".join(reversed(stack))
+                counts = self.samples.setdefault(names.get(ident, str(ident)), {})
+                counts[key] = counts.get(key, 0) + 1
+            time.sleep(self.sample_interval)
+
+    def stop(self, join_timeout: float = 2.0) -> Optional[str]:
+        """
+        Stop profiling and write a capture
+
+        Must be called on the thread that called start(). Threads wrapped
+        with wrap_thread() should be stopped first; they are given
+        join_timeout seconds to finish before their data is written.
+
+        Returns:
+            Path of the capture directory, or None if nothing was started
+        """
+        if not self._running:
+            return None
+        self._main_profile.disable()
+        self._running = False
+        self._sampler.join()
+        deadline = time.monotonic() + join_timeout
+        for thread in threading.enumerate():
+            if thread.name in self.profiles and thread is not threading.current_thread():
+                thread.join(max(0.0, deadline - time.monotonic()))
+
+        path = os.path.join(self.directory, datetime.now().strftime("%Y%m%d-%H%M%S-%f"))
+        os.makedirs(path, exist_ok=True)
+        summary = io.StringIO()
+        with self._lock:
+            profiles = dict(self.profiles)
+        for name, profile in profiles.items():
+            try:
+                stats = pstats.Stats(profile, stream=summary)
+            except TypeError:
+                continue  # the thread never ran any profiled code
+            stats.dump_stats(os.path.join(path, f"{_safe_name(name)}.pstats"))
+            summary.write(f"==== {name} ====\n")
+            stats.sort_stats('cumulative').print_stats(25)
+        for name, counts in self.samples.items():
+            with open(os.path.join(path, f"{_safe_name(name)}.collapsed"), 'w',
+                      encoding='utf-8') as file:
+                for stack, count in sorted(counts.items()):
+                    file.write(f"{stack} {count}\n")
+        with open(os.path.join(path, "summary.txt"), 'w', encoding='utf-8') as file:
+            file.write(summary.getvalue())
+
+        self._rotate()
+        return path
+
+    def _rotate(self):
+        """Delete all but the newest `keep` captures"""
+        captures = sorted(entry for entry in os.listdir(self.directory)
+                          if os.path.isdir(os.path.join(self.directory, entry)))
+        for entry in captures[:-max(1, self.keep)]:
+            shutil.rmtree(os.path.join(self.directory, entry), ignore_errors=True)
+
+    def report(self) -> Dict[str, int]:
+        """Number of stack samples taken per thread"""
+        return {name: sum(counts.values()) for name, counts in self.samples.items()}
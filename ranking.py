@@ -0,0 +1,156 @@
+"""
+"What should I do next" ranking of pending tasks
+
+A task's score at time now (all times in hours) is
+
+    priority * level            level: High 2, Medium 1, Low 0
+  + urgency  * (now - due)      negative until due, grows once overdue
+  + age      * (now - created)  priority aging: old tasks rise slowly
+
+Every term is linear in now, and the now terms are the same for all tasks
+with a due date (urgency + age) and for all tasks without one (age). So
+within each group the order never changes as time passes: a task only
+needs re-scoring when it is edited, and the ranking is kept in two heaps
+keyed by the time independent part of the score. next_tasks(k) walks both
+heaps best first without popping them, in O(k log k).
+"""
+
+import heapq
+import itertools
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+PRIORITY_LEVEL = {"High": 2, "Medium": 1, "Low": 0}
+
+# One priority level is worth two days of urgency; waiting ten days is
+# worth half a level
+DEFAULT_WEIGHTS = {'priority': 48.0, 'urgency': 1.0, 'age': 0.1}
+
+EPOCH = datetime(2000, 1, 1)
+
+def hours(when: datetime) -> float:
+    """Hours since EPOCH"""
+    return (when - EPOCH).total_seconds() / 3600
+
+class TaskRanker:
+    def __init__(self, task_manager, weights: Optional[Dict[str, float]] = None):
+        """
+        Top-k ranking of pending tasks, maintained through a listener
+
+        Args:
+            task_manager: TaskManager to rank
+            weights: Overrides for DEFAULT_WEIGHTS ('priority', 'urgency',
+                'age'); urgency and age are per hour
+        """
+        self.task_manager = task_manager
+        self.weights = dict(DEFAULT_WEIGHTS)
+        self.weights.update(weights or {})
+        self._lock = threading.RLock()
+        self.rebuild()
+        task_manager.add_listener(self._on_task_changed)
+
+    def set_weights(self, **weights: float):
+        """Change weights; the heaps are rebuilt since every key changes"""
+        with self._lock:
+            self.weights.update(weights)
+            self.rebuild()
+
+    def rebuild(self):
+        """Rebuild both heaps from the task list"""
+        with self._lock:
+            self._heaps = ([], [])  # (undated, dated) heaps of (-base, seq, task_id)
+            self._live = {}         # task_id -> (seq, group, base) of its current entry
+            self._seq = itertools.count()
+            for task in list(self.task_manager.tasks):
+                self._set(task, push=False)
+            for heap in self._heaps:
+                heapq.heapify(heap)
+
+    def _on_task_changed(self, event: str, task: Optional[Dict]):
+        with self._lock:
+            if event == 'loaded':
+                self.rebuild()
+            elif event == 'deleted':
+                self._live.pop(task['id'], None)
+            else:
+                self._set(task)
+                self._maybe_compact()
+
+    def base(self, task: Dict) -> float:
+        """Time independent part of a task's score"""
+        weights = self.weights
+        score = weights['priority'] * PRIORITY_LEVEL.get(task['priority'], 1) \
+            - weights['age'] * hours(task['created_at'])
+        if task['due_date']:
+            score -= weights['urgency'] * hours(task['due_date'])
+        return score
+
+    def _slope(self, group: int) -> float:
+        """Score gained per hour by every task of a group"""
+        return self.weights['age'] + (self.weights['urgency'] if group else 0.0)
+
+    def score(self, task: Dict, now: Optional[datetime] = None) -> float:
+        """Score of a task at now (the task manager clock by default)"""
+        now = now or self.task_manager.clock.now()
+        return self.base(task) + self._slope(1 if task['due_date'] else 0) * hours(now)
+
+    def _set(self, task: Dict, push: bool = True):
+        """Replace a task's entry; old entries stay in the heap until skipped"""
+        task_id = task['id']
+        if task['completed']:
+            self._live.pop(task_id, None)
+            return
+        group = 1 if task['due_date'] else 0
+        base = self.base(task)
+        current = self._live.get(task_id)
+        if current is not None and current[1:] == (group, base):
+            return
+        seq = next(self._seq)
+        self._live[task_id] = (seq, group, base)
+        entry = (-base, seq, task_id)
+        if push:
+            heapq.heappush(self._heaps[group], entry)
+        else:
+            self._heaps[group].append(entry)
+
+    def _maybe_compact(self):
+        """Drop stale entries once they outnumber the live ones"""
+        if len(self._heaps[0]) + len(self._heaps[1]) > 2 * len(self._live) + 64:
+            live = self._live
+            for heap in self._heaps:
+                heap[:] = [entry for entry in heap if live.get(entry[2], (None,))[0] == entry[1]]
+                heapq.heapify(heap)
+
+    def top(self, k: int, now: Optional[datetime] = None,
+            accept: Optional[Callable[[str], bool]] = None) -> List[tuple]:
+        """
+        The k best pending tasks as (score, task_id), best first
+
+        Args:
+            k: Number of tasks
+            now: Time the scores are computed for, the clock by default
+            accept: Optional filter on task ids; rejected tasks are skipped
+        """
+        now_hours = hours(now or self.task_manager.clock.now())
+        with self._lock:
+            live = self._live
+            # Best first walk of both heap trees: a node is only reached
+            # after its parent, so nothing below the k-th result is visited
+            frontier = []
+            for group, heap in enumerate(self._heaps):
+                if heap:
+                    offset = self._slope(group) * now_hours
+                    frontier.append((heap[0][0] - offset, group, 0, offset))
+            heapq.heapify(frontier)
+            result = []
+            while frontier and len(result) < k:
+                negative_score, group, index, offset = heapq.heappop(frontier)
+                heap = self._heaps[group]
+                _, seq, task_id = heap[index]
+                if live.get(task_id, (None,))[0] == seq and (accept is None or accept(task_id)):
+                    result.append((-negative_score, task_id))
+                for child in (2 * index + 1, 2 * index + 2):
+                    if child < len(heap):
+                        heapq.heappush(frontier, (heap[child][0] - offset, group, child, offset))
+            return result
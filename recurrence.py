@@ -0,0 +1,210 @@
+"""
+Recurrence rules for repeating tasks
+
+A recurring task is stored once, with its current occurrence as due_date
+and a rule under 'recurrence':
+
+    {'freq': 'weekly', 'interval': 1, 'weekdays': [0, 2],
+     'start': '2025-01-06T09:00:00', 'count': 20, 'until': None}
+
+freq is 'daily', 'weekly' or 'monthly'; interval repeats every N of
+them; weekdays (0 = Monday) only apply to weekly rules and default to the
+weekday of start; count and until optionally end the series. Monthly
+rules keep the day of month of start, clamped to the last day of shorter
+months. Dates are ISO strings so the rule stores as plain JSON.
+
+Occurrences are never materialized: occurrences() jumps straight to the
+requested window and yields lazily, so a daily series over ten years is
+one record and O(k) work for k occurrences asked for.
+"""
+
+import calendar
+import re
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+FREQUENCIES = ('daily', 'weekly', 'monthly')
+WEEKDAY_NAMES = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+def make_rule(freq: str, interval: int = 1, weekdays: Optional[List[int]] = None,
+              count: Optional[int] = None, until: Optional[datetime] = None) -> Dict:
+    """Build a rule dict; start is filled in when the task is saved"""
+    rule = {'freq': freq, 'interval': interval}
+    if weekdays:
+        rule['weekdays'] = sorted(set(weekdays))
+    if count is not None:
+        rule['count'] = count
+    if until is not None:
+        rule['until'] = until.isoformat()
+    return validate_rule(rule)
+
+def validate_rule(rule: Dict) -> Dict:
+    """Check a rule, raising ValueError if it is malformed"""
+    if rule.get('freq') not in FREQUENCIES:
+        raise ValueError(f"Recurrence freq must be one of {', '.join(FREQUENCIES)}")
+    interval = rule.get('interval', 1)
+    if not isinstance(interval, int) or interval < 1:
+        raise ValueError("Recurrence interval must be a positive integer")
+    weekdays = rule.get('weekdays')
+    if weekdays is not None:
+        if rule['freq'] != 'weekly':
+            raise ValueError("Recurrence weekdays only apply to weekly rules")
+        if not weekdays or any(not isinstance(day, int) or not 0 <= day <= 6 for day in weekdays):
+            raise ValueError("Recurrence weekdays must be numbers 0 (Monday) to 6")
+    count = rule.get('count')
+    if count is not None and (not isinstance(count, int) or count < 1):
+        raise ValueError("Recurrence count must be a positive integer")
+    for field in ('start', 'until'):
+        if rule.get(field) is not None:
+            datetime.fromisoformat(rule[field])
+    return rule
+
+def with_start(rule: Dict, start: datetime) -> Dict:
+    """Copy of a rule anchored at start (the first occurrence)"""
+    anchored = dict(rule)
+    anchored['start'] = start.isoformat()
+    if anchored['freq'] == 'weekly' and not anchored.get('weekdays'):
+        anchored['weekdays'] = [start.weekday()]
+    return validate_rule(anchored)
+
+def _add_months(start: datetime, months: int) -> datetime:
+    month_index = start.month - 1 + months
+    year = start.year + month_index // 12
+    month = month_index % 12 + 1
+    day = min(start.day, calendar.monthrange(year, month)[1])
+    return start.replace(year=year, month=month, day=day)
+
+def occurrences(rule: Dict, since: Optional[datetime] = None,
+                before: Optional[datetime] = None) -> Iterator[datetime]:
+    """
+    Yield the occurrences of an anchored rule in [since, before), in order
+
+    Args:
+        rule: Rule with a 'start' (see with_start)
+        since: Window start (inclusive), the series start by default
+        before: Window end (exclusive), unbounded by default
+    """
+    start = datetime.fromisoformat(rule['start'])
+    interval = rule.get('interval', 1)
+    count = rule.get('count')
+    until = datetime.fromisoformat(rule['until']) if rule.get('until') else None
+    if since is None or since < start:
+        since = start
+
+    freq = rule['freq']
+    if freq == 'weekly':
+        weekdays = sorted(rule.get('weekdays') or [start.weekday()])
+        # Weeks are counted from the Monday of the start week
+        week_zero = start - timedelta(days=start.weekday())
+        first_week = [day for day in weekdays if day >= start.weekday()]
+        period = timedelta(weeks=interval)
+        week = max(0, (since - week_zero) // period)
+        index = 0 if week == 0 else len(first_week) + (week - 1) * len(weekdays)
+    else:
+        if freq == 'daily':
+            period = timedelta(days=interval)
+            index = max(0, -(-(since - start) // period))  # ceiling division
+        else:
+            months = (since.year - start.year) * 12 + since.month - start.month
+            index = max(0, months // interval)
+
+    while True:
+        if freq == 'weekly':
+            days = first_week if week == 0 else weekdays
+            base = week_zero + week * period
+            candidates = [base + timedelta(days=day) for day in days]
+            week += 1
+        elif freq == 'daily':
+            candidates = [start + index * period]
+        else:
+            candidates = [_add_months(start, index * interval)]
+
+        for occurrence in candidates:
+            if count is not None and index >= count:
+                return
+            if until is not None and occurrence > until:
+                return
+            if before is not None and occurrence >= before:
+                return
+            index += 1
+            if occurrence >= since:
+                yield occurrence
+
+def next_occurrence(rule: Dict, after: datetime) -> Optional[datetime]:
+    """First occurrence strictly after a time, or None if the series ended"""
+    return next(occurrences(rule, after + timedelta(microseconds=1)), None)
+
+def describe(rule: Dict) -> str:
+    """Short human readable form, e.g. 'Every 2 weeks on Mon, Wed'"""
+    interval = rule.get('interval', 1)
+    unit = {'daily': "day", 'weekly': "week", 'monthly': "month"}[rule['freq']]
+    text = f"Every {unit}" if interval == 1 else f"Every {interval} {unit}s"
+    if rule.get('weekdays'):
+        days = rule['weekdays']
+        text += " on weekdays" if days == [0, 1, 2, 3, 4] else \
+            " on " + ", ".join(WEEKDAY_NAMES[day] for day in days)
+    if rule.get('count'):
+        text += f", {rule['count']} times"
+    if rule.get('until'):
+        text += f", until {datetime.fromisoformat(rule['until']).strftime('%Y-%m-%d')}"
+    return text
+
+REPEAT_RE = re.compile(
+    r"^(?:every\s+(?P<interval>\d+)\s+)?"
+    r"(?P<unit>daily|weekly|monthly|days?|weeks?|months?|weekdays)"
+    r"(?:\s+on\s+(?P<days>[a-z,\s]+))?$")
+
+def parse_repeat(text: str) -> Dict:
+    """
+    Parse a short repeat phrase into a rule
+
+    Accepts 'daily', 'weekly', 'monthly', 'weekdays', 'every 2 days',
+    'every 3 weeks on mon, thu', 'weekly on fri' and similar.
+    """
+    match = REPEAT_RE.match(text.strip().lower())
+    if not match:
+        raise ValueError(f"Unrecognized repeat: {text!r}")
+    unit = match.group('unit')
+    if unit == 'weekdays':
+        return make_rule('weekly', weekdays=[0, 1, 2, 3, 4])
+    freq = {'d': 'daily', 'w': 'weekly', 'm': 'monthly'}[unit[0]]
+    weekdays = None
+    if match.group('days'):
+        if freq != 'weekly':
+            raise ValueError("Only weekly repeats can name days")
+        names = [name[:3] for name in re.split(r"[,\s]+", match.group('days')) if name]
+        lookup = [day.lower() for day in WEEKDAY_NAMES]
+        if any(name not in lookup for name in names):
+            raise ValueError(f"Unrecognized day in {text!r}")
+        weekdays = [lookup.index(name) for name in names]
+    return make_rule(freq, int(match.group('interval') or 1), weekdays)
+
+ICS_DAYS = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+
+def to_rrule(rule: Dict) -> str:
+    """Rule as an iCalendar RRULE value"""
+    parts = [f"FREQ={rule['freq'].upper()}"]
+    if rule.get('interval', 1) != 1:
+        parts.append(f"INTERVAL={rule['interval']}")
+    if rule.get('weekdays'):
+        parts.append("BYDAY=" + ",".join(ICS_DAYS[day] for day in rule['weekdays']))
+    if rule.get('count'):
+        parts.append(f"COUNT={rule['count']}")
+    if rule.get('until'):
+        parts.append("UNTIL=" + datetime.fromisoformat(rule['until']).strftime("%Y%m%dT%H%M%S"))
+    return ";".join(parts)
+
+def from_rrule(value: str) -> Dict:
+    """Parse the RRULE subset written by to_rrule"""
+    fields = dict(part.split("=", 1) for part in value.split(";") if "=" in part)
+    freq = fields.get('FREQ', "").lower()
+    weekdays = None
+    if fields.get('BYDAY'):
+        # Ordinals such as 1MO are not supported and are read as plain days
+        weekdays = [ICS_DAYS.index(day[-2:]) for day in fields['BYDAY'].split(",")]
+    until = None
+    if fields.get('UNTIL'):
+        text = fields['UNTIL'].rstrip("Z")
+        until = datetime.strptime(text, "%Y%m%dT%H%M%S" if "T" in text else "%Y%m%d")
+    return make_rule(freq, int(fields.get('INTERVAL', 1)), weekdays,
+                     int(fields['COUNT']) if 'COUNT' in fields else None, until)
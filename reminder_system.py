@@ -1,42 +1,81 @@
-import time
+import heapq
 import threading
 from datetime import datetime, timedelta
-from typing import List, Dict
-import tkinter as tk
-from tkinter import messagebox
-
-# Try to import notification libraries
-try:
-    from plyer import notification
-    PLYER_AVAILABLE = True
-except ImportError:
-    PLYER_AVAILABLE = False
-
-try:
-    import win10toast
-    WIN10TOAST_AVAILABLE = True
-except ImportError:
-    WIN10TOAST_AVAILABLE = False
+from typing import List, Dict, Optional
+from clock import SystemClock
+from metrics import METRICS
+
+# Notification libraries are imported on first use (see load_notifiers),
+# so importing this module stays cheap for scripts and the CLI
+_notifiers = None
+
+def load_notifiers() -> Dict[str, object]:
+    """Try to import the optional notification libraries, once"""
+    global _notifiers
+    if _notifiers is None:
+        notifiers = {}
+        try:
+            from plyer import notification
+            notifiers['plyer'] = notification
+        except ImportError:
+            pass
+
+        try:
+            import win10toast
+            notifiers['win10toast'] = win10toast
+        except ImportError:
+            pass
+        _notifiers = notifiers
+    return _notifiers
+
+# Default reminder rules per priority. 'before' lists lead times in minutes
+# before the due date; 'overdue_every' repeats the overdue notice every N
+# minutes while the task stays open (None sends a single overdue notice).
+DEFAULT_REMINDER_RULES = {
+    'High': {'before': [1440, 60, 10], 'overdue_every': 240},
+    'Medium': {'before': [60], 'overdue_every': 240},
+    'Low': {'before': [60], 'overdue_every': None},
+}
 
 class ReminderSystem:
-    def __init__(self, task_manager, check_interval: int = 60):
+    def __init__(self, task_manager, check_interval: int = 60,
+                 rules: Optional[Dict[str, Dict]] = None, event_queue=None, clock=None):
         """
         Initialize reminder system
 
         Args:
             task_manager: TaskManager instance
-            check_interval: How often to check for reminders (in seconds)
+            check_interval: Upper bound on how long the loop sleeps (in seconds)
+            rules: Reminder rules per priority, defaults to DEFAULT_REMINDER_RULES
+            event_queue: Optional UIEventQueue; reminders and status messages
+                are posted there for the GUI to show on its own thread
+            clock: Object providing now() and wait(), defaults to the task
+                manager's clock so both agree on the current time
         """
         self.task_manager = task_manager
         self.check_interval = check_interval
+        self.event_queue = event_queue
+        self.clock = clock or getattr(task_manager, 'clock', None) or SystemClock()
+        self.rules = rules if rules is not None else DEFAULT_REMINDER_RULES
         self.running = False
-        self.notified_tasks = set()  # Track already notified tasks
 
-        # Initialize notification system
-        if WIN10TOAST_AVAILABLE:
-            self.toaster = win10toast.ToastNotifier()
-        else:
-            self.toaster = None
+        # Pending reminder instants as a heap of
+        # (fire_at, seq, task_id, generation, kind, minutes_before)
+        self._queue = []
+        self._seq = 0
+        self._generation = {}   # task_id -> generation of its live entries
+        self._last_fired = {}   # task_id -> latest instant already notified
+        self._custom = {}       # task_id -> extra lead times from add_custom_reminder
+        self._lock = threading.RLock()
+        self._wakeup = threading.Event()
+        self._async_wakeup = None  # (loop, asyncio.Event) while run_async runs
+
+        # Notification system, created on the first notification
+        self.toaster = None
+
+        if self.task_manager is not None:
+            self.task_manager.add_listener(self._on_task_changed)
+            self.reschedule_all()
 
     def start(self):
         """Start the reminder system"""
@@ -46,70 +85,252 @@ class ReminderSystem:
         while self.running:
             try:
                 self.check_reminders()
-                time.sleep(self.check_interval)
             except Exception as e:
                 print(f"Error in reminder system: {e}")
-                time.sleep(self.check_interval)
+            self.clock.wait(self._wakeup, self._seconds_until_next())
+            self._wakeup.clear()
+
+    async def run_async(self):
+        """
+        Run the reminder loop as an asyncio task instead of a thread
+
+        Same loop as start(), but it sleeps with the event loop, which makes
+        it suitable for asyncio services (see async_task_manager.py). The
+        wait is always real time, whatever clock the system uses.
+
+        Usage:
+            reminders = asyncio.create_task(reminder_system.run_async())
+        """
+        import asyncio
+        wakeup = asyncio.Event()
+        self._async_wakeup = (asyncio.get_running_loop(), wakeup)
+        self.running = True
+        print("Reminder system started")
+
+        try:
+            while self.running:
+                try:
+                    self.check_reminders()
+                except Exception as e:
+                    print(f"Error in reminder system: {e}")
+                try:
+                    await asyncio.wait_for(wakeup.wait(), self._seconds_until_next())
+                except asyncio.TimeoutError:
+                    pass
+                wakeup.clear()
+        finally:
+            self._async_wakeup = None
 
     def stop(self):
         """Stop the reminder system"""
         self.running = False
+        self._wake()
         print("Reminder system stopped")
 
-    def check_reminders(self):
-        """Check for tasks that need reminders"""
-        now = datetime.now()
-
-        # Get tasks due soon (within next hour) and overdue tasks
-        due_soon = self.task_manager.get_tasks_due_soon(1)  # 1 hour
-        overdue = self.task_manager.get_overdue_tasks()
-
-        # Process due soon tasks
-        for task in due_soon:
-            if task['id'] not in self.notified_tasks:
-                time_until_due = task['due_date'] - now
-                minutes_until_due = int(time_until_due.total_seconds() / 60)
-
-                if minutes_until_due <= 60:  # Within 1 hour
-                    self.send_notification(
-                        f"Task Due Soon: {task['description']}",
-                        f"Due in {minutes_until_due} minutes"
-                    )
-                    self.notified_tasks.add(task['id'])
-
-        # Process overdue tasks
-        for task in overdue:
-            if task['id'] not in self.notified_tasks:
-                time_overdue = now - task['due_date']
-                hours_overdue = int(time_overdue.total_seconds() / 3600)
-
-                self.send_notification(
-                    f"Overdue Task: {task['description']}",
-                    f"Overdue by {hours_overdue} hours"
-                )
-                self.notified_tasks.add(task['id'])
+    def _wake(self):
+        """Interrupt the loop's sleep so it re-checks the queue"""
+        self._wakeup.set()
+        if self._async_wakeup is not None:
+            loop, wakeup = self._async_wakeup
+            try:
+                loop.call_soon_threadsafe(wakeup.set)
+            except RuntimeError:
+                pass  # loop already closed
 
-        # Clean up notified tasks for completed ones
-        completed_task_ids = {task['id'] for task in self.task_manager.get_completed_tasks()}
-        self.notified_tasks -= completed_task_ids
+    def get_rule(self, task: Dict) -> Dict:
+        """Get the effective reminder rule for a task"""
+        rule = dict(self.rules.get(task.get('priority'), self.rules.get('Medium', {})))
+        rule.update(task.get('reminders') or {})
+        return rule
 
+    def reminder_instants(self, task: Dict, now: datetime) -> List[tuple]:
+        """
+        Compute the pending reminder instants for a task
+
+        Returns a list of (fire_at, kind, minutes_before) tuples. Lead times
+        that already passed are collapsed into the most recent one so a task
+        created or loaded late still gets exactly one catch-up notice.
+        """
+        if task['completed'] or not task['due_date']:
+            return []
+
+        due = task['due_date']
+        rule = self.get_rule(task)
+        lead_times = set(rule.get('before') or [])
+        lead_times.update(self._custom.get(task['id'], ()))
+
+        instants = []
+        if due > now:
+            latest_past = None
+            for minutes in sorted(lead_times, reverse=True):
+                fire_at = due - timedelta(minutes=minutes)
+                if fire_at > now:
+                    instants.append((fire_at, 'before', minutes))
+                else:
+                    latest_past = (fire_at, 'before', minutes)
+            if latest_past:
+                instants.append(latest_past)
+            instants.append((due, 'overdue', 0))
+        else:
+            latest = self._latest_overdue_instant(due, rule, now)
+            instants.append((latest, 'overdue', 0))
+            if rule.get('overdue_every'):
+                instants.append((latest + timedelta(minutes=rule['overdue_every']), 'overdue', 0))
+
+        last_fired = self._last_fired.get(task['id'])
+        if last_fired is not None:
+            instants = [entry for entry in instants if entry[0] > last_fired]
+        return instants
+
+    def _latest_overdue_instant(self, due: datetime, rule: Dict, now: datetime) -> datetime:
+        """Get the most recent overdue instant at or before now"""
+        every = rule.get('overdue_every')
+        if not every:
+            return due
+        period = timedelta(minutes=every)
+        return due + period * int((now - due) / period)
+
+    def reschedule_all(self):
+        """Recompute reminder instants for every task"""
+        with self._lock:
+            self._queue = []
+            self._generation = {}
+            tasks = self.task_manager.get_all_tasks()
+            for task in tasks:
+                self._schedule_task(task)
+            # Forget the custom reminders of tasks that are gone, e.g. after a reload
+            ids = {task['id'] for task in tasks}
+            self._custom = {task_id: minutes for task_id, minutes in self._custom.items()
+                            if task_id in ids}
+
+    def _schedule_task(self, task: Dict):
+        """Replace the pending reminder instants of a single task"""
+        now = self.clock.now()
+        with self._lock:
+            task_id = task['id']
+            generation = self._generation.get(task_id, 0) + 1
+            self._generation[task_id] = generation
+            head = self._queue[0][0] if self._queue else None
+
+            for fire_at, kind, minutes in self.reminder_instants(task, now):
+                self._seq += 1
+                heapq.heappush(self._queue, (fire_at, self._seq, task_id, generation, kind, minutes))
+
+            if self._queue and (head is None or self._queue[0][0] < head):
+                self._wake()
+
+    def _unschedule_task(self, task_id: str, deleted: bool = False):
+        """
+        Drop all pending reminder instants of a task
+
+        Custom reminders are kept for when a completed task is reopened,
+        unless the task was deleted.
+        """
+        with self._lock:
+            self._generation[task_id] = self._generation.get(task_id, 0) + 1
+            self._last_fired.pop(task_id, None)
+            if deleted:
+                self._custom.pop(task_id, None)
+
+    def _on_task_changed(self, event: str, task: Optional[Dict]):
+        """TaskManager listener keeping the reminder queue in sync"""
+        if event == 'loaded':
+            self.reschedule_all()
+        elif event == 'deleted':
+            self._unschedule_task(task['id'], deleted=True)
+        elif task['completed']:
+            self._unschedule_task(task['id'])
+        else:
+            self._schedule_task(task)
+
+    def next_reminder_time(self) -> Optional[datetime]:
+        """Get the instant of the next pending reminder, if any"""
+        with self._lock:
+            while self._queue:
+                fire_at, _, task_id, generation, _, _ = self._queue[0]
+                if self._generation.get(task_id) == generation:
+                    return fire_at
+                heapq.heappop(self._queue)
+        return None
+
+    def seconds_until_next(self) -> float:
+        """How long the reminder loop may sleep before the next check"""
+        next_time = self.next_reminder_time()
+        if next_time is None:
+            return self.check_interval
+        delay = (next_time - self.clock.now()).total_seconds()
+        return min(self.check_interval, max(0.0, delay))
+
+    def _seconds_until_next(self) -> float:
+        return self.seconds_until_next()
+
+    @METRICS.timed('todo_reminder_check_seconds')
+    def check_reminders(self):
+        """Send notifications for every reminder instant that has been reached"""
+        now = self.clock.now()
+
+        fired = []
+        with self._lock:
+            while self._queue and self._queue[0][0] <= now:
+                entry = heapq.heappop(self._queue)
+                fire_at, _, task_id, generation, kind, minutes = entry
+                if self._generation.get(task_id) != generation:
+                    continue
+                fired.append(entry)
+                self._last_fired[task_id] = max(fire_at, self._last_fired.get(task_id, fire_at))
+
+        for fire_at, _, task_id, generation, kind, minutes in fired:
+            task = self.task_manager.get_task_by_id(task_id)
+            if not task or task['completed'] or not task['due_date']:
+                continue
+            self._fire_reminder(task, kind, fire_at, now)
+            METRICS.inc('todo_reminders_fired_total', kind=kind)
+
+            # Queue the next overdue repeat, skipping the one just delivered
+            if kind == 'overdue' and self.get_rule(task).get('overdue_every'):
+                with self._lock:
+                    if self._generation.get(task_id) == generation:
+                        self._schedule_task(task)
+
+    def _fire_reminder(self, task: Dict, kind: str, fire_at: datetime, now: datetime):
+        """Format and send the notification for one reminder instant"""
+        if kind == 'overdue':
+            hours_overdue = int((now - task['due_date']).total_seconds() / 3600)
+            self.send_notification(
+                f"Overdue Task: {task['description']}",
+                f"Overdue by {hours_overdue} hours"
+            )
+        else:
+            minutes_until_due = int((task['due_date'] - now).total_seconds() / 60)
+            self.send_notification(
+                f"Task Due Soon: {task['description']}",
+                f"Due in {minutes_until_due} minutes"
+            )
+
+    @METRICS.timed('todo_notification_seconds')
     def send_notification(self, title: str, message: str):
         """Send a desktop notification"""
         print(f"Notification: {title} - {message}")
+        self.post_status(f"Reminder: {title}")
 
         # Try different notification methods
         if self.send_win10_toast(title, message):
-            return
+            channel = 'win10toast'
         elif self.send_plyer_notification(title, message):
-            return
+            channel = 'plyer'
         else:
-            # Fallback to tkinter messagebox (will only work if GUI is active)
+            # Fallback to an in-app popup (only shown if the GUI is attached)
             self.send_tkinter_notification(title, message)
+            channel = 'gui' if self.event_queue is not None else 'console'
+        METRICS.inc('todo_notifications_total', channel=channel)
 
     def send_win10_toast(self, title: str, message: str) -> bool:
         """Send notification using win10toast"""
-        if WIN10TOAST_AVAILABLE and self.toaster:
+        win10toast = load_notifiers().get('win10toast')
+        if win10toast:
             try:
+                if self.toaster is None:
+                    self.toaster = win10toast.ToastNotifier()
                 self.toaster.show_toast(
                     title,
                     message,
@@ -124,7 +345,8 @@ class ReminderSystem:
 
     def send_plyer_notification(self, title: str, message: str) -> bool:
         """Send notification using plyer"""
-        if PLYER_AVAILABLE:
+        notification = load_notifiers().get('plyer')
+        if notification:
             try:
                 notification.notify(
                     title=title,
@@ -137,55 +359,36 @@ class ReminderSystem:
         return False
 
     def send_tkinter_notification(self, title: str, message: str):
-        """Send notification using tkinter messagebox (fallback)"""
-        try:
-            # This will only work if the main GUI is running
-            def show_popup():
-                popup = tk.Toplevel()
-                popup.title("Task Reminder")
-                popup.geometry("300x100")
-                popup.attributes('-topmost', True)
-
-                tk.Label(popup, text=title, font=("Arial", 10, "bold")).pack(pady=5)
-                tk.Label(popup, text=message, wraplength=250).pack(pady=5)
-
-                tk.Button(popup, text="OK", command=popup.destroy).pack(pady=10)
-
-                # Auto-close after 10 seconds
-                popup.after(10000, popup.destroy)
-
-            # Schedule the popup to run in the main thread
-            threading.Thread(target=show_popup, daemon=True).start()
-        except Exception as e:
-            print(f"Error sending tkinter notification: {e}")
+        """Hand the notification to the GUI (fallback)"""
+        # Tk widgets may only be created on the main thread, so the popup is
+        # posted to the GUI's event queue instead of being built here
+        if self.event_queue is not None:
+            self.event_queue.post('notification', {'title': title, 'message': message})
+        else:
+            print("No GUI attached, notification shown on console only")
 
     def add_custom_reminder(self, task_id: str, remind_minutes_before: int = 30):
         """Add a custom reminder for a specific task"""
         task = self.task_manager.get_task_by_id(task_id)
-        if task and task['due_date']:
+        if task and task['due_date'] and not task['completed']:
             reminder_time = task['due_date'] - timedelta(minutes=remind_minutes_before)
-
-            def reminder_callback():
-                if not self.task_manager.get_task_by_id(task_id)['completed']:
-                    self.send_notification(
-                        f"Reminder: {task['description']}",
-                        f"Due in {remind_minutes_before} minutes"
-                    )
-
-            # Schedule the reminder
-            delay = (reminder_time - datetime.now()).total_seconds()
-            if delay > 0:
-                timer = threading.Timer(delay, reminder_callback)
-                timer.daemon = True
-                timer.start()
+            if reminder_time > self.clock.now():
+                with self._lock:
+                    self._custom.setdefault(task_id, set()).add(remind_minutes_before)
+                    self._schedule_task(task)
                 return True
         return False
 
+    def post_status(self, text: str):
+        """Show a status line message in the GUI, if one is attached"""
+        if self.event_queue is not None:
+            self.event_queue.post('status', text)
+
     def get_notification_status(self) -> Dict[str, bool]:
         """Get status of available notification systems"""
         return {
-            'win10toast_available': WIN10TOAST_AVAILABLE,
-            'plyer_available': PLYER_AVAILABLE,
+            'win10toast_available': 'win10toast' in load_notifiers(),
+            'plyer_available': 'plyer' in load_notifiers(),
             'system_running': self.running
         }
 
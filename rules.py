@@ -0,0 +1,299 @@
+"""
+Rules that tag and prioritise tasks automatically
+
+A rule is a dict of conditions and actions, e.g.
+
+    {'name': "invoices", 'when': {'contains': ["invoice", "receipt"]},
+     'then': {'priority': "High", 'tags': ["finance"]}}
+    {'name': "due soon", 'when': {'due_within': 1440, 'priority': "Low"},
+     'then': {'priority': "Medium"}}
+
+Conditions (all must hold; a list means any of its values):
+    contains     words found anywhere in the description, ignoring case
+    priority     the task has one of these priorities
+    tags         the task has one of these tags
+    due_within   the task is due within this many minutes (or overdue)
+Actions:
+    priority     set the priority (the last matching rule wins)
+    tags         add these tags
+
+Rules only apply to pending tasks. They are compiled together instead of
+being tried one by one: every keyword of every rule goes into one
+Aho-Corasick automaton, so a single pass over a description finds all
+the keywords it contains, and the other conditions are looked up in
+indexes from priority and tag to rules and in the rules sorted by
+due_within. A rule matches when as many of its conditions were hit as it
+has, so the cost per task does not grow with the number of rules that
+cannot match it.
+"""
+
+import bisect
+import json
+import os
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+CONDITIONS = ('contains', 'priority', 'tags', 'due_within')
+ACTIONS = ('priority', 'tags')
+PRIORITIES = ("High", "Medium", "Low")
+# Rules file the GUI picks up next to the task data
+RULES_FILE = "rules.json"
+
+class KeywordMatcher:
+    def __init__(self, keywords: Iterable[str]):
+        """
+        Aho-Corasick automaton finding every keyword in a text in one pass
+
+        Failure links are resolved when the automaton is built, so matching
+        is one dict lookup per character.
+        """
+        self.keywords = []
+        self._delta = [{}]    # state -> {character: next state}
+        self._output = [()]   # state -> indexes of the keywords ending there
+        for keyword in keywords:
+            self._insert(keyword.lower())
+        self._link()
+
+    def _insert(self, keyword: str):
+        state = 0
+        for char in keyword:
+            following = self._delta[state].get(char)
+            if following is None:
+                following = len(self._delta)
+                self._delta[state][char] = following
+                self._delta.append({})
+                self._output.append(())
+            state = following
+        self._output[state] += (len(self.keywords),)
+        self.keywords.append(keyword)
+
+    def _link(self):
+        """Add failure transitions breadth first, turning the trie into a DFA"""
+        delta, output = self._delta, self._output
+        fail = [0] * len(delta)
+        queue = deque(delta[0].values())
+        while queue:
+            state = queue.popleft()
+            # Only trie edges are present until the state is completed below
+            for char, child in list(delta[state].items()):
+                queue.append(child)
+                if state:
+                    # The failure state is shallower, so already complete
+                    fail[child] = delta[fail[state]].get(char, 0)
+                output[child] += output[fail[child]]
+            if state:
+                for char, target in delta[fail[state]].items():
+                    delta[state].setdefault(char, target)
+
+    def find(self, text: str) -> set:
+        """Indexes of the keywords occurring in text, ignoring case"""
+        found = set()
+        delta, output = self._delta, self._output
+        state = 0
+        for char in text.lower():
+            state = delta[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+def read_rules(path: str) -> List[Dict]:
+    """Read a JSON list of rules, raising ValueError if it cannot be used"""
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            rules = json.load(file)
+    except OSError as e:
+        raise ValueError(f"Cannot read {path}: {e.strerror}")
+    if not isinstance(rules, list) or not all(isinstance(rule, dict) for rule in rules):
+        raise ValueError(f"{path} must hold a list of rules")
+    return [check_rule(rule) for rule in rules]
+
+def rules_path(data_file: str) -> str:
+    """Where the rules for a task data file are kept"""
+    return os.path.join(os.path.dirname(os.path.abspath(data_file)), RULES_FILE)
+
+def _values(value, name: str) -> List:
+    values = value if isinstance(value, (list, tuple)) else [value]
+    if not values:
+        raise ValueError(f"Empty {name!r} in rule")
+    if not all(isinstance(item, str) for item in values):
+        raise ValueError(f"{name!r} in rule must be text or a list of text")
+    return list(values)
+
+def check_rule(rule: Dict) -> Dict:
+    """A rule with its values normalized, raising ValueError if it is invalid"""
+    from tags import normalize_tags
+    if not isinstance(rule, dict):
+        raise ValueError(f"A rule must be an object, not {rule!r}")
+    when, then = rule.get('when') or {}, rule.get('then') or {}
+    name = rule.get('name', "")
+    if not isinstance(when, dict) or not isinstance(then, dict):
+        raise ValueError(f"Rule {name!r}: 'when' and 'then' must be objects")
+    unknown = set(when) - set(CONDITIONS) or set(then) - set(ACTIONS)
+    if unknown:
+        raise ValueError(f"Rule {name!r}: unknown {', '.join(sorted(unknown))}")
+    if not when or not then:
+        raise ValueError(f"Rule {name!r} needs 'when' and 'then'")
+    conditions = {}
+    if 'contains' in when:
+        conditions['contains'] = [word.lower() for word in _values(when['contains'], 'contains')]
+        if not all(word.strip() for word in conditions['contains']):
+            raise ValueError(f"Rule {name!r}: empty keyword")
+    if 'priority' in when:
+        conditions['priority'] = _values(when['priority'], 'priority')
+    if 'tags' in when:
+        conditions['tags'] = normalize_tags(_values(when['tags'], 'tags'))
+    if 'due_within' in when:
+        minutes = when['due_within']
+        if not isinstance(minutes, int) or isinstance(minutes, bool) or minutes < 0:
+            raise ValueError(f"Rule {name!r}: due_within must be a number of minutes")
+        conditions['due_within'] = minutes
+    actions = {}
+    if 'priority' in then:
+        actions['priority'] = then['priority']
+    if 'tags' in then:
+        actions['tags'] = normalize_tags(_values(then['tags'], 'tags'))
+    for priority in conditions.get('priority', []) + [actions.get('priority', "High")]:
+        if priority not in PRIORITIES:
+            raise ValueError(f"Rule {name!r}: unknown priority {priority!r}")
+    return {'name': name, 'when': conditions, 'then': actions}
+
+class RuleEngine:
+    def __init__(self, task_manager, rules: List[Dict]):
+        """
+        Rules compiled into one matcher
+
+        TaskManager passes every change through on_change before its
+        listeners see it (see TaskManager.set_rules), so rules can change
+        the task as part of the same update.
+
+        Args:
+            task_manager: TaskManager whose tasks the rules apply to
+            rules: Rule dicts, see the module docstring; raises ValueError
+                if one is invalid
+        """
+        if not isinstance(rules, list):
+            raise ValueError("Rules must be a list")
+        self.task_manager = task_manager
+        self.rules = [check_rule(rule) for rule in rules]
+        self._needed = [len(rule['when']) for rule in self.rules]
+
+        keywords = {}   # keyword -> rules containing it
+        self._by_priority = {}
+        self._by_tag = {}
+        windows = []
+        for number, rule in enumerate(self.rules):
+            when = rule['when']
+            for word in set(when.get('contains', ())):
+                keywords.setdefault(word, []).append(number)
+            for priority in set(when.get('priority', ())):
+                self._by_priority.setdefault(priority, []).append(number)
+            for tag in when.get('tags', ()):
+                self._by_tag.setdefault(tag, []).append(number)
+            if 'due_within' in when:
+                windows.append((when['due_within'], number))
+        self._matcher = KeywordMatcher(keywords) if keywords else None
+        self._keyword_rules = list(keywords.values())
+        windows.sort()
+        self._windows = [minutes for minutes, _ in windows]
+        self._window_rules = [number for _, number in windows]
+        self.rebuild()
+
+    def rebuild(self):
+        """Re-read the due dates of pending tasks (only kept for due_within rules)"""
+        self._due = {}        # task_id -> indexed due date
+        self._due_dates = []  # sorted (due date, task_id)
+        if self._windows:
+            for task in list(self.task_manager.tasks):
+                if task['due_date'] and not task['completed']:
+                    self._due[task['id']] = task['due_date']
+            self._due_dates = sorted((due, task_id) for task_id, due in self._due.items())
+        self._checked = self.task_manager.clock.now()
+
+    def matching(self, task: Dict, now: Optional[datetime] = None) -> List[int]:
+        """Indexes of the rules matching a task, in rule order"""
+        if task['completed']:
+            return []
+        # Number of conditions met per rule; a condition with several
+        # values (keywords, tags) counts once however many of them match
+        hits = dict.fromkeys(self._by_priority.get(task['priority'], ()), 1)
+        if self._matcher is not None:
+            keyword_rules = self._keyword_rules
+            for number in {number for keyword in self._matcher.find(task['description'])
+                           for number in keyword_rules[keyword]}:
+                hits[number] = hits.get(number, 0) + 1
+        if self._by_tag and task.get('tags'):
+            by_tag = self._by_tag
+            for number in {number for tag in task['tags'] for number in by_tag.get(tag, ())}:
+                hits[number] = hits.get(number, 0) + 1
+        if self._windows and task['due_date']:
+            now = now or self.task_manager.clock.now()
+            minutes = (task['due_date'] - now).total_seconds() / 60
+            for number in self._window_rules[bisect.bisect_left(self._windows, minutes):]:
+                hits[number] = hits.get(number, 0) + 1
+        needed = self._needed
+        return sorted(number for number, count in hits.items() if count == needed[number])
+
+    def apply_to(self, task: Dict, now: Optional[datetime] = None) -> bool:
+        """Apply the actions of the matching rules to a task in place, True if it changed"""
+        priority = task['priority']
+        added = set()
+        for number in self.matching(task, now):
+            then = self.rules[number]['then']
+            priority = then.get('priority', priority)
+            added.update(then.get('tags', ()))
+        changed = False
+        if priority != task['priority']:
+            task['priority'] = priority
+            changed = True
+        tags = task.get('tags') or []
+        if not added.issubset(tags):
+            task['tags'] = sorted(added.union(tags))  # a new list, snapshots keep the old one
+            changed = True
+        return changed
+
+    def apply_all(self, now: Optional[datetime] = None) -> List[Dict]:
+        """Apply the rules to every task, returning the tasks that changed"""
+        now = now or self.task_manager.clock.now()
+        self._checked = now
+        return [task for task in list(self.task_manager.tasks) if self.apply_to(task, now)]
+
+    def on_change(self, event: str, task: Optional[Dict]) -> List[Dict]:
+        """Keep up with a change and apply the rules to it, returning the tasks that changed"""
+        if event == 'loaded':
+            self.rebuild()
+            return self.apply_all()
+        if self._windows:
+            self._index_due(task, event != 'deleted')
+        if event == 'deleted' or not self.apply_to(task):
+            return []
+        return [task]
+
+    def _index_due(self, task: Dict, present: bool):
+        task_id = task['id']
+        old = self._due.pop(task_id, None)
+        if old is not None:
+            del self._due_dates[bisect.bisect_left(self._due_dates, (old, task_id))]
+        if present and task['due_date'] and not task['completed']:
+            self._due[task_id] = task['due_date']
+            bisect.insort(self._due_dates, (task['due_date'], task_id))
+
+    def entered(self, now: Optional[datetime] = None) -> List[str]:
+        """
+        Ids of the pending tasks that came within a due_within window since
+        the last call (or the last full apply), to apply the rules to again
+
+        Only the tasks due between then and now, shifted by each window,
+        are looked at.
+        """
+        now = now or self.task_manager.clock.now()
+        last, self._checked = self._checked, now
+        if not self._windows or now <= last:
+            return []
+        entered = set()
+        for minutes in sorted(set(self._windows)):
+            window = timedelta(minutes=minutes)
+            first = bisect.bisect_right(self._due_dates, (last + window, "\uffff"))
+            end = bisect.bisect_right(self._due_dates, (now + window, "\uffff"))
+            entered.update(task_id for _, task_id in self._due_dates[first:end])
+        return sorted(entered)
@@ -0,0 +1,280 @@
+"""
+Related tasks and themes from TF-IDF vectors of task descriptions
+
+Every description becomes a sparse unit vector of term weights
+(1 + log tf) * idf, stored as a dict. An inverted index from term to
+{task_id: weight} is the transposed matrix, so the cosine similarity of
+one task against all others is a single sparse matrix-vector product
+that only touches tasks sharing a term with it.
+
+Vectors are updated in place when a task is added or edited, using the
+idf values of the last fit; words new since then get the idf of a word
+seen once. Once the tasks changed since the fit exceed DRIFT_THRESHOLD
+of the store, idf is recomputed and the matrix rebuilt, so a long run of
+edits costs amortized O(1) refits per task.
+
+Themes are found with spherical k-means (k-means on unit vectors with
+cosine similarity) over pending tasks, seeded with k-means++, restarted on a
+sample and cached until the tasks change.
+"""
+
+import heapq
+import math
+import random
+import threading
+from collections import Counter
+from typing import Dict, List, Optional
+
+from task_index import tokenize
+
+# Fraction of the store that may change before idf is recomputed
+DRIFT_THRESHOLD = 0.2
+# Stores smaller than this are refit as if they had this many tasks
+MIN_FIT_SIZE = 20
+DEFAULT_THEMES = 8
+THEME_TERMS = 3
+# k-means is restarted RESTARTS times on at most SAMPLE_SIZE tasks, and the
+# best fit refined on all of them
+RESTARTS = 4
+SAMPLE_SIZE = 2000
+MAX_ITERATIONS = 20
+
+STOP_WORDS = frozenset("""
+a an and the to of for in on at by with from about into up out off or
+my our your me it is be do get go some this that these those
+""".split())
+
+def term_counts(text: str) -> Counter:
+    """Word counts of a description, without stop words, numbers and single letters"""
+    return Counter(word for word in tokenize(text)
+                   if len(word) > 1 and not word.isdigit() and word not in STOP_WORDS)
+
+def dot(first: Dict[str, float], second: Dict[str, float]) -> float:
+    """Dot product of two sparse vectors"""
+    if len(first) > len(second):
+        first, second = second, first
+    return sum(weight * second.get(term, 0.0) for term, weight in first.items())
+
+def normalize(vector: Dict[str, float]) -> Dict[str, float]:
+    """Scale a sparse vector to unit length (empty vectors stay empty)"""
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    if not norm:
+        return {}
+    return {term: weight / norm for term, weight in vector.items()}
+
+class SimilarityIndex:
+    def __init__(self, task_manager, drift_threshold: float = DRIFT_THRESHOLD):
+        """
+        TF-IDF matrix over task descriptions, maintained through a listener
+
+        Args:
+            task_manager: TaskManager to index
+            drift_threshold: Fraction of changed tasks that triggers a refit
+        """
+        self.task_manager = task_manager
+        self.drift_threshold = drift_threshold
+        self.fits = 0  # number of idf fits so far
+        self._lock = threading.RLock()
+        # Listen before reading the tasks so the index can be built on a
+        # background thread: changes made meanwhile wait for the lock
+        with self._lock:
+            task_manager.add_listener(self._on_task_changed)
+            self.rebuild()
+
+    def rebuild(self):
+        """Re-read every task and refit"""
+        with self._lock:
+            self._docs = {}      # task_id -> [description, term counts]
+            self._df = Counter()  # term -> number of tasks using it
+            self._completed = set()
+            for task in list(self.task_manager.tasks):
+                self._add_counts(task)
+            self._refit()
+
+    def _refit(self):
+        """Recompute idf from the current tasks and rebuild every vector"""
+        size = len(self._docs)
+        self._idf = {term: math.log((1 + size) / (1 + df)) + 1 for term, df in self._df.items()}
+        self._unseen_idf = math.log(1 + size) + 1
+        self._fit_size = size
+        self._drift = 0
+        self._vectors = {}   # task_id -> unit vector
+        self._postings = {}  # term -> {task_id: weight}
+        for task_id in self._docs:
+            self._set_vector(task_id)
+        self._themes = {}    # (k, seed) -> themes, until something changes
+        self.fits += 1
+
+    def _on_task_changed(self, event: str, task: Optional[Dict]):
+        with self._lock:
+            if event == 'loaded':
+                self.rebuild()
+                return
+            if event == 'deleted':
+                self._remove(task['id'])
+            else:
+                if task['completed']:
+                    self._completed.add(task['id'])
+                else:
+                    self._completed.discard(task['id'])
+                indexed = self._docs.get(task['id'])
+                if indexed is not None and indexed[0] == task['description']:
+                    self._themes = {}
+                    return
+                self._remove(task['id'])
+                self._add_counts(task)
+                self._set_vector(task['id'])
+            self._themes = {}
+            self._drift += 1
+            if self._drift > self.drift_threshold * max(self._fit_size, MIN_FIT_SIZE):
+                self._refit()
+
+    def _add_counts(self, task: Dict):
+        counts = term_counts(task['description'])
+        self._docs[task['id']] = [task['description'], counts]
+        self._df.update(counts.keys())
+        if task['completed']:
+            self._completed.add(task['id'])
+
+    def _set_vector(self, task_id: str):
+        vector = self._weigh(self._docs[task_id][1])
+        self._vectors[task_id] = vector
+        for term, weight in vector.items():
+            self._postings.setdefault(term, {})[task_id] = weight
+
+    def _weigh(self, counts: Counter) -> Dict[str, float]:
+        idf, unseen = self._idf, self._unseen_idf
+        return normalize({term: (1 + math.log(count)) * idf.get(term, unseen)
+                          for term, count in counts.items()})
+
+    def _remove(self, task_id: str):
+        indexed = self._docs.pop(task_id, None)
+        self._completed.discard(task_id)
+        if indexed is None:
+            return
+        self._df.subtract(indexed[1].keys())
+        for term in indexed[1]:
+            if not self._df[term]:
+                del self._df[term]
+        for term in self._vectors.pop(task_id, {}):
+            postings = self._postings[term]
+            del postings[task_id]
+            if not postings:
+                del self._postings[term]
+
+    def vector(self, text: str) -> Dict[str, float]:
+        """TF-IDF unit vector of any text, with the current idf"""
+        with self._lock:
+            return self._weigh(term_counts(text))
+
+    def nearest(self, vector: Dict[str, float], k: int = 5, exclude: Optional[str] = None,
+                include_completed: bool = False) -> List[tuple]:
+        """
+        Tasks most similar to a vector, as (cosine similarity, task_id), best first
+
+        Args:
+            vector: Unit vector, from vector() or another task
+            k: Number of tasks
+            exclude: Task id to leave out (the task itself)
+            include_completed: Also return completed tasks
+        """
+        scores = {}
+        with self._lock:
+            for term, weight in vector.items():
+                for task_id, other in self._postings.get(term, {}).items():
+                    scores[task_id] = scores.get(task_id, 0.0) + weight * other
+            scores.pop(exclude, None)
+            if not include_completed:
+                for task_id in self._completed.intersection(scores):
+                    del scores[task_id]
+        return [(score, task_id) for task_id, score in
+                heapq.nlargest(k, scores.items(), key=lambda item: item[1])]
+
+    def related(self, task_id: str, k: int = 5, include_completed: bool = False) -> List[tuple]:
+        """Tasks most similar to a task, as (cosine similarity, task_id), best first"""
+        with self._lock:
+            vector = self._vectors.get(task_id, {})
+            return self.nearest(vector, k, task_id, include_completed)
+
+    def themes(self, k: int = DEFAULT_THEMES, seed: int = 0) -> List[Dict]:
+        """
+        Group pending tasks into at most k themes with spherical k-means
+
+        Returns:
+            List of {'terms': top centroid words, 'task_ids': members},
+            largest theme first; tasks without any indexed word are left out
+        """
+        with self._lock:
+            cached = self._themes.get((k, seed))
+            if cached is None:
+                docs = [(task_id, vector) for task_id, vector in self._vectors.items()
+                        if vector and task_id not in self._completed]
+                cached = self._themes[(k, seed)] = self._kmeans(docs, k, random.Random(seed))
+            return [{'terms': list(theme['terms']), 'task_ids': list(theme['task_ids'])}
+                    for theme in cached]
+
+    @staticmethod
+    def _kmeans(docs: List[tuple], k: int, rng: random.Random) -> List[Dict]:
+        if not docs:
+            return []
+        vectors = [vector for _, vector in docs]
+
+        # Restarts are cheap on a sample and avoid most poor local optima;
+        # the best sample fit then only needs a few passes over every task
+        sample = vectors if len(vectors) <= SAMPLE_SIZE else rng.sample(vectors, SAMPLE_SIZE)
+        best = None
+        for _ in range(RESTARTS):
+            fit = lloyd(sample, seed_centroids(sample, min(k, len(sample)), rng))
+            if best is None or fit[2] > best[2]:
+                best = fit
+        centroids, labels, _ = lloyd(vectors, best[0])
+
+        members = [[] for _ in centroids]
+        for label, (task_id, _) in zip(labels, docs):
+            members[label].append(task_id)
+        themes = [{'terms': [term for term, _ in heapq.nlargest(THEME_TERMS, centroid.items(),
+                                                              key=lambda item: item[1])],
+                   'task_ids': task_ids}
+                  for centroid, task_ids in zip(centroids, members) if task_ids]
+        themes.sort(key=lambda theme: len(theme['task_ids']), reverse=True)
+        return themes
+
+def seed_centroids(vectors: List[Dict[str, float]], k: int, rng: random.Random) -> List[Dict]:
+    """k-means++ seeding: vectors far from every chosen centroid are likelier picks"""
+    centroids = [rng.choice(vectors)]
+    closest = [dot(vector, centroids[0]) for vector in vectors]
+    while len(centroids) < k:
+        distances = [max(0.0, 1.0 - similarity) for similarity in closest]
+        if not sum(distances):
+            break  # every vector is identical to some centroid
+        centroids.append(vectors[rng.choices(range(len(vectors)), weights=distances)[0]])
+        closest = [max(best, dot(vector, centroids[-1]))
+                   for best, vector in zip(closest, vectors)]
+    return centroids
+
+def lloyd(vectors: List[Dict[str, float]], centroids: List[Dict[str, float]]) -> tuple:
+    """
+    Spherical k-means iterations from the given centroids
+
+    Returns:
+        (centroids, label of every vector, total cosine similarity of the
+        vectors to their centroid)
+    """
+    labels = None
+    for _ in range(MAX_ITERATIONS):
+        assigned = []
+        total = 0.0
+        for vector in vectors:
+            similarity, label = max((dot(vector, centroid), c) for c, centroid in enumerate(centroids))
+            assigned.append(label)
+            total += similarity
+        if assigned == labels:
+            break
+        labels = assigned
+        sums = [Counter() for _ in centroids]
+        for label, vector in zip(labels, vectors):
+            sums[label].update(vector)
+        # A centroid that lost all its vectors stays where it was
+        centroids = [normalize(summed) if summed else centroid
+                     for summed, centroid in zip(sums, centroids)]
+    return centroids, labels, total
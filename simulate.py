@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Fast-forward simulation harness for the reminder scheduler
+
+Replays a synthetic workload against TaskManager and ReminderSystem on a
+VirtualClock, so weeks of reminders run in seconds. Reports notification
+counts, scheduler CPU time and the lateness distribution of reminders.
+
+Usage:
+    python simulate.py --tasks 100000 --days 21
+    python simulate.py --tasks 10000 --days 7 --tick 60 --json report.json
+"""
+
+import argparse
+import heapq
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+from clock import VirtualClock
+from reminder_system import ReminderSystem
+from task_manager import TaskManager
+
+PRIORITIES = ["High", "Medium", "Low"]
+PRIORITY_WEIGHTS = [0.2, 0.5, 0.3]
+
+VERBS = ["Call", "Email", "Review", "Write", "Buy", "Fix", "Schedule", "Plan",
+         "Pay", "Clean", "Prepare", "Update", "Book", "Submit", "Read", "Organize"]
+OBJECTS = ["the report", "groceries", "dentist appointment", "project proposal",
+           "rent", "car insurance", "team meeting", "the garage", "tax return",
+           "slides", "invoice", "flight tickets", "the budget", "documentation",
+           "birthday gift", "code review", "newsletter", "backup drive"]
+QUALIFIERS = ["", "", "", " for Monday", " before the deadline", " with Sam",
+              " for the client", " again", " (urgent)", " this week"]
+
+def synthetic_tasks(count: int, start: datetime, days: float = 14,
+                    seed: int = 0) -> Iterator[Dict]:
+    """
+    Yield synthetic task specs with realistic text and date distributions
+
+    Most tasks exist at the start, the rest arrive during the simulated
+    period. Due dates are log-normally spread around two days out, a few
+    are already overdue, and most tasks get completed either before their
+    due date or some hours after it.
+
+    Each spec has description, priority, created_at, due_date and
+    completed_at (None if the task is never completed).
+    """
+    rng = random.Random(seed)
+    horizon = days * 86400
+
+    for _ in range(count):
+        if rng.random() < 0.8:
+            created = start
+        else:
+            created = start + timedelta(seconds=rng.uniform(0, horizon))
+
+        roll = rng.random()
+        if roll < 0.1:
+            due = None
+        elif roll < 0.15 and created == start:
+            due = start - timedelta(seconds=rng.uniform(0, 3 * 86400))
+        else:
+            hours = min(rng.lognormvariate(math.log(48), 1.0), 24 * 60)
+            due = created + timedelta(hours=hours)
+
+        roll = rng.random()
+        if due is None:
+            completed = created + timedelta(hours=rng.expovariate(1 / 72)) if roll < 0.7 else None
+        elif roll < 0.6 and due > created:
+            completed = created + (due - created) * rng.uniform(0.1, 1.0)
+        elif roll < 0.97:
+            completed = max(due, created) + timedelta(hours=rng.expovariate(1 / 6))
+        else:
+            completed = None
+
+        yield {
+            'description': rng.choice(VERBS) + " " + rng.choice(OBJECTS) + rng.choice(QUALIFIERS),
+            'priority': rng.choices(PRIORITIES, PRIORITY_WEIGHTS)[0],
+            'created_at': created,
+            'due_date': due,
+            'completed_at': completed,
+        }
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return 0.0
+    rank = max(0, min(len(values) - 1, int(math.ceil(pct / 100 * len(values))) - 1))
+    return values[rank]
+
+class SimulatedReminderSystem(ReminderSystem):
+    """ReminderSystem that records deliveries instead of showing them"""
+
+    def __init__(self, *args, **kwargs):
+        self.counts = {}
+        self.lateness = []
+        self._scheduled_at = {}
+        super().__init__(*args, **kwargs)
+
+    def _schedule_task(self, task: Dict):
+        self._scheduled_at[task['id']] = self.clock.now()
+        super()._schedule_task(task)
+
+    def _fire_reminder(self, task: Dict, kind: str, fire_at: datetime, now: datetime):
+        # Catch-up instants computed in the past are due as soon as they are
+        # scheduled, so lateness is measured from whichever came later
+        intended = max(fire_at, self._scheduled_at.get(task['id'], fire_at))
+        self.lateness.append((now - intended).total_seconds())
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+
+def run_simulation(tasks: int = 100000, days: float = 14, seed: int = 0,
+                   tick: Optional[float] = None, check_interval: int = 60,
+                   start: Optional[datetime] = None) -> Dict:
+    """
+    Replay a synthetic workload and return a report
+
+    Args:
+        tasks: Number of synthetic tasks
+        days: Simulated duration in days
+        seed: Random seed for the workload
+        tick: Poll every `tick` seconds like a fixed-interval checker; by
+            default the loop sleeps until the next reminder instead
+        check_interval: ReminderSystem.check_interval (longest sleep)
+        start: Simulated start time, defaults to a fixed date
+    """
+    start = start or datetime(2025, 1, 6, 8, 0)
+    end = start + timedelta(days=days)
+    clock = VirtualClock(start)
+    wall_start = time.perf_counter()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tm = TaskManager(os.path.join(tmp, "tasks.json"), clock=clock)
+        rs = SimulatedReminderSystem(tm, check_interval=check_interval, clock=clock)
+
+        # Workload events: (time, seq, kind, spec)
+        events = []
+        for seq, spec in enumerate(synthetic_tasks(tasks, start, days, seed)):
+            events.append((spec['created_at'], seq, 'create', spec))
+        heapq.heapify(events)
+        seq = len(events)
+
+        checks = 0
+        dispatch_cpu = 0.0
+        mutation_cpu = 0.0
+
+        with tm.batch():
+            while clock.now() < end:
+                cpu = time.process_time()
+                rs.check_reminders()
+                dispatch_cpu += time.process_time() - cpu
+                checks += 1
+
+                if tick:
+                    wake = clock.now() + timedelta(seconds=tick)
+                else:
+                    wake = clock.now() + timedelta(seconds=rs.seconds_until_next())
+                wake = min(wake, end)
+
+                if events and events[0][0] <= wake:
+                    # A mutation wakes the reminder loop early, as in start()
+                    clock.set(events[0][0])
+                    cpu = time.process_time()
+                    while events and events[0][0] <= clock.now():
+                        _, _, kind, spec = heapq.heappop(events)
+                        if kind == 'create':
+                            task_id = tm.add_task(spec['description'], spec['due_date'], spec['priority'])
+                            if spec['completed_at'] is not None:
+                                seq += 1
+                                heapq.heappush(events, (spec['completed_at'], seq, 'complete', task_id))
+                        else:
+                            tm.mark_complete(spec)
+                    mutation_cpu += time.process_time() - cpu
+                    if not tick:
+                        continue
+                clock.set(wake)
+
+            # The store lives in a temporary directory, skip the final save
+            tm.discard_pending_save()
+
+    lateness = sorted(rs.lateness)
+    return {
+        'tasks': tasks,
+        'simulated_days': days,
+        'mode': f"tick {tick}s" if tick else "next-reminder",
+        'checks': checks,
+        'notifications': len(lateness),
+        'notifications_by_kind': rs.counts,
+        'scheduler_cpu_seconds': {
+            'dispatch': round(dispatch_cpu, 4),
+            'mutations': round(mutation_cpu, 4),
+        },
+        'lateness_seconds': {
+            'mean': round(sum(lateness) / len(lateness), 3) if lateness else 0.0,
+            'p50': percentile(lateness, 50),
+            'p90': percentile(lateness, 90),
+            'p99': percentile(lateness, 99),
+            'max': lateness[-1] if lateness else 0.0,
+        },
+        'wall_seconds': round(time.perf_counter() - wall_start, 3),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fast-forward reminder simulation")
+    parser.add_argument("--tasks", type=int, default=100000, help="number of synthetic tasks")
+    parser.add_argument("--days", type=float, default=14, help="simulated days")
+    parser.add_argument("--seed", type=int, default=0, help="workload random seed")
+    parser.add_argument("--tick", type=float, default=None,
+                        help="poll every N seconds instead of sleeping until the next reminder")
+    parser.add_argument("--check-interval", type=int, default=60, help="longest reminder loop sleep")
+    parser.add_argument("--json", metavar="PATH", help="also write the report to a JSON file")
+    args = parser.parse_args(argv)
+
+    report = run_simulation(args.tasks, args.days, args.seed, args.tick, args.check_interval)
+    print(json.dumps(report, indent=2))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
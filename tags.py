@@ -0,0 +1,294 @@
+"""
+Tags and bitmap queries over them
+
+Every task gets a small integer ordinal (freed ordinals are reused, so
+they stay dense) and every tag, status and priority is a bitmap over the
+ordinals, held in a Python int. A query such as
+
+    tag:work AND tag:urgent AND NOT completed
+
+is parsed once and evaluated with &, | and ~ on those ints, which the
+interpreter does a machine word at a time: about a millisecond per
+operand at a million tasks, however many tasks match.
+
+Setting one bit of a big int copies it, so changes are buffered per
+bitmap and applied together (one mask per bitmap) by the next query.
+Imports and batches therefore cost O(1) per task here.
+
+Atoms:
+    tag:NAME or #NAME          tasks tagged NAME
+    pending, completed, all    status
+    priority:high (medium, low)
+    actionable, overdue        computed per query from the TaskManager
+Operators: NOT, AND (also implied between atoms), OR and parentheses.
+"""
+
+import heapq
+import re
+import sys
+import threading
+from array import array
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional
+
+TAG_RE = re.compile(r"^[\w-]+$")
+TOKEN_RE = re.compile(r"\(|\)|[^\s()]+")
+STATUS_ATOMS = ('pending', 'completed', 'all')
+PRIORITY_BITMAPS = {"High": 'priority:high', "Medium": 'priority:medium', "Low": 'priority:low'}
+DYNAMIC_ATOMS = ('actionable', 'overdue')
+
+def normalize_tag(tag: str) -> str:
+    """Lowercase a tag without its leading #, raising ValueError if it is not a word"""
+    name = tag.strip().lstrip("#").lower()
+    if not TAG_RE.match(name):
+        raise ValueError(f"Invalid tag: {tag!r} (use letters, digits, _ and -)")
+    return name
+
+def normalize_tags(tags: Iterable[str]) -> List[str]:
+    """Normalized, deduplicated and sorted tags"""
+    return sorted({normalize_tag(tag) for tag in tags})
+
+def clean_tags(values: Iterable[str]) -> List[str]:
+    """Tags from another application: spaces become -, unusable ones are dropped"""
+    names = {"-".join(value.strip().lstrip("#").lower().split()) for value in values}
+    return sorted(name for name in names if TAG_RE.match(name))
+
+def bits_of(ordinals: Iterable[int]) -> int:
+    """Bitmap with the given bits set"""
+    ordinals = list(ordinals)
+    if not ordinals:
+        return 0
+    buffer = bytearray((max(ordinals) >> 3) + 1)
+    for ordinal in ordinals:
+        buffer[ordinal >> 3] |= 1 << (ordinal & 7)
+    return int.from_bytes(buffer, 'little')
+
+def ordinals_of(bitmap: int) -> Iterator[int]:
+    """Set bits of a bitmap, in increasing order"""
+    size = (bitmap.bit_length() + 63) // 64
+    words = array('Q', bitmap.to_bytes(size * 8, sys.byteorder))
+    if sys.byteorder == 'big':
+        words.reverse()
+    for index, word in enumerate(words):
+        if word:  # zero words, most of a sparse result, are skipped at once
+            base = index * 64
+            while word:
+                low = word & -word
+                yield base + low.bit_length() - 1
+                word ^= low
+
+def popcount(bitmap: int) -> int:
+    """Number of set bits (int.bit_count needs Python 3.10)"""
+    return bin(bitmap).count("1")
+
+# Query parsing: expressions compile to nested tuples
+#   ('atom', name) | ('not', expr) | ('and', expr, expr) | ('or', expr, expr)
+
+@lru_cache(maxsize=256)
+def parse_query(text: str) -> tuple:
+    """Parse a query, raising ValueError if it is malformed"""
+    tokens = TOKEN_RE.findall(text)
+    if not tokens:
+        raise ValueError("Empty query")
+    expression, position = _parse_or(tokens, 0)
+    if position != len(tokens):
+        raise ValueError(f"Unexpected {tokens[position]!r} in query")
+    return expression
+
+def _parse_or(tokens: List[str], position: int) -> tuple:
+    left, position = _parse_and(tokens, position)
+    while position < len(tokens) and tokens[position].upper() == "OR":
+        right, position = _parse_and(tokens, position + 1)
+        left = ('or', left, right)
+    return left, position
+
+def _parse_and(tokens: List[str], position: int) -> tuple:
+    left, position = _parse_not(tokens, position)
+    while position < len(tokens) and tokens[position] != ")" and tokens[position].upper() != "OR":
+        if tokens[position].upper() == "AND":
+            position += 1
+        right, position = _parse_not(tokens, position)
+        left = ('and', left, right)
+    return left, position
+
+def _parse_not(tokens: List[str], position: int) -> tuple:
+    if position >= len(tokens):
+        raise ValueError("Query ends too early")
+    token = tokens[position]
+    if token.upper() == "NOT":
+        operand, position = _parse_not(tokens, position + 1)
+        return ('not', operand), position
+    if token == "(":
+        expression, position = _parse_or(tokens, position + 1)
+        if position >= len(tokens) or tokens[position] != ")":
+            raise ValueError("Missing ) in query")
+        return expression, position + 1
+    if token == ")" or token.upper() in ("AND", "OR"):
+        raise ValueError(f"Unexpected {token!r} in query")
+    return ('atom', _atom(token)), position + 1
+
+def _atom(token: str) -> str:
+    """Canonical bitmap name of a query word"""
+    word = token.lower()
+    if word.startswith("#"):
+        return "tag:" + normalize_tag(word)
+    if word.startswith("tag:"):
+        return "tag:" + normalize_tag(word[4:])
+    if word.startswith("priority:") and word[9:] in ("high", "medium", "low"):
+        return word
+    if word in STATUS_ATOMS or word in DYNAMIC_ATOMS:
+        return word
+    raise ValueError(f"Unknown query term {token!r}")
+
+class TagIndex:
+    def __init__(self, task_manager):
+        """
+        Bitmap indexes of tags, status and priority, maintained through a listener
+
+        Args:
+            task_manager: TaskManager to index
+        """
+        self.task_manager = task_manager
+        self._lock = threading.RLock()
+        self.rebuild()
+        task_manager.add_listener(self._on_task_changed)
+
+    def rebuild(self):
+        """Re-index every task"""
+        with self._lock:
+            self._ordinals = {}     # task_id -> ordinal
+            self._ids = []          # ordinal -> task_id (None when free)
+            self._free = []         # heap of freed ordinals
+            self._names = {}        # task_id -> bitmap names its bit is set in
+            self._bitmaps = {}      # name -> int
+            self._set = {}          # name -> ordinals to set on the next flush
+            self._clear = {}        # name -> ordinals to clear on the next flush
+            tasks = list(self.task_manager.tasks)
+            self._ids = [task['id'] for task in tasks]
+            self._ordinals = {task_id: ordinal for ordinal, task_id in enumerate(self._ids)}
+            members = {}
+            names_of = self._names
+            bitmap_names = self.bitmap_names
+            for ordinal, task in enumerate(tasks):
+                names = names_of[task['id']] = bitmap_names(task)
+                for name in names:
+                    ordinals = members.get(name)
+                    if ordinals is None:
+                        members[name] = [ordinal]
+                    else:
+                        ordinals.append(ordinal)
+            self._bitmaps = {name: bits_of(ordinals) for name, ordinals in members.items()}
+            if tasks:
+                self._bitmaps['all'] = (1 << len(tasks)) - 1
+
+    @staticmethod
+    def bitmap_names(task: Dict) -> tuple:
+        """Bitmaps a task belongs to, besides 'all'"""
+        names = ('completed' if task['completed'] else 'pending',
+                 PRIORITY_BITMAPS.get(task['priority'], 'priority:medium'))
+        tags = task.get('tags')
+        if tags:
+            names += tuple("tag:" + tag for tag in tags)
+        return names
+
+    def _on_task_changed(self, event: str, task: Optional[Dict]):
+        with self._lock:
+            if event == 'loaded':
+                self.rebuild()
+                return
+            task_id = task['id']
+            old = set(self._names.get(task_id, ()))
+            if event == 'deleted':
+                ordinal = self._ordinals.pop(task_id, None)
+                if ordinal is None:
+                    return
+                old.add('all')
+                self._buffer(old, ordinal, self._clear, self._set)
+                del self._names[task_id]
+                self._ids[ordinal] = None
+                heapq.heappush(self._free, ordinal)
+                return
+            ordinal = self._ordinals.get(task_id)
+            if ordinal is None:
+                if self._free:
+                    ordinal = heapq.heappop(self._free)
+                    self._ids[ordinal] = task_id
+                else:
+                    ordinal = len(self._ids)
+                    self._ids.append(task_id)
+                self._ordinals[task_id] = ordinal
+                self._buffer(('all',), ordinal, self._set, self._clear)
+            names = self.bitmap_names(task)
+            new = set(names)
+            self._buffer(old - new, ordinal, self._clear, self._set)
+            self._buffer(new - old, ordinal, self._set, self._clear)
+            self._names[task_id] = names
+
+    @staticmethod
+    def _buffer(names: Iterable[str], ordinal: int, target: Dict, opposite: Dict):
+        for name in names:
+            pending = opposite.get(name)
+            if pending is not None and ordinal in pending:
+                pending.discard(ordinal)  # the two changes cancel out
+            else:
+                target.setdefault(name, set()).add(ordinal)
+
+    def _flush(self):
+        """Apply buffered changes, one mask per changed bitmap"""
+        for name in set(self._set) | set(self._clear):
+            bitmap = self._bitmaps.get(name, 0)
+            cleared = self._clear.pop(name, None)
+            if cleared:
+                bitmap &= ~bits_of(cleared)
+            added = self._set.pop(name, None)
+            if added:
+                bitmap |= bits_of(added)
+            if bitmap:
+                self._bitmaps[name] = bitmap
+            else:
+                self._bitmaps.pop(name, None)
+
+    def _bitmap(self, name: str) -> int:
+        if name == 'actionable':
+            return bits_of(self._ordinals[task_id] for task_id in
+                           self.task_manager.dependencies.actionable_ids() if task_id in self._ordinals)
+        if name == 'overdue':
+            return bits_of(self._ordinals[task['id']] for task in
+                           self.task_manager.get_overdue_tasks() if task['id'] in self._ordinals)
+        return self._bitmaps.get(name, 0)
+
+    def _evaluate(self, expression: tuple) -> int:
+        kind = expression[0]
+        if kind == 'atom':
+            return self._bitmap(expression[1])
+        if kind == 'not':
+            return self._bitmaps.get('all', 0) & ~self._evaluate(expression[1])
+        left = self._evaluate(expression[1])
+        if kind == 'and':
+            # Nothing can match once one side is empty
+            return left & self._evaluate(expression[2]) if left else 0
+        return left | self._evaluate(expression[2])
+
+    def bitmap(self, query: str) -> int:
+        """Bitmap of the tasks matching a query (see the module docstring)"""
+        expression = parse_query(query)
+        with self._lock:
+            self._flush()
+            return self._evaluate(expression)
+
+    def query(self, query: str) -> List[str]:
+        """Ids of the tasks matching a query"""
+        with self._lock:
+            ids = self._ids
+            return [ids[ordinal] for ordinal in ordinals_of(self.bitmap(query))]
+
+    def count(self, query: str) -> int:
+        """Number of tasks matching a query, without listing them"""
+        return popcount(self.bitmap(query))
+
+    def tag_counts(self) -> Dict[str, int]:
+        """Number of tasks per tag"""
+        with self._lock:
+            self._flush()
+            return {name[4:]: popcount(bitmap) for name, bitmap in sorted(self._bitmaps.items())
+                    if name.startswith("tag:")}
@@ -0,0 +1,279 @@
+import bisect
+import re
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+WORD_RE = re.compile(r"\w+")
+
+PRIORITY_RANK = {"High": 0, "Medium": 1, "Low": 2}
+
+# Sort keys offered by TaskIndex.sorted_ids; tasks without a due date sort last
+SORT_KEYS = {
+    'due': lambda task: (task['due_date'] is None, task['due_date'] or datetime.max),
+    'priority': lambda task: PRIORITY_RANK.get(task['priority'], 1),
+    'created': lambda task: task['created_at'] or datetime.min,
+    'status': lambda task: task['completed'],
+}
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase word tokens"""
+    return WORD_RE.findall(text.lower())
+
+class TaskIndex:
+    def __init__(self, task_manager):
+        """
+        Secondary indexes over a TaskManager for fast filtering
+
+        Keeps a word index (with a sorted vocabulary for prefix lookups),
+        priority and status sets, a due date ordered list and, for every
+        sort key used so far, a cached sorted permutation of all tasks. The
+        indexes follow every change through a TaskManager listener, and
+        queries may be called from any thread.
+
+        Args:
+            task_manager: TaskManager to index
+        """
+        self.task_manager = task_manager
+        self._lock = threading.RLock()
+        self.rebuild()
+        task_manager.add_listener(self._on_task_changed)
+
+    def rebuild(self):
+        """Rebuild every index from the task list"""
+        with self._lock:
+            self._order = {}        # task_id -> insertion sequence
+            self._next_order = 0
+            self._words = {}        # word -> set of task ids
+            self._vocabulary = []   # sorted words, for prefix ranges
+            self._task_words = {}   # task_id -> words indexed for it
+            self._by_priority = {}  # priority -> set of task ids
+            self._completed = set()
+            self._pending = set()
+            self._dues = []         # sorted (due_date, task_id)
+            self._task_due = {}     # task_id -> indexed due date
+            self._permutations = {} # sort key -> sorted (key value, order, task_id)
+            self._sort_values = {}  # sort key -> {task_id: key value}
+            for task in list(self.task_manager.tasks):
+                self._add(task, bulk=True)
+            # Sorted structures are sorted once instead of insorted per task
+            self._vocabulary = sorted(self._words)
+            self._dues.sort()
+
+    def _on_task_changed(self, event: str, task: Optional[Dict]):
+        with self._lock:
+            if event == 'loaded':
+                self.rebuild()
+            elif event == 'deleted':
+                self._remove(task['id'])
+                self._order.pop(task['id'], None)
+            else:
+                self._remove(task['id'])
+                self._add(task)
+
+    def _add(self, task: Dict, bulk: bool = False):
+        task_id = task['id']
+        if task_id not in self._order:
+            self._order[task_id] = self._next_order
+            self._next_order += 1
+
+        words = set(tokenize(task['description']))
+        self._task_words[task_id] = words
+        index = self._words
+        for word in words:
+            postings = index.get(word)
+            if postings is None:
+                index[word] = {task_id}
+                if not bulk:
+                    bisect.insort(self._vocabulary, word)
+            else:
+                postings.add(task_id)
+
+        self._by_priority.setdefault(task['priority'], set()).add(task_id)
+        (self._completed if task['completed'] else self._pending).add(task_id)
+
+        if task['due_date']:
+            if bulk:
+                self._dues.append((task['due_date'], task_id))
+            else:
+                bisect.insort(self._dues, (task['due_date'], task_id))
+            self._task_due[task_id] = task['due_date']
+
+        # Permutations are only kept for sort keys that have been used
+        for key, permutation in self._permutations.items():
+            value = SORT_KEYS[key](task)
+            self._sort_values[key][task_id] = value
+            bisect.insort(permutation, (value, self._order[task_id], task_id))
+
+    def _remove(self, task_id: str):
+        for word in self._task_words.pop(task_id, ()):
+            postings = self._words[word]
+            postings.discard(task_id)
+            if not postings:
+                del self._words[word]
+                del self._vocabulary[bisect.bisect_left(self._vocabulary, word)]
+
+        for ids in self._by_priority.values():
+            ids.discard(task_id)
+        self._completed.discard(task_id)
+        self._pending.discard(task_id)
+
+        due = self._task_due.pop(task_id, None)
+        if due is not None:
+            position = bisect.bisect_left(self._dues, (due, task_id))
+            del self._dues[position]
+
+        for key, permutation in self._permutations.items():
+            values = self._sort_values[key]
+            if task_id in values:
+                entry = (values.pop(task_id), self._order[task_id], task_id)
+                del permutation[bisect.bisect_left(permutation, entry)]
+
+    def _prefix_matches(self, prefix: str) -> Set[str]:
+        """Ids of tasks having a word that starts with prefix"""
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        end = bisect.bisect_left(self._vocabulary, prefix + "\U0010ffff")
+        if end - start == 1:
+            return self._words[self._vocabulary[start]]
+        matches = set()
+        for word in self._vocabulary[start:end]:
+            matches |= self._words[word]
+        return matches
+
+    def _due_between(self, due_from: Optional[datetime], due_to: Optional[datetime]) -> Set[str]:
+        """Ids of tasks due in [due_from, due_to)"""
+        start = 0 if due_from is None else bisect.bisect_left(self._dues, (due_from,))
+        end = len(self._dues) if due_to is None else bisect.bisect_left(self._dues, (due_to,))
+        return {task_id for _, task_id in self._dues[start:end]}
+
+    def _permutation(self, key: str) -> List[tuple]:
+        """Get the cached sorted permutation for a sort key, building it once"""
+        permutation = self._permutations.get(key)
+        if permutation is None:
+            key_func = SORT_KEYS[key]
+            order = self._order
+            # Tasks whose 'added' event is still pending are inserted by _add
+            values = {task['id']: key_func(task) for task in list(self.task_manager.tasks)
+                      if task['id'] in order}
+            permutation = sorted((value, order[task_id], task_id) for task_id, value in values.items())
+            self._sort_values[key] = values
+            self._permutations[key] = permutation
+        return permutation
+
+    def warm_sort_keys(self):
+        """Build the permutation of every sort key ahead of the first use"""
+        for key in SORT_KEYS:
+            with self._lock:
+                self._permutation(key)
+
+    def sorted_ids(self, key: Optional[str] = None, reverse: bool = False,
+                   ids: Optional[Set[str]] = None) -> List[str]:
+        """
+        Get task ids ordered by a sort key
+
+        Uses the cached permutation for the key, so switching keys or
+        re-sorting does not sort the whole list again. A small subset is
+        ordered by its cached key values instead of walking the permutation.
+
+        Args:
+            key: One of SORT_KEYS, or None for insertion order
+            reverse: Descending order
+            ids: Restrict the result to these ids
+        """
+        with self._lock:
+            order = self._order
+            if key is None:
+                if ids is None:
+                    result = list(order)
+                else:
+                    result = sorted(ids, key=order.__getitem__)
+            else:
+                permutation = self._permutation(key)
+                if ids is None:
+                    result = [entry[2] for entry in permutation]
+                elif len(ids) * max(1, len(ids).bit_length()) < len(permutation):
+                    values = self._sort_values[key]
+                    result = [entry[2] for entry in
+                              sorted((values[task_id], order[task_id], task_id) for task_id in ids)]
+                else:
+                    result = [entry[2] for entry in permutation if entry[2] in ids]
+            if reverse:
+                result.reverse()
+            return result
+
+    def sort_position(self, key: str, task_id: str, reverse: bool = False) -> Optional[int]:
+        """Get the index of a task in sorted_ids(key, reverse)"""
+        with self._lock:
+            values = self._sort_values.get(key)
+            if values is None or task_id not in values:
+                return None
+            permutation = self._permutations[key]
+            position = bisect.bisect_left(permutation, (values[task_id], self._order[task_id], task_id))
+            return len(permutation) - 1 - position if reverse else position
+
+    def query(self, text: str = "", priority: Optional[str] = None,
+              status: Optional[str] = None, due_from: Optional[datetime] = None,
+              due_to: Optional[datetime] = None, has_due: Optional[bool] = None,
+              sort: Optional[str] = None, reverse: bool = False,
+              cancelled=None, tags: Optional[List[str]] = None) -> Optional[List[str]]:
+        """
+        Find task ids matching all given filters
+
+        Args:
+            text: Every word must prefix-match a word of the description
+            priority: 'High', 'Medium' or 'Low'
+            status: 'pending', 'completed' or 'actionable' (pending and
+                not waiting for a blocker or subtask, see DependencyGraph)
+            due_from: Only tasks due at or after this time
+            due_to: Only tasks due before this time
+            has_due: True for tasks with a due date, False for tasks without
+            sort: Sort key passed to sorted_ids, insertion order by default
+            reverse: Descending order
+            cancelled: Optional callable; when it returns True the query
+                stops early and returns None
+            tags: Only tasks having every one of these tags (see tags.py)
+
+        Returns:
+            Matching task ids, or None if cancelled
+        """
+        with self._lock:
+            candidates = []
+            for word in set(tokenize(text)):
+                candidates.append(self._prefix_matches(word))
+                if cancelled and cancelled():
+                    return None
+            if priority:
+                candidates.append(self._by_priority.get(priority, set()))
+            if status == 'pending':
+                candidates.append(self._pending)
+            elif status == 'completed':
+                candidates.append(self._completed)
+            elif status == 'actionable':
+                candidates.append(set(self.task_manager.dependencies.actionable_ids()))
+            if tags:
+                query = " AND ".join("tag:" + tag for tag in tags)
+                candidates.append(set(self.task_manager.tag_index.query(query)))
+            if due_from is not None or due_to is not None:
+                candidates.append(self._due_between(due_from, due_to))
+            elif has_due:
+                candidates.append(set(self._task_due))
+
+            if candidates:
+                candidates.sort(key=len)
+                result = set(candidates[0])
+                for ids in candidates[1:]:
+                    result &= ids
+                    if not result:
+                        break
+            elif has_due is False:
+                result = set(self._order)
+            else:
+                # No filters at all: the whole ordering, no subset to apply
+                return self.sorted_ids(sort, reverse)
+
+            if has_due is False:
+                result -= self._task_due.keys()
+
+            if cancelled and cancelled():
+                return None
+            return self.sorted_ids(sort, reverse, result)
@@ -0,0 +1,260 @@
+import tkinter as tk
+from tkinter import font as tkfont
+from typing import Callable, List, Optional
+
+class VirtualTaskList(tk.Frame):
+    def __init__(self, master, format_row: Callable[[str], str], row_font=("Arial", 10), **kwargs):
+        """
+        Virtualized task list
+
+        Only the rows that fit in the window exist as Listbox items. The
+        list itself is an ordered list of task ids; rows are formatted on
+        demand by format_row(task_id) and cached until invalidated, so
+        scrolling and refreshing cost the same for 100 or 100,000 tasks.
+
+        Args:
+            master: Parent widget
+            format_row: Returns the display text for a task id
+            row_font: Font used for the rows
+        """
+        super().__init__(master, **kwargs)
+        self.format_row = format_row
+        self._ids = []
+        self._positions = {}     # task_id -> index into _ids
+        self._stale_from = None  # positions at or after this index need rebuilding
+        self._offset = 0
+        self._visible = 1
+        self._selected = None
+        self._row_cache = {}
+        self._double_click = None
+
+        self.scrollbar = tk.Scrollbar(self, command=self.yview)
+        self.scrollbar.pack(side='right', fill='y')
+
+        self.listbox = tk.Listbox(self, font=row_font, selectmode='single',
+                                  exportselection=False, activestyle='none')
+        self.listbox.pack(side='left', fill='both', expand=True)
+        self._row_height = tkfont.Font(font=row_font).metrics('linespace') + 1
+
+        self.listbox.bind('<Configure>', self._on_resize)
+        self.listbox.bind('<<ListboxSelect>>', self._on_select)
+        self.listbox.bind('<Double-1>', self._on_double_click)
+        self.listbox.bind('<MouseWheel>', self._on_mousewheel)
+        self.listbox.bind('<Button-4>', lambda e: self._scroll_units(-3))
+        self.listbox.bind('<Button-5>', lambda e: self._scroll_units(3))
+        self.listbox.bind('<Up>', lambda e: self._move_selection(-1))
+        self.listbox.bind('<Down>', lambda e: self._move_selection(1))
+        self.listbox.bind('<Prior>', lambda e: self._move_selection(-self._visible))
+        self.listbox.bind('<Next>', lambda e: self._move_selection(self._visible))
+
+    def set_ids(self, ids: List[str], clear_cache: bool = False):
+        """Replace the ordered list of task ids shown"""
+        self._ids = list(ids)
+        self._positions = {task_id: i for i, task_id in enumerate(self._ids)}
+        self._stale_from = None
+        if clear_cache:
+            self._row_cache.clear()
+        # Keep the selection only if the task is still listed
+        if self._selected is not None and self._selected not in self._positions:
+            self._selected = None
+        self._clamp_offset()
+        self._render()
+
+    def get_ids(self) -> List[str]:
+        """Get the ordered list of task ids shown"""
+        return list(self._ids)
+
+    def has_row(self, task_id: str) -> bool:
+        """Check whether a task is listed"""
+        return task_id in self._positions
+
+    def position(self, task_id: str) -> Optional[int]:
+        """Get the index of a task in the list, if listed"""
+        if task_id not in self._positions:
+            return None
+        if self._stale_from is not None:
+            for i in range(self._stale_from, len(self._ids)):
+                self._positions[self._ids[i]] = i
+            self._stale_from = None
+        return self._positions[task_id]
+
+    def insert_row(self, task_id: str, index: Optional[int] = None):
+        """Insert a single row (appended by default), touching only that row"""
+        if task_id in self._positions:
+            self.update_row(task_id)
+            return
+        if index is None or index >= len(self._ids):
+            index = len(self._ids)
+            self._ids.append(task_id)
+            self._positions[task_id] = index
+        else:
+            self._ids.insert(index, task_id)
+            self._positions[task_id] = index
+            self._mark_stale(index + 1)
+
+        row = index - self._offset
+        if row < 0:
+            # Inserted above the window: shift the offset to keep the view still
+            self._offset += 1
+        elif row < self._visible:
+            self.listbox.insert(row, self._row_text(task_id))
+            if self.listbox.size() > self._visible:
+                self.listbox.delete(self._visible)
+        self._update_scrollbar()
+
+    def update_row(self, task_id: str):
+        """Redraw a single row after its task changed"""
+        self._row_cache.pop(task_id, None)
+        index = self.position(task_id)
+        if index is None:
+            return
+        row = index - self._offset
+        if 0 <= row < self.listbox.size():
+            self.listbox.delete(row)
+            self.listbox.insert(row, self._row_text(task_id))
+            if task_id == self._selected:
+                self.listbox.selection_set(row)
+
+    def remove_row(self, task_id: str):
+        """Remove a single row, pulling up the next row into the window"""
+        index = self.position(task_id)
+        if index is None:
+            return
+        del self._ids[index]
+        del self._positions[task_id]
+        self._row_cache.pop(task_id, None)
+        self._mark_stale(index)
+        if task_id == self._selected:
+            self._selected = None
+
+        row = index - self._offset
+        if row < 0:
+            self._offset -= 1
+        elif row < self.listbox.size():
+            self.listbox.delete(row)
+            bottom = self._offset + self._visible - 1
+            if bottom < len(self._ids):
+                self.listbox.insert(tk.END, self._row_text(self._ids[bottom]))
+            elif self._offset > 0:
+                # Reached the end of the list, scroll back by one row
+                self._offset -= 1
+                self.listbox.insert(0, self._row_text(self._ids[self._offset]))
+        self._update_scrollbar()
+
+    def _mark_stale(self, index: int):
+        if self._stale_from is None or index < self._stale_from:
+            self._stale_from = index
+
+    def invalidate(self, ids: Optional[List[str]] = None):
+        """Drop cached row text (all rows, or just the given ids) and redraw"""
+        if ids is None:
+            self._row_cache.clear()
+        else:
+            for task_id in ids:
+                self._row_cache.pop(task_id, None)
+        self._render()
+
+    def selected_id(self) -> Optional[str]:
+        """Get the id of the selected task, if any"""
+        return self._selected
+
+    def select(self, task_id: Optional[str]):
+        """Select a task and scroll it into view"""
+        self._selected = task_id
+        index = self.position(task_id) if task_id is not None else None
+        if index is not None:
+            self._ensure_visible(index)
+        self._render()
+
+    def bind_double_click(self, callback: Callable):
+        """Call callback(event) when a row is double-clicked"""
+        self._double_click = callback
+
+    def yview(self, *args):
+        """Scrollbar command handler"""
+        if not args:
+            return
+        if args[0] == 'moveto':
+            self._offset = int(float(args[1]) * len(self._ids))
+        elif args[0] == 'scroll':
+            amount = int(args[1])
+            step = self._visible if args[2] == 'pages' else 1
+            self._offset += amount * step
+        self._clamp_offset()
+        self._render()
+
+    def _clamp_offset(self):
+        self._offset = max(0, min(self._offset, len(self._ids) - self._visible))
+
+    def _ensure_visible(self, index: int):
+        if index < self._offset:
+            self._offset = index
+        elif index >= self._offset + self._visible:
+            self._offset = index - self._visible + 1
+        self._clamp_offset()
+
+    def _row_text(self, task_id: str) -> str:
+        text = self._row_cache.get(task_id)
+        if text is None:
+            if len(self._row_cache) > 4096:
+                self._row_cache.clear()
+            text = self.format_row(task_id)
+            self._row_cache[task_id] = text
+        return text
+
+    def _render(self):
+        """Redraw the visible window of rows"""
+        window = self._ids[self._offset:self._offset + self._visible]
+        self.listbox.delete(0, tk.END)
+        if window:
+            self.listbox.insert(tk.END, *[self._row_text(task_id) for task_id in window])
+            if self._selected in window:
+                self.listbox.selection_set(window.index(self._selected))
+        self._update_scrollbar()
+
+    def _update_scrollbar(self):
+        total = len(self._ids)
+        if total:
+            self.scrollbar.set(self._offset / total,
+                               min(1.0, (self._offset + self._visible) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _on_resize(self, event):
+        visible = max(1, event.height // self._row_height)
+        if visible != self._visible:
+            self._visible = visible
+            self._clamp_offset()
+            self._render()
+
+    def _on_select(self, event):
+        selection = self.listbox.curselection()
+        if selection and self._offset + selection[0] < len(self._ids):
+            self._selected = self._ids[self._offset + selection[0]]
+
+    def _on_double_click(self, event):
+        self._on_select(event)
+        if self._double_click is not None:
+            self._double_click(event)
+
+    def _on_mousewheel(self, event):
+        self._scroll_units(-3 if event.delta > 0 else 3)
+        return "break"
+
+    def _scroll_units(self, units: int):
+        self.yview('scroll', units, 'units')
+        return "break"
+
+    def _move_selection(self, step: int):
+        if not self._ids:
+            return "break"
+        index = self.position(self._selected) if self._selected is not None else None
+        if index is not None:
+            index += step
+        else:
+            index = self._offset
+        index = max(0, min(index, len(self._ids) - 1))
+        self._selected = self._ids[index]
+        self._ensure_visible(index)
+        self._render()
+        return "break"
@@ -1,61 +1,276 @@
+import functools
+import heapq
 import json
 import os
-import uuid
-from datetime import datetime
-from typing import List, Dict, Optional
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Callable, Iterable, Iterator
+from clock import SystemClock
+
+DATE_FIELDS = ('due_date', 'created_at', 'completed_at')
+PRIORITIES = ("High", "Medium", "Low")
+
+# metrics.py is not imported here, to keep headless startup fast: until
+# something else imports it, nothing can have enabled METRICS, so there
+# is nothing to record.
+
+def _timed(name: str, **labels) -> Callable:
+    """METRICS.timed, once metrics.py has been imported"""
+    def decorator(func):
+        timed = None
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            nonlocal timed
+            if timed is None:
+                metrics = sys.modules.get('metrics')
+                if metrics is None:
+                    return func(*args, **kwargs)
+                timed = metrics.METRICS.timed(name, **labels)(func)
+            return timed(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def _count(name: str, **labels):
+    """METRICS.inc, once metrics.py has been imported"""
+    metrics = sys.modules.get('metrics')
+    if metrics is not None:
+        metrics.METRICS.inc(name, **labels)
+
+def task_to_json(task: Dict) -> Dict:
+    """Copy a task with datetime fields converted to ISO strings"""
+    task_copy = task.copy()
+    for field in DATE_FIELDS:
+        if task_copy.get(field):
+            task_copy[field] = task_copy[field].isoformat()
+    return task_copy
+
+def task_from_json(task_data: Dict) -> Dict:
+    """Copy a stored task with ISO date strings converted back to datetimes"""
+    task = task_data.copy()
+    for field in DATE_FIELDS:
+        if task[field]:
+            task[field] = datetime.fromisoformat(task[field])
+    return task
+
+def anchor_recurrence(recurrence: Dict, due_date: Optional[datetime]) -> tuple:
+    """Anchor a repeat rule at a due date, returning (rule, first occurrence)"""
+    from recurrence import occurrences, with_start
+    if due_date is None:
+        raise ValueError("A recurring task needs a due date")
+    rule = with_start(recurrence, due_date)
+    first = next(occurrences(rule), None)
+    if first is None:
+        raise ValueError("The recurrence rule has no occurrences")
+    return rule, first
+
+def check_task(task: Dict) -> Dict:
+    """
+    Check a task from outside (e.g. an import) the way add_task checks its
+    arguments, raising ValueError if it cannot be used
+
+    A repeat rule that has no start yet is anchored at the due date.
+    """
+    TaskManager._check_priority(task.get('priority', "Medium"))
+    if task.get('estimate'):
+        TaskManager._check_estimate(task['estimate'])
+    recurrence = task.get('recurrence')
+    if recurrence:
+        if not isinstance(recurrence, dict):
+            raise ValueError("Recurrence must be a rule object")
+        start = recurrence.get('start')
+        if start is None:
+            task['recurrence'], task['due_date'] = anchor_recurrence(recurrence, task.get('due_date'))
+        elif isinstance(start, str):
+            from recurrence import with_start
+            task['recurrence'] = with_start(recurrence, datetime.fromisoformat(start))
+        else:
+            raise ValueError("Recurrence start must be an ISO date")
+    return task
 
 class TaskManager:
-    def __init__(self, data_file: str = "tasks.json"):
+    def __init__(self, data_file: str = "tasks.json", clock=None):
+        """
+        Args:
+            data_file: JSON file the tasks are stored in
+            clock: Object providing now(), defaults to the system clock
+        """
         self.data_file = data_file
+        self.clock = clock or SystemClock()
         self.tasks = []
+        self._by_id = {}
+        self._listeners = []
+        self._batch_depth = 0
+        self._dirty = False
+        # Optional callable replacing the synchronous write in save_tasks,
+        # e.g. WriteBehindSaver.request_save to persist on a worker thread
+        self.save_handler = None
+        self._dependencies = None
+        self._ranker = None
+        self._duplicates = None
+        self._similarity = None
+        self._planner = None
+        self._tag_index = None
+        self._rules = None
+        self._history = None
         self.load_tasks()
 
-    def load_tasks(self):
-        """Load tasks from JSON file"""
+    def add_listener(self, callback: Callable[[str, Optional[Dict]], None]):
+        """
+        Register a change listener
+
+        The callback is invoked as callback(event, task) after every change,
+        where event is 'added', 'updated', 'deleted' or 'loaded' (task is
+        None for 'loaded', which means the whole list was replaced).
+        """
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[str, Optional[Dict]], None]):
+        """Unregister a change listener"""
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _notify(self, event: str, task: Optional[Dict] = None):
+        """
+        Invoke all registered listeners for a change
+
+        Mutators notify before they save, so whatever the rules change is
+        written by that same save.
+        """
+        # Rules see the change first, so listeners get the task as the rules left it
+        changed = self._rules.on_change(event, task) if self._rules is not None else []
+        if changed:
+            self._dirty = True
+        self._notify_listeners(event, task)
+        if event == 'loaded':
+            # Not saved while loading; the next save writes them
+            for other in changed:
+                self._notify_listeners('updated', other)
+
+    def _notify_listeners(self, event: str, task: Optional[Dict] = None):
+        _count('todo_task_events_total', event=event)
+        for callback in list(self._listeners):
+            try:
+                callback(event, task)
+            except Exception as e:
+                print(f"Error in task listener: {e}")
+
+    def read_tasks(self) -> List[Dict]:
+        """Read tasks from the JSON file without touching the loaded list"""
+        tasks = []
         if os.path.exists(self.data_file):
             try:
                 with open(self.data_file, 'r', encoding='utf-8') as file:
                     data = json.load(file)
-                    self.tasks = []
                     for task_data in data:
-                        task = task_data.copy()
                         # Convert string dates back to datetime objects
-                        if task['due_date']:
-                            task['due_date'] = datetime.fromisoformat(task['due_date'])
-                        if task['created_at']:
-                            task['created_at'] = datetime.fromisoformat(task['created_at'])
-                        if task['completed_at']:
-                            task['completed_at'] = datetime.fromisoformat(task['completed_at'])
-                        self.tasks.append(task)
+                        tasks.append(task_from_json(task_data))
             except (json.JSONDecodeError, KeyError, ValueError) as e:
                 print(f"Error loading tasks: {e}")
-                self.tasks = []
-        else:
-            self.tasks = []
+                tasks = []
+        return tasks
+
+    @_timed('todo_storage_seconds', op='load')
+    def load_tasks(self, tasks: Optional[List[Dict]] = None):
+        """
+        Load tasks from JSON file
+
+        Args:
+            tasks: Tasks already returned by read_tasks (e.g. on a worker
+                thread); the file is read when omitted
+        """
+        self.tasks = self.read_tasks() if tasks is None else tasks
+        self._by_id = {task['id']: task for task in self.tasks}
+        self._notify('loaded')
+
+    @contextmanager
+    def batch(self):
+        """
+        Defer saving until the outermost batch exits
+
+        Usage:
+            with task_manager.batch():
+                for description in descriptions:
+                    task_manager.add_task(description)
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0 and self._dirty:
+                self.save_tasks()
+
+    def discard_pending_save(self):
+        """Drop the save a batch would make on exit, e.g. for a throwaway task file"""
+        self._dirty = False
 
+    @_timed('todo_storage_seconds', op='save')
     def save_tasks(self):
         """Save tasks to JSON file"""
+        if self._batch_depth:
+            self._dirty = True
+            return
+        self._dirty = False
+        if self.save_handler is not None:
+            self.save_handler()
+            return
         try:
-            # Convert datetime objects to strings for JSON serialization
-            serializable_tasks = []
-            for task in self.tasks:
-                task_copy = task.copy()
-                if task_copy['due_date']:
-                    task_copy['due_date'] = task_copy['due_date'].isoformat()
-                if task_copy['created_at']:
-                    task_copy['created_at'] = task_copy['created_at'].isoformat()
-                if task_copy['completed_at']:
-                    task_copy['completed_at'] = task_copy['completed_at'].isoformat()
-                serializable_tasks.append(task_copy)
-
-            with open(self.data_file, 'w', encoding='utf-8') as file:
-                json.dump(serializable_tasks, file, indent=2, ensure_ascii=False)
+            self.write_tasks()
         except Exception as e:
             print(f"Error saving tasks: {e}")
 
+    @_timed('todo_storage_seconds', op='serialize')
+    def serialize_tasks(self) -> List[Dict]:
+        """
+        Snapshot all tasks in their JSON form
+
+        Safe to call from a worker thread while the main thread keeps
+        mutating: the list and each task dict are copied atomically.
+        """
+        # Convert datetime objects to strings for JSON serialization
+        return [task_to_json(task) for task in list(self.tasks)]
+
+    @_timed('todo_storage_seconds', op='write')
+    def write_tasks(self, serializable_tasks: Optional[List[Dict]] = None):
+        """Write tasks to the JSON file atomically, raising on failure"""
+        if serializable_tasks is None:
+            serializable_tasks = self.serialize_tasks()
+
+        temp_file = self.data_file + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as file:
+            json.dump(serializable_tasks, file, indent=2, ensure_ascii=False)
+        os.replace(temp_file, self.data_file)
+        if self._history is not None:
+            # Written where the tasks are, so on the writer thread when there is one
+            self._history.flush()
+
     def add_task(self, description: str, due_date: Optional[datetime] = None, 
-                 priority: str = "Medium") -> str:
-        """Add a new task"""
+                 priority: str = "Medium", reminders: Optional[Dict] = None,
+                 recurrence: Optional[Dict] = None, parent_id: Optional[str] = None,
+                 flag_duplicates: bool = False, estimate: Optional[int] = None,
+                 tags: Optional[List[str]] = None) -> str:
+        """
+        Add a new task
+
+        Args:
+            reminders: Optional per-task reminder rule overriding the priority
+                defaults, e.g. {'before': [1440, 60], 'overdue_every': 240}
+            recurrence: Optional repeat rule (see recurrence.py), anchored at
+                due_date, which is required for recurring tasks
+            parent_id: Makes the task a subtask of an existing task
+            flag_duplicates: Set 'duplicate_of' to the id of the most similar
+                pending task, if any is similar enough (see dedupe.py)
+            estimate: Expected effort in minutes, used by the planner
+            tags: Labels such as 'work' (a leading # is dropped), see tags.py
+        """
+        import uuid  # imported on first use to keep headless startup fast
+        if parent_id is not None and parent_id not in self._by_id:
+            raise ValueError(f"No task with id {parent_id}")
+        self._check_priority(priority)
+        if recurrence:
+            recurrence, due_date = anchor_recurrence(recurrence, due_date)
         task_id = str(uuid.uuid4())
         task = {
             'id': task_id,
@@ -63,98 +278,538 @@ class TaskManager:
             'due_date': due_date,
             'priority': priority,
             'completed': False,
-            'created_at': datetime.now(),
+            'created_at': self.clock.now(),
             'completed_at': None
         }
+        if reminders is not None:
+            task['reminders'] = reminders
+        if recurrence:
+            task['recurrence'] = recurrence
+        if parent_id is not None:
+            task['parent_id'] = parent_id
+        if estimate:
+            task['estimate'] = self._check_estimate(estimate)
+        if tags:
+            from tags import normalize_tags
+            task['tags'] = normalize_tags(tags)
+        if flag_duplicates:
+            self._flag_duplicate(task)
         self.tasks.append(task)
+        self._by_id[task_id] = task
+        self._notify('added', task)
         self.save_tasks()
         return task_id
 
     def update_task(self, task_id: str, description: Optional[str] = None, 
-                   due_date: Optional[datetime] = None, priority: Optional[str] = None) -> bool:
-        """Update an existing task"""
-        for task in self.tasks:
-            if task['id'] == task_id:
-                if description is not None:
-                    task['description'] = description
-                if due_date is not None:
-                    task['due_date'] = due_date
-                if priority is not None:
-                    task['priority'] = priority
-                self.save_tasks()
-                return True
-        return False
+                   due_date: Optional[datetime] = None, priority: Optional[str] = None,
+                   reminders: Optional[Dict] = None, recurrence: Optional[Dict] = None,
+                   estimate: Optional[int] = None, tags: Optional[List[str]] = None) -> bool:
+        """
+        Update an existing task
+
+        Args:
+            recurrence: New repeat rule, re-anchored at the (new) due date;
+                an empty dict makes the task non-recurring
+            estimate: New effort estimate in minutes; 0 removes it
+            tags: New tags, replacing the old ones; an empty list removes them
+        """
+        task = self._by_id.get(task_id)
+        if task is None:
+            return False
+        if priority is not None:
+            self._check_priority(priority)
+        if estimate:
+            self._check_estimate(estimate)
+        if tags:
+            from tags import normalize_tags
+            tags = normalize_tags(tags)
+        if recurrence:
+            recurrence, due_date = anchor_recurrence(
+                recurrence, due_date if due_date is not None else task['due_date'])
+        if description is not None:
+            task['description'] = description
+        if due_date is not None:
+            task['due_date'] = due_date
+        if priority is not None:
+            task['priority'] = priority
+        if reminders is not None:
+            task['reminders'] = reminders
+        if recurrence:
+            task['recurrence'] = recurrence
+        elif recurrence is not None:
+            task.pop('recurrence', None)
+        if estimate:
+            task['estimate'] = estimate
+        elif estimate is not None:
+            task.pop('estimate', None)
+        if tags:
+            task['tags'] = tags
+        elif tags is not None:
+            task.pop('tags', None)
+        self._notify('updated', task)
+        self.save_tasks()
+        return True
 
     def delete_task(self, task_id: str) -> bool:
         """Delete a task"""
-        for i, task in enumerate(self.tasks):
-            if task['id'] == task_id:
-                del self.tasks[i]
-                self.save_tasks()
-                return True
-        return False
+        task = self._by_id.pop(task_id, None)
+        if task is None:
+            return False
+        self.tasks.remove(task)
+        self._notify('deleted', task)
+        self.save_tasks()
+        return True
+
+    def import_tasks(self, tasks: Iterable[Dict], overwrite: bool = False,
+                     flag_duplicates: bool = False) -> Dict[str, int]:
+        """
+        Merge tasks into the list, deduplicated by id, with a single save
+
+        Args:
+            tasks: Task dicts with datetime fields (see task_from_json);
+                missing fields get the same defaults as add_task, and tasks
+                failing its checks (see check_task) are skipped
+            overwrite: Replace tasks whose id already exists instead of
+                skipping them
+            flag_duplicates: Flag new tasks similar to a pending task,
+                including ones added earlier in the same import
+
+        Returns:
+            Counts of 'added', 'updated' and 'skipped' tasks
+        """
+        import uuid
+        counts = {'added': 0, 'updated': 0, 'skipped': 0}
+        with self.batch():
+            for task_data in tasks:
+                task = {
+                    'id': str(uuid.uuid4()),
+                    'description': "",
+                    'due_date': None,
+                    'priority': "Medium",
+                    'completed': False,
+                    'created_at': self.clock.now(),
+                    'completed_at': None,
+                }
+                task.update({key: value for key, value in task_data.items() if value is not None
+                             or key not in task})
+                try:
+                    check_task(task)
+                except ValueError:
+                    counts['skipped'] += 1
+                    continue
+
+                current = self._by_id.get(task['id'])
+                if current is None:
+                    if flag_duplicates and not task.get('duplicate_of'):
+                        self._flag_duplicate(task)
+                    self.tasks.append(task)
+                    self._by_id[task['id']] = task
+                    self._notify('added', task)
+                    counts['added'] += 1
+                elif overwrite:
+                    current.clear()
+                    current.update(task)
+                    self._notify('updated', current)
+                    counts['updated'] += 1
+                else:
+                    counts['skipped'] += 1
+                    continue
+                self._dirty = True
+        return counts
+
+    def restore_task(self, task: Dict, index: Optional[int] = None) -> bool:
+        """
+        Put back a task snapshot, used to roll back a change
+
+        Replaces the fields of the task with the same id, or re-inserts it
+        at index (appended by default) if it was deleted.
+        """
+        current = self._by_id.get(task['id'])
+        if current is not None:
+            current.clear()
+            current.update(task)
+            self._notify('updated', current)
+            self.save_tasks()
+            return True
+
+        restored = task.copy()
+        if index is None or index >= len(self.tasks):
+            self.tasks.append(restored)
+        else:
+            self.tasks.insert(index, restored)
+        self._by_id[restored['id']] = restored
+        self._notify('added', restored)
+        self.save_tasks()
+        return True
+
+    def add_dependency(self, task_id: str, blocker_id: str) -> bool:
+        """
+        Make a task wait for another one
+
+        Returns False if either task does not exist; raises ValueError if
+        the blocker already waits for the task, directly or indirectly.
+        """
+        task = self._by_id.get(task_id)
+        if task is None or blocker_id not in self._by_id:
+            return False
+        blocked_by = task.get('blocked_by') or []
+        if blocker_id in blocked_by:
+            return True
+        if self.dependencies.creates_cycle(blocker_id, task_id):
+            raise ValueError("The dependency would create a cycle")
+        # A new list, so snapshots from get_task_by_id are not affected
+        task['blocked_by'] = blocked_by + [blocker_id]
+        self._notify('updated', task)
+        self.save_tasks()
+        return True
+
+    def remove_dependency(self, task_id: str, blocker_id: str) -> bool:
+        """Stop a task waiting for another one"""
+        task = self._by_id.get(task_id)
+        if task is None or blocker_id not in (task.get('blocked_by') or []):
+            return False
+        blocked_by = [other for other in task['blocked_by'] if other != blocker_id]
+        if blocked_by:
+            task['blocked_by'] = blocked_by
+        else:
+            del task['blocked_by']
+        self._notify('updated', task)
+        self.save_tasks()
+        return True
+
+    def set_parent(self, task_id: str, parent_id: Optional[str]) -> bool:
+        """
+        Move a task under another one, or to the top level with None
+
+        Returns False if a task does not exist; raises ValueError if the
+        parent is the task itself or one of its subtasks.
+        """
+        task = self._by_id.get(task_id)
+        if task is None or (parent_id is not None and parent_id not in self._by_id):
+            return False
+        if task.get('parent_id') == parent_id:
+            return True
+        if parent_id is not None and self.dependencies.creates_cycle(task_id, parent_id):
+            raise ValueError("A task cannot be a subtask of its own subtask")
+        if parent_id is None:
+            task.pop('parent_id', None)
+        else:
+            task['parent_id'] = parent_id
+        self._notify('updated', task)
+        self.save_tasks()
+        return True
 
     def mark_complete(self, task_id: str) -> bool:
-        """Mark a task as completed"""
-        for task in self.tasks:
-            if task['id'] == task_id:
-                task['completed'] = True
-                task['completed_at'] = datetime.now()
+        """
+        Mark a task as completed
+
+        A recurring task instead moves on to its next occurrence after the
+        current due date (or after now, skipping missed ones) and stays
+        pending; it is only completed once its series has ended.
+        """
+        task = self._by_id.get(task_id)
+        if task is None:
+            return False
+        if task.get('recurrence') and task['due_date'] and not task['completed']:
+            from recurrence import next_occurrence
+            following = next_occurrence(task['recurrence'], max(task['due_date'], self.clock.now()))
+            if following is not None:
+                task['due_date'] = following
+                self._notify('updated', task)
                 self.save_tasks()
                 return True
-        return False
+        task['completed'] = True
+        task['completed_at'] = self.clock.now()
+        self._notify('updated', task)
+        self.save_tasks()
+        return True
 
     def mark_incomplete(self, task_id: str) -> bool:
         """Mark a task as incomplete"""
-        for task in self.tasks:
-            if task['id'] == task_id:
-                task['completed'] = False
-                task['completed_at'] = None
-                self.save_tasks()
-                return True
-        return False
+        task = self._by_id.get(task_id)
+        if task is None:
+            return False
+        task['completed'] = False
+        task['completed_at'] = None
+        self._notify('updated', task)
+        self.save_tasks()
+        return True
 
+    @_timed('todo_query_seconds', query='get_all_tasks')
     def get_all_tasks(self) -> List[Dict]:
         """Get all tasks"""
         return self.tasks.copy()
 
+    @_timed('todo_query_seconds', query='get_pending_tasks')
     def get_pending_tasks(self) -> List[Dict]:
         """Get all incomplete tasks"""
         return [task for task in self.tasks if not task['completed']]
 
+    @_timed('todo_query_seconds', query='get_completed_tasks')
     def get_completed_tasks(self) -> List[Dict]:
         """Get all completed tasks"""
         return [task for task in self.tasks if task['completed']]
 
+    @_timed('todo_query_seconds', query='get_overdue_tasks')
     def get_overdue_tasks(self) -> List[Dict]:
         """Get all overdue tasks"""
-        now = datetime.now()
+        now = self.clock.now()
         return [task for task in self.tasks 
                 if not task['completed'] and task['due_date'] and task['due_date'] < now]
 
+    @_timed('todo_query_seconds', query='get_tasks_due_soon')
     def get_tasks_due_soon(self, hours: int = 24) -> List[Dict]:
         """Get tasks due within specified hours"""
-        from datetime import timedelta
-        now = datetime.now()
+        now = self.clock.now()
         cutoff = now + timedelta(hours=hours)
 
         return [task for task in self.tasks 
                 if not task['completed'] and task['due_date'] 
                 and now <= task['due_date'] <= cutoff]
 
+    @_timed('todo_query_seconds', query='search_tasks')
     def search_tasks(self, query: str) -> List[Dict]:
         """Search tasks by description"""
         query_lower = query.lower()
         return [task for task in self.tasks 
                 if query_lower in task['description'].lower()]
 
+    def get_actionable_tasks(self) -> List[Dict]:
+        """Get pending tasks whose blockers and subtasks are all complete"""
+        by_id = self._by_id
+        return [by_id[task_id] for task_id in self.dependencies.actionable_ids()]
+
+    def get_subtasks(self, task_id: str) -> List[Dict]:
+        """Get the direct subtasks of a task"""
+        by_id = self._by_id
+        subtasks = [by_id[child] for child in self.dependencies.children(task_id) if child in by_id]
+        return sorted(subtasks, key=lambda task: task['created_at'])
+
+    @property
+    def dependencies(self):
+        """
+        DependencyGraph of subtasks and blockers, created on first use; see
+        dependencies.py
+        """
+        if self._dependencies is None:
+            from dependencies import DependencyGraph
+            self._dependencies = DependencyGraph(self)
+            # Ahead of the other listeners, so they see it up to date
+            self._listeners.insert(0, self._listeners.pop())
+        return self._dependencies
+
+    @property
+    def ranker(self):
+        """TaskRanker behind next_tasks, created on first use"""
+        if self._ranker is None:
+            from ranking import TaskRanker
+            self._ranker = TaskRanker(self)
+        return self._ranker
+
+    @property
+    def duplicates(self):
+        """DuplicateIndex used to flag near duplicates, created on first use"""
+        if self._duplicates is None:
+            from dedupe import DuplicateIndex
+            self._duplicates = DuplicateIndex(self)
+        return self._duplicates
+
+    def _flag_duplicate(self, task: Dict):
+        matches = self.duplicates.find_duplicates(task['description'], exclude=task['id'])
+        if matches:
+            task['duplicate_of'] = matches[0][1]
+
+    @staticmethod
+    def _check_priority(priority: str) -> str:
+        if priority not in PRIORITIES:
+            raise ValueError(f"Priority must be one of {', '.join(PRIORITIES)}")
+        return priority
+
+    @staticmethod
+    def _check_estimate(estimate: int) -> int:
+        if not isinstance(estimate, int) or estimate < 0:
+            raise ValueError("Estimate must be a whole number of minutes")
+        return estimate
+
+    def set_rules(self, rules: Optional[List[Dict]]) -> int:
+        """
+        Apply rules to every task now and to every change from now on
+
+        Args:
+            rules: Rule dicts (see rules.py), or None to stop; raises
+                ValueError if a rule is invalid
+
+        Returns:
+            Number of tasks the rules changed
+        """
+        if not rules:
+            self._rules = None
+            return 0
+        from rules import RuleEngine
+        self._rules = RuleEngine(self, rules)
+        return self._publish_rule_changes(self._rules.apply_all())
+
+    def check_rules(self) -> int:
+        """
+        Apply the rules to tasks that came within a rule's due_within window
+        since the last check; call it now and then, e.g. from a timer
+
+        Returns:
+            Number of tasks the rules changed
+        """
+        if self._rules is None:
+            return 0
+        now = self.clock.now()
+        changed = []
+        for task_id in self._rules.entered(now):
+            task = self._by_id.get(task_id)
+            if task is not None and self._rules.apply_to(task, now):
+                changed.append(task)
+        return self._publish_rule_changes(changed)
+
+    def _publish_rule_changes(self, changed: List[Dict]) -> int:
+        """Save and tell listeners about tasks the rules changed"""
+        if changed:
+            with self.batch():
+                self._dirty = True
+                for task in changed:
+                    self._notify_listeners('updated', task)
+        return len(changed)
+
+    @property
+    def tag_index(self):
+        """TagIndex behind query_tasks, created on first use"""
+        if self._tag_index is None:
+            from tags import TagIndex
+            self._tag_index = TagIndex(self)
+        return self._tag_index
+
+    @_timed('todo_query_seconds', query='query_tasks')
+    def query_tasks(self, query: str) -> List[Dict]:
+        """
+        Get the tasks matching a tag and status query
+
+        e.g. "tag:work AND tag:urgent AND NOT completed" or
+        "(#home OR #errands) overdue"; see tags.py for the syntax. Raises
+        ValueError if the query is malformed.
+        """
+        by_id = self._by_id
+        return [by_id[task_id] for task_id in self.tag_index.query(query)]
+
+    def get_tag_counts(self) -> Dict[str, int]:
+        """Get the number of tasks per tag"""
+        return self.tag_index.tag_counts()
+
+    @property
+    def history(self):
+        """
+        TaskHistory recording every change from its creation on, created on
+        first use; see history.py
+        """
+        if self._history is None:
+            from history import TaskHistory
+            self._history = TaskHistory(self)
+        return self._history
+
+    def get_task_as_of(self, task_id: str, when: datetime) -> Optional[Dict]:
+        """Get a task as it was at a time, None if it did not exist then"""
+        return self.history.as_of(task_id, when)
+
+    @_timed('todo_query_seconds', query='get_tasks_as_of')
+    def get_tasks_as_of(self, when: datetime) -> List[Dict]:
+        """Get every task that existed at a time, as it was then"""
+        return self.history.tasks_as_of(when)
+
+    def get_task_versions(self, task_id: str) -> List[Dict]:
+        """Get the recorded changes to a task, oldest first"""
+        return self.history.versions(task_id)
+
+    @property
+    def planner(self):
+        """Planner that schedules pending tasks into working hours, created on first use"""
+        if self._planner is None:
+            from planner import Planner
+            self._planner = Planner(self)
+        return self._planner
+
+    @property
+    def similarity(self):
+        """SimilarityIndex behind related tasks and themes, created on first use"""
+        if self._similarity is None:
+            from similarity import SimilarityIndex
+            self._similarity = SimilarityIndex(self)
+        return self._similarity
+
+    @_timed('todo_query_seconds', query='get_related_tasks')
+    def get_related_tasks(self, task_id: str, k: int = 5) -> List[Dict]:
+        """Get the k pending tasks whose descriptions are most like a task's"""
+        by_id = self._by_id
+        return [by_id[other] for _, other in self.similarity.related(task_id, k)]
+
+    @_timed('todo_query_seconds', query='get_task_themes')
+    def get_task_themes(self, k: int = 8) -> List[Dict]:
+        """
+        Group pending tasks into at most k themes by their descriptions
+
+        Returns:
+            List of {'terms': words describing the theme, 'tasks': tasks},
+            largest theme first
+        """
+        by_id = self._by_id
+        return [{'terms': theme['terms'], 'tasks': [by_id[task_id] for task_id in theme['task_ids']]}
+                for theme in self.similarity.themes(k)]
+
+    @_timed('todo_query_seconds', query='next_tasks')
+    def next_tasks(self, k: int = 5, actionable_only: bool = True) -> List[Dict]:
+        """
+        Get the k pending tasks to do next, best first
+
+        Ranked by priority, due date urgency and age (see ranking.py; the
+        weights are set with ranker.set_weights). Cheap to call often:
+        only about k tasks are looked at.
+
+        Args:
+            k: Number of tasks
+            actionable_only: Skip tasks waiting for a blocker or subtask
+        """
+        accept = self.dependencies.is_actionable if actionable_only else None
+        by_id = self._by_id
+        return [by_id[task_id] for _, task_id in self.ranker.top(k, accept=accept)]
+
+    def get_occurrences(self, since: datetime, before: datetime) -> Iterator[tuple]:
+        """
+        Yield (occurrence time, task) for pending tasks due in [since, before)
+
+        Recurring tasks contribute every occurrence in the window, expanded
+        lazily from their current due date; the merged stream is in time
+        order, so a caller can stop after the first few.
+        """
+        from recurrence import occurrences
+        streams = []
+        for task in list(self.tasks):
+            if task['completed'] or not task['due_date']:
+                continue
+            if task.get('recurrence'):
+                # Occurrences before the current due date are already done
+                window_start = max(since, task['due_date'])
+                streams.append(self._tagged(occurrences(task['recurrence'], window_start, before),
+                                            task))
+            elif since <= task['due_date'] < before:
+                streams.append(iter([(task['due_date'], task['id'], task)]))
+        for when, _, task in heapq.merge(*streams):
+            yield when, task
+
+    @staticmethod
+    def _tagged(times: Iterable[datetime], task: Dict) -> Iterator[tuple]:
+        for when in times:
+            yield when, task['id'], task
+
     def get_task_by_id(self, task_id: str) -> Optional[Dict]:
         """Get a specific task by ID"""
-        for task in self.tasks:
-            if task['id'] == task_id:
-                return task.copy()
-        return None
+        task = self._by_id.get(task_id)
+        return task.copy() if task is not None else None
 
+    @_timed('todo_query_seconds', query='get_task_stats')
     def get_task_stats(self) -> Dict:
         """Get statistics about tasks"""
         total = len(self.tasks)
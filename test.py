@@ -19,7 +19,7 @@ def test_task_manager():
         from task_manager import TaskManager
     except ImportError as e:
         print(f"❌ Failed to import TaskManager: {e}")
-        return False
+        raise
 
     # Create temporary file for testing
     with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
@@ -59,12 +59,18 @@ def test_task_manager():
         assert tasks2[0]['completed'] == True
         print("  ✓ File persistence works")
 
+        # A batch whose save was discarded leaves the file alone
+        with tm.batch():
+            tm.add_task("Throwaway task")
+            tm.discard_pending_save()
+        assert len(TaskManager(test_file).get_all_tasks()) == 1
+        print("  ✓ Pending saves can be discarded")
+
         print("✅ TaskManager tests passed!")
-        return True
 
     except Exception as e:
         print(f"❌ TaskManager test failed: {e}")
-        return False
+        raise
     finally:
         # Clean up
         if os.path.exists(test_file):
@@ -103,15 +109,1573 @@ def test_reminder_system():
             print(f"  ⚠️  Reminder checking warning: {e}")
 
         print("✅ ReminderSystem tests passed!")
-        return True
 
     except Exception as e:
         print(f"❌ ReminderSystem test failed: {e}")
-        return False
+        raise
+    finally:
+        if 'test_file' in locals() and os.path.exists(test_file):
+            os.remove(test_file)
+
+def test_reminder_rules():
+    """Test per-priority reminder lead times and overdue repeats"""
+    print("\n⏰ Testing reminder rules...")
+
+    try:
+        from reminder_system import ReminderSystem
+        from task_manager import TaskManager
+
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
+            test_file = f.name
+
+        tm = TaskManager(test_file)
+        rs = ReminderSystem(tm)
+        sent = []
+        rs.send_notification = lambda title, message: sent.append(title)
+
+        now = datetime.now()
+        soon_id = tm.add_task("Due soon", now + timedelta(minutes=30), "High")
+        tm.add_task("Overdue", now - timedelta(hours=5), "High")
+        tm.add_task("Far away", now + timedelta(days=3), "Low")
+
+        # The passed 60 minute lead time and the overdue notice fire once
+        rs.check_reminders()
+        assert sorted(sent) == ["Overdue Task: Overdue", "Task Due Soon: Due soon"], sent
+        rs.check_reminders()
+        assert len(sent) == 2
+        print("  ✓ Catch-up reminders fire exactly once")
+
+        # Editing a task must not repeat reminders that were already sent
+        tm.update_task(soon_id, "Due soon (edited)")
+        rs.check_reminders()
+        assert len(sent) == 2
+        print("  ✓ Rescheduling skips delivered reminders")
+
+        # The 10 minute lead time and the overdue repeats are still pending
+        pending = sorted((entry[0], entry[4], entry[5]) for entry in rs._queue
+                         if rs._generation.get(entry[2]) == entry[3])
+        kinds = [(kind, minutes) for _, kind, minutes in pending]
+        assert ('before', 10) in kinds and ('before', 60) in kinds
+        assert kinds.count(('overdue', 0)) == 3
+        print("  ✓ Future lead times and overdue repeats are scheduled")
+
+        # Completing a task drops its pending reminders
+        tm.mark_complete(soon_id)
+        assert all(entry[2] != soon_id or rs._generation.get(entry[2]) != entry[3]
+                   for entry in rs._queue)
+        print("  ✓ Completed tasks are unscheduled")
+
+        # Custom reminders come back when a completed task is reopened
+        far_id = tm.add_task("Custom lead time", now + timedelta(days=2), "Low")
+        rs.add_custom_reminder(far_id, 600)
+
+        def has_custom():
+            return any(entry[2] == far_id and entry[5] == 600 and
+                       rs._generation.get(entry[2]) == entry[3] for entry in rs._queue)
+        assert has_custom()
+        tm.mark_complete(far_id)
+        assert not has_custom()
+        tm.mark_incomplete(far_id)
+        assert has_custom()
+        tm.delete_task(far_id)
+        assert far_id not in rs._custom
+        print("  ✓ Custom reminders survive completion, not deletion")
+
+        print("✅ Reminder rule tests passed!")
+
+    except Exception as e:
+        print(f"❌ Reminder rule test failed: {e}")
+        raise
+    finally:
+        if 'test_file' in locals() and os.path.exists(test_file):
+            os.remove(test_file)
+
+def test_ui_bridge():
+    """Test cross-thread event delivery to the GUI"""
+    print("\n📬 Testing UI event queue...")
+
+    try:
+        import threading
+        from ui_bridge import UIEventQueue
+        from reminder_system import ReminderSystem
+
+        events = UIEventQueue()
+        workers = [threading.Thread(target=lambda n=n: events.post('status', n))
+                   for n in range(20)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        assert len(events.drain(5)) == 5
+        assert len(events.drain()) == 15
+        assert events.drain() == []
+        print("  ✓ Events posted from threads are drained in batches")
+
+        rs = ReminderSystem(None, event_queue=events)
+        rs.send_tkinter_notification("Title", "Message")
+        kinds = [kind for kind, _ in events.drain()]
+        assert kinds == ['notification']
+        print("  ✓ Popups are handed to the GUI thread")
+
+        print("✅ UI event queue tests passed!")
+
+    except Exception as e:
+        print(f"❌ UI event queue test failed: {e}")
+        raise
+
+def test_simulation():
+    """Test the virtual clock and the fast-forward reminder simulation"""
+    print("\n⏩ Testing reminder simulation...")
+
+    try:
+        import threading
+        from clock import VirtualClock
+        from simulate import run_simulation
+
+        clock = VirtualClock(datetime(2025, 1, 1, 9, 0))
+        clock.sleep(90)
+        assert clock.now() == datetime(2025, 1, 1, 9, 1, 30)
+        assert clock.wait(threading.Event(), 30) is False
+        assert clock.now() == datetime(2025, 1, 1, 9, 2)
+        print("  ✓ Virtual clock advances instead of blocking")
+
+        first = run_simulation(tasks=300, days=2, seed=7)
+        second = run_simulation(tasks=300, days=2, seed=7)
+        assert first['notifications'] > 0
+        assert first['notifications_by_kind'] == second['notifications_by_kind']
+        assert first['lateness_seconds']['max'] == 0
+        print("  ✓ Simulation is deterministic and on time")
+
+        polled = run_simulation(tasks=300, days=2, seed=7, tick=60)
+        assert 0 < polled['lateness_seconds']['max'] <= 60
+        print("  ✓ Fixed-interval polling shows bounded lateness")
+
+        print("✅ Simulation tests passed!")
+
+    except Exception as e:
+        print(f"❌ Simulation test failed: {e}")
+        raise
+
+def test_optimistic_store():
+    """Test write-behind persistence with rollback on failure"""
+    print("\n💾 Testing optimistic store...")
+
+    try:
+        import time
+        from task_manager import TaskManager
+        from optimistic_store import OptimisticStore
+        from ui_bridge import UIEventQueue
+
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
+            test_file = f.name
+
+        class SlowDiskTaskManager(TaskManager):
+            fail = False
+
+            def write_tasks(self, serializable_tasks=None):
+                time.sleep(0.2)
+                if self.fail:
+                    raise OSError("disk full")
+                super().write_tasks(serializable_tasks)
+
+        tm = SlowDiskTaskManager(test_file)
+        events = UIEventQueue()
+        store = OptimisticStore(tm, events, delay=0)
+
+        start = time.perf_counter()
+        task_id = store.add_task("Written in the background")
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        assert elapsed_ms < 50, elapsed_ms
+        assert tm.get_task_by_id(task_id) is not None
+        print(f"  ✓ Mutation returned in {elapsed_ms:.1f} ms on a slow disk")
+
+        store.flush()
+        results = [payload for kind, payload in events.drain() if kind == 'store_result']
+        store.handle_results(results)
+        assert results and all(ok for ok, _, _, _ in results)
+        assert len(TaskManager(test_file).get_all_tasks()) == 1
+        print("  ✓ Change persisted by the writer thread")
+
+        tm.fail = True
+        store.mark_complete(task_id)
+        store.flush()
+        store.handle_results([payload for kind, payload in events.drain() if kind == 'store_result'])
+        assert tm.get_task_by_id(task_id)['completed'] is False
+        print("  ✓ Failed write rolled back in memory")
+
+        tm.fail = False
+        store.close()
+        print("✅ Optimistic store tests passed!")
+
+    except Exception as e:
+        print(f"❌ Optimistic store test failed: {e}")
+        raise
     finally:
         if 'test_file' in locals() and os.path.exists(test_file):
             os.remove(test_file)
 
+def test_task_index():
+    """Test indexed search and filters against a linear scan"""
+    print("\n🔎 Testing task index...")
+
+    try:
+        import threading
+        from task_manager import TaskManager
+        from task_index import TaskIndex
+        from simulate import synthetic_tasks
+        from ui_bridge import LatestOnlyWorker, UIEventQueue
+
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
+            test_file = f.name
+
+        tm = TaskManager(test_file)
+        now = datetime.now()
+        with tm.batch():
+            for spec in synthetic_tasks(2000, now, seed=3):
+                tm.add_task(spec['description'], spec['due_date'], spec['priority'])
+        index = TaskIndex(tm)
+
+        def scan(predicate):
+            return [task['id'] for task in tm.tasks if predicate(task)]
+
+        assert index.query(text="pay ren") == scan(
+            lambda t: any(w.startswith("pay") for w in t['description'].lower().split())
+            and any(w.startswith("ren") for w in t['description'].lower().split()))
+        week = now + timedelta(days=7)
+        assert index.query(priority="High", due_from=now, due_to=week) == scan(
+            lambda t: t['priority'] == "High" and t['due_date'] and now <= t['due_date'] < week)
+        assert index.query(has_due=False) == scan(lambda t: t['due_date'] is None)
+        print("  ✓ Indexed queries match a linear scan")
+
+        task_id = tm.add_task("Renew passport", now + timedelta(days=1), "Low")
+        assert task_id in index.query(text="passport")
+        tm.update_task(task_id, "Renew driving licence")
+        assert task_id not in index.query(text="passport")
+        tm.mark_complete(task_id)
+        assert task_id in index.query(text="licence", status="completed")
+        tm.delete_task(task_id)
+        assert index.query(text="licence") == []
+        print("  ✓ Indexes follow task changes")
+
+        from task_index import SORT_KEYS
+        for key, key_func in SORT_KEYS.items():
+            expected = [t['id'] for t in sorted(tm.tasks, key=key_func)]
+            assert index.sorted_ids(key) == expected, key
+        tm.update_task(tm.tasks[0]['id'], due_date=now + timedelta(days=365), priority="Low")
+        tm.add_task("Late addition", now - timedelta(days=1), "High")
+        for key, key_func in SORT_KEYS.items():
+            expected = [t['id'] for t in sorted(tm.tasks, key=key_func)]
+            assert index.sorted_ids(key) == expected, key
+            assert index.sorted_ids(key, reverse=True) == expected[::-1]
+            assert index.sort_position(key, tm.tasks[0]['id']) == expected.index(tm.tasks[0]['id'])
+        subset = index.query(text="invoice", sort='due')
+        assert subset == [i for i in index.sorted_ids('due') if i in set(subset)]
+        print("  ✓ Cached sort permutations stay ordered after changes")
+
+        assert index.query(text="report", cancelled=lambda: True) is None
+        events = UIEventQueue()
+        worker = LatestOnlyWorker(events)
+        release = threading.Event()
+        worker.submit(lambda cancelled: release.wait(5), lambda result: None)
+        worker.submit(lambda cancelled: "stale", lambda result: None)
+        newest = worker.submit(lambda cancelled: "newest", lambda result: None)
+        release.set()
+        for _ in range(100):
+            delivered = events.drain()
+            if delivered:
+                break
+            threading.Event().wait(0.02)
+        assert [payload[0] for _, payload in delivered] == [newest]
+        print("  ✓ Superseded queries are dropped")
+
+        print("✅ Task index tests passed!")
+
+    except Exception as e:
+        print(f"❌ Task index test failed: {e}")
+        raise
+    finally:
+        if 'test_file' in locals() and os.path.exists(test_file):
+            os.remove(test_file)
+
+def test_interchange():
+    """Test streaming import and export formats"""
+    print("\n🔄 Testing import/export formats...")
+
+    try:
+        import csv
+        from task_manager import TaskManager
+        from interchange import FORMATS, Progress, export_file, import_file, read_file
+
+        tmp = tempfile.mkdtemp()
+        tm = TaskManager(os.path.join(tmp, "tasks.json"))
+        due = datetime(2030, 5, 1, 9, 30)
+        first = tm.add_task("Quote \"this\", then; a backslash \\\nand a new line ünïcode", due, "High",
+                            reminders={'before': [60]})
+        tm.add_task("No due date", None, "Low")
+        tm.mark_complete(first)
+
+        for fmt in FORMATS:
+            path = os.path.join(tmp, f"export.{fmt}")
+            assert export_file(tm, path)['exported'] == 2
+            copy = TaskManager(os.path.join(tmp, f"copy_{fmt}.json"))
+            counts = import_file(copy, path)
+            assert counts['added'] == 2, counts
+            task = copy.get_task_by_id(first)
+            original = tm.get_task_by_id(first)
+            for field in ('description', 'due_date', 'priority', 'completed', 'reminders'):
+                assert task[field] == original[field], (fmt, field, task[field])
+            # Importing again only finds duplicates
+            assert import_file(copy, path)['skipped'] == 2
+            print(f"  ✓ {fmt} round trip")
+
+        reports = []
+        progress = Progress(lambda p: reports.append(p.count), every=1)
+        import_file(TaskManager(os.path.join(tmp, "progress.json")),
+                    os.path.join(tmp, "export.jsonl"), progress=progress)
+        assert reports == [1, 2, 2], reports
+        print("  ✓ Progress reported while importing")
+
+        bad_csv = os.path.join(tmp, "bad.csv")
+        with open(bad_csv, 'w', encoding='utf-8') as file:
+            file.write("description,estimate,reminders,due_date\n"
+                       "Fine,10,,\nBad estimate,ten,,\nBad reminders,,{oops,\n"
+                       "Bad date,,,someday\nAlso fine,,,\n")
+        bad_ics = os.path.join(tmp, "bad.ics")
+        with open(bad_ics, 'w', encoding='utf-8') as file:
+            file.write("BEGIN:VCALENDAR\nBEGIN:VTODO\nSUMMARY:Bad due\nDUE:soon\nEND:VTODO\n"
+                       "BEGIN:VTODO\nSUMMARY:Fine\nEND:VTODO\nEND:VCALENDAR\n")
+        for path, added, skipped in ((bad_csv, 2, 3), (bad_ics, 1, 1)):
+            target = TaskManager(path + ".json")
+            counts = import_file(target, path)
+            assert (counts['added'], counts['skipped'], len(counts['errors'])) == \
+                (added, skipped, skipped), counts
+            assert len(TaskManager(target.data_file).tasks) == added
+        try:
+            list(read_file(bad_csv))
+            assert False, "a bad row should raise without an errors list"
+        except ValueError as e:
+            assert "line 3" in str(e), e
+        print("  ✓ Rows that cannot be read are skipped and reported")
+
+        repeating_csv = os.path.join(tmp, "repeating.csv")
+        with open(repeating_csv, 'w', encoding='utf-8', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(["id", "description", "priority", "due_date", "recurrence"])
+            writer.writerow(["daily", "Water plants", "Low", "2030-05-01T08:00:00", '{"freq": "daily"}'])
+            writer.writerow(["undated", "No anchor", "Low", "", '{"freq": "daily"}'])
+            writer.writerow(["urgent", "Unknown priority", "urgent", "", ""])
+        target = TaskManager(os.path.join(tmp, "repeating.json"))
+        counts = import_file(target, repeating_csv)
+        assert (counts['added'], counts['skipped']) == (1, 2), counts
+        assert target.mark_complete("daily")
+        task = target.get_task_by_id("daily")
+        assert not task['completed'] and task['due_date'] == datetime(2030, 5, 2, 8, 0), task
+        assert export_file(target, os.path.join(tmp, "repeating.ics"))['exported'] == 1
+        assert target.import_tasks([{'id': "bad", 'description': "x", 'priority': "urgent"}]) == \
+            {'added': 0, 'updated': 0, 'skipped': 1}
+        print("  ✓ Imported repeat rules are anchored, bad priorities and rules skipped")
+
+        print("✅ Import/export tests passed!")
+
+    except Exception as e:
+        print(f"❌ Import/export test failed: {e}")
+        raise
+    finally:
+        if 'tmp' in locals():
+            import shutil
+            shutil.rmtree(tmp, ignore_errors=True)
+
+def test_async_task_manager():
+    """Test the asyncio task manager and reminder loop"""
+    print("\n⚡ Testing AsyncTaskManager...")
+
+    try:
+        import asyncio
+        import time
+        from task_manager import TaskManager
+        from async_task_manager import AsyncTaskManager
+        from reminder_system import ReminderSystem
+
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
+            test_file = f.name
+
+        class Events:
+            def __init__(self):
+                self.events = []
+
+            def post(self, kind, payload=None):
+                self.events.append((kind, payload))
+
+        async def scenario():
+            store = await AsyncTaskManager.open(test_file)
+            write_tasks = store.task_manager.write_tasks
+
+            def slow_write(serializable_tasks=None):
+                time.sleep(0.05)
+                write_tasks(serializable_tasks)
+            store.task_manager.write_tasks = slow_write
+
+            ids = await asyncio.gather(*(store.add_task(f"Task {i}") for i in range(50)))
+            assert len(set(ids)) == 50
+            assert store.writes <= 3, store.writes
+            assert len(TaskManager(test_file).get_all_tasks()) == 50
+            print(f"  ✓ 50 concurrent durable adds shared {store.writes} writes")
+
+            heartbeat = []
+
+            async def tick():
+                for _ in range(5):
+                    heartbeat.append(time.perf_counter())
+                    await asyncio.sleep(0.01)
+            ticker = asyncio.create_task(tick())
+            await store.mark_complete(ids[0])
+            await ticker
+            gaps = [b - a for a, b in zip(heartbeat, heartbeat[1:])]
+            assert max(gaps) < 0.04, gaps
+            assert (await store.get_task_by_id(ids[0]))['completed'] is True
+            print("  ✓ Event loop kept running during the write")
+
+            events = Events()
+            reminders = ReminderSystem(store.task_manager, event_queue=events)
+            runner = asyncio.create_task(reminders.run_async())
+            await asyncio.sleep(0.05)
+            await store.add_task("Overdue", datetime.now() - timedelta(hours=2), "High")
+            await asyncio.sleep(0.1)
+            reminders.stop()
+            await asyncio.wait_for(runner, 1)
+            assert any(kind == 'status' and 'Overdue' in payload for kind, payload in events.events)
+            print("  ✓ Asyncio reminder loop woke up for a new task")
+
+            await store.close()
+
+        asyncio.run(scenario())
+        print("✅ AsyncTaskManager tests passed!")
+
+    except Exception as e:
+        print(f"❌ AsyncTaskManager test failed: {e}")
+        raise
+    finally:
+        if 'test_file' in locals() and os.path.exists(test_file):
+            os.remove(test_file)
+
+def test_daemon():
+    """Test the JSON-RPC daemon with pipelining and subscriptions"""
+    print("\n🔌 Testing daemon...")
+
+    try:
+        import asyncio
+        import threading
+        import time
+        from task_manager import TaskManager
+        from daemon import TaskDaemon, TaskClient, RPCError
+
+        tmp = tempfile.mkdtemp()
+        test_file = os.path.join(tmp, "tasks.json")
+        socket_path = os.path.join(tmp, "todo.sock")
+
+        loop = asyncio.new_event_loop()
+        daemon = TaskDaemon(test_file, reminders=False, save_delay=0)
+        loop.run_until_complete(daemon.start(socket_path))
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+
+        with TaskClient(socket_path) as client, TaskClient(socket_path) as watcher:
+            assert watcher.call('subscribe', topics=['tasks']) == ['tasks']
+
+            task_id = client.call('add_task', description="Shared task",
+                                  due_date="2030-01-01T09:00:00", priority="High")
+            results = client.pipeline([('ping', {}), ('get_task', {'task_id': task_id}),
+                                       ('stats', {})])
+            assert results[0] == "pong"
+            assert results[1]['description'] == "Shared task"
+            assert results[2]['total'] == 1
+            print("  ✓ Pipelined requests answered in order")
+
+            try:
+                client.call('no_such_method')
+                assert False, "expected an error"
+            except RPCError as e:
+                assert e.code == -32601
+            print("  ✓ Unknown method reported as a JSON-RPC error")
+
+            for method, params, code in (('get_task', {'id': task_id}, -32602),
+                                         ('get_task', [task_id, "extra"], -32602),
+                                         ('due_soon', {'hours': "soon"}, -32603)):
+                try:
+                    client.pipeline([(method, params)])
+                    assert False, f"{method} {params} should fail"
+                except RPCError as e:
+                    assert e.code == code, (method, params, e.code)
+            print("  ✓ Wrong parameters and internal errors are told apart")
+
+            event = next(watcher.notifications())
+            assert event['method'] == 'task_changed'
+            assert event['params']['event'] == 'added'
+            assert event['params']['task']['id'] == task_id
+            print("  ✓ Subscriber received the change event")
+
+            start = time.perf_counter()
+            for _ in range(200):
+                client.call('get_task', task_id=task_id)
+            per_call_ms = (time.perf_counter() - start) * 1000 / 200
+            print(f"  ✓ Round trip read: {per_call_ms:.3f} ms")
+
+            assert client.call('flush') is True
+            assert TaskManager(test_file).get_task_by_id(task_id) is not None
+            print("  ✓ Change persisted after flush")
+
+            second = TaskDaemon(test_file, reminders=False)
+            try:
+                asyncio.run(second.start(socket_path))
+                assert False, "a second daemon should not take over a live socket"
+            except OSError:
+                pass
+            assert client.call('ping') == "pong"
+            print("  ✓ A live socket is not taken over")
+
+        asyncio.run_coroutine_threadsafe(daemon.stop(), loop).result(10)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(5)
+        assert not os.path.exists(socket_path)
+
+        import socket
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(socket_path)
+        stale.close()  # left behind as if the daemon had crashed
+        loop = asyncio.new_event_loop()
+        daemon = TaskDaemon(test_file, reminders=False, save_delay=0)
+        loop.run_until_complete(daemon.start(socket_path))
+        loop.run_until_complete(daemon.stop())
+        loop.close()
+        print("  ✓ A stale socket is replaced")
+        print("✅ Daemon tests passed!")
+
+    except Exception as e:
+        print(f"❌ Daemon test failed: {e}")
+        raise
+    finally:
+        if 'tmp' in locals():
+            import shutil
+            shutil.rmtree(tmp, ignore_errors=True)
+
+def test_metrics():
+    """Test hot path instrumentation and snapshot export"""
+    print("\n📈 Testing metrics...")
+
+    try:
+        import time
+        from metrics import METRICS
+        from task_manager import TaskManager
+
+        tmp = tempfile.mkdtemp()
+        tm = TaskManager(os.path.join(tmp, "tasks.json"))
+        tm.add_task("Not measured")
+        assert METRICS.snapshot()['timers'] == []
+        print("  ✓ Nothing recorded while disabled")
+
+        path = os.path.join(tmp, "metrics.prom")
+        METRICS.start_exporter(path, interval=0.05)
+        tm.add_task("Measured", datetime.now() - timedelta(hours=1))
+        tm.get_overdue_tasks()
+        tm.search_tasks("measured")
+        time.sleep(0.2)
+        assert os.path.exists(path)
+        METRICS.stop_exporter()
+
+        timers = {(t['name'], tuple(t['labels'].values())): t for t in METRICS.snapshot()['timers']}
+        assert timers[('todo_storage_seconds', ('save',))]['count'] == 1
+        assert timers[('todo_storage_seconds', ('write',))]['count'] == 1
+        assert timers[('todo_query_seconds', ('get_overdue_tasks',))]['count'] == 1
+        print("  ✓ Storage and query timers recorded")
+
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        assert '# TYPE todo_query_seconds histogram' in text
+        assert 'todo_query_seconds_count{query="search_tasks"} 1' in text
+        assert 'todo_task_events_total{event="added"} 1' in text
+        print("  ✓ Prometheus snapshot written")
+
+        METRICS.write(os.path.join(tmp, "metrics.json"))
+        with open(os.path.join(tmp, "metrics.json"), 'r', encoding='utf-8') as f:
+            assert json.load(f)['counters']
+        print("  ✓ JSON snapshot written")
+
+        print("✅ Metrics tests passed!")
+
+    except Exception as e:
+        print(f"❌ Metrics test failed: {e}")
+        raise
+    finally:
+        from metrics import METRICS
+        METRICS.disable()
+        METRICS.reset()
+        if 'tmp' in locals():
+            import shutil
+            shutil.rmtree(tmp, ignore_errors=True)
+
+def test_profiling():
+    """Test per-thread profile captures and rotation"""
+    print("\n🔬 Testing profiler...")
+
+    try:
+        import threading
+        from profiling import Profiler
+        from task_manager import TaskManager
+
+        tmp = tempfile.mkdtemp()
+        tm = TaskManager(os.path.join(tmp, "tasks.json"))
+        with tm.batch():
+            for i in range(2000):
+                tm.add_task(f"Profiled task {i}")
+
+        def busy():
+            for _ in range(20):
+                tm.search_tasks("profiled")
+
+        captures = []
+        for _ in range(3):
+            profiler = Profiler(os.path.join(tmp, "profiles"), keep=2, sample_interval=0.001)
+            profiler.start()
+            worker = threading.Thread(target=profiler.wrap_thread('reminders', busy))
+            worker.start()
+            busy()
+            worker.join()
+            captures.append(profiler.stop())
+
+        files = sorted(os.listdir(captures[-1]))
+        assert 'MainThread.pstats' in files and 'reminders.pstats' in files, files
+        assert 'summary.txt' in files
+        print("  ✓ Main and reminder thread profiles written")
+
+        assert any(name.endswith('.collapsed') for name in files), files
+        print("  ✓ Collapsed stack samples written")
+
+        remaining = os.listdir(os.path.join(tmp, "profiles"))
+        assert len(remaining) == 2 and not os.path.exists(captures[0]), remaining
+        print("  ✓ Old captures rotated out")
+
+        print("✅ Profiler tests passed!")
+
+    except Exception as e:
+        print(f"❌ Profiler test failed: {e}")
+        raise
+    finally:
+        if 'tmp' in locals():
+            import shutil
+            shutil.rmtree(tmp, ignore_errors=True)
+
+def test_recurrence():
+    """Test recurrence rules and recurring tasks"""
+    print("\n🔁 Testing recurrence...")
+
+    try:
+        import io
+        import time
+        from clock import VirtualClock
+        from interchange import read_csv, read_ics, write_csv, write_ics
+        from recurrence import (from_rrule, make_rule, next_occurrence, occurrences,
+                                parse_repeat, to_rrule, with_start)
+        from task_manager import TaskManager
+
+        start = datetime(2025, 1, 6, 9, 0)  # a Monday
+        daily = with_start(make_rule('daily', until=start + timedelta(days=3650)), start)
+        began = time.perf_counter()
+        window = list(occurrences(daily, datetime(2034, 6, 1), datetime(2034, 6, 8)))
+        assert len(window) == 7 and window[0] == datetime(2034, 6, 1, 9, 0), window
+        assert time.perf_counter() - began < 0.01
+        print("  ✓ Ten year daily series expands only the requested window")
+
+        weekly = with_start(parse_repeat("every 2 weeks on mon, thu"), start)
+        assert list(occurrences(weekly, before=start + timedelta(days=17))) == [
+            start, start + timedelta(days=3), start + timedelta(days=14)]
+        monthly = with_start(make_rule('monthly', count=3), datetime(2025, 1, 31, 9, 0))
+        assert [when.day for when in occurrences(monthly)] == [31, 28, 31]
+        assert next_occurrence(monthly, datetime(2025, 3, 31, 9, 0)) is None
+        print("  ✓ Weekly days, month end clamping and count work")
+
+        assert from_rrule(to_rrule(weekly))['weekdays'] == [0, 3]
+        print("  ✓ RRULE round trip works")
+
+        tmp = tempfile.mkdtemp()
+        clock = VirtualClock(start - timedelta(days=1))
+        tm = TaskManager(os.path.join(tmp, "tasks.json"), clock=clock)
+        task_id = tm.add_task("Stand-up", start, recurrence=parse_repeat("weekdays"))
+        tm.add_task("One-off", start + timedelta(days=1, hours=1))
+        try:
+            tm.add_task("No due date", recurrence=parse_repeat("daily"))
+            assert False, "recurring task without due date accepted"
+        except ValueError:
+            pass
+
+        tm.mark_complete(task_id)
+        task = tm.get_task_by_id(task_id)
+        assert not task['completed'] and task['due_date'] == start + timedelta(days=1)
+        clock.advance(7 * 86400)  # missed a week: skip to the next future occurrence
+        tm.mark_complete(task_id)
+        assert tm.get_task_by_id(task_id)['due_date'] == datetime(2025, 1, 13, 9, 0)
+        assert len(TaskManager(tm.data_file).tasks) == 2
+        print("  ✓ Completing a recurring task advances its due date")
+
+        tm.update_task(task_id, due_date=start + timedelta(days=1))
+        upcoming = [(when, t['description']) for when, t in
+                    tm.get_occurrences(start, start + timedelta(days=3))]
+        assert upcoming == [(start + timedelta(days=1), "Stand-up"),
+                            (start + timedelta(days=1, hours=1), "One-off"),
+                            (start + timedelta(days=2), "Stand-up")], upcoming
+        print("  ✓ Occurrences of all tasks merge in time order")
+
+        for write, read in ((write_csv, read_csv), (write_ics, read_ics)):
+            buffer = io.StringIO()
+            write(tm.tasks, buffer)
+            buffer.seek(0)
+            copy = {t['id']: t for t in read(buffer)}[task_id]
+            assert copy['recurrence'] == tm.get_task_by_id(task_id)['recurrence'], copy
+        print("  ✓ Rules survive CSV and iCalendar round trips")
+
+        tm.update_task(task_id, recurrence={})
+        tm.mark_complete(task_id)
+        assert tm.get_task_by_id(task_id)['completed']
+        print("  ✓ Removing the rule makes the task complete normally")
+
+        print("✅ Recurrence tests passed!")
+
+    except Exception as e:
+        print(f"❌ Recurrence test failed: {e}")
+        raise
+    finally:
+        if 'tmp' in locals():
+            import shutil
+            shutil.rmtree(tmp, ignore_errors=True)
+
+def test_dependencies():
+    """Test subtasks, blockers and the actionable set"""
+    print("\n🧩 Testing dependencies...")
+
+    try:
+        import random
+        from task_manager import TaskManager
+
+        tmp = tempfile.mkdtemp()
+        tm = TaskManager(os.path.join(tmp, "tasks.json"))
+        report = tm.add_task("Write report")
+        data = tm.add_task("Collect data")
+        outline = tm.add_task("Outline", parent_id=report)
+        assert tm.add_dependency(report, data)
+        actionable = {task['id'] for task in tm.get_actionable_tasks()}
+        assert actionable == {data, outline}, actionable
+        assert [task['id'] for task in tm.get_subtasks(report)] == [outline]
+        print("  ✓ Blockers and subtasks hold back their dependents")
+
+        for blocker, dependent in ((report, data), (report, outline)):
+            try:
+                tm.add_dependency(dependent, blocker)
+                assert False, "cycle accepted"
+            except ValueError:
+                pass
+        try:
+            tm.set_parent(report, outline)
+            assert False, "subtask made its own parent"
+        except ValueError:
+            pass
+        print("  ✓ Cycles are rejected")
+
+        tm.mark_complete(data)
+        assert not tm.dependencies.is_actionable(report)
+        tm.mark_complete(outline)
+        assert tm.dependencies.is_actionable(report)
+        tm.mark_incomplete(outline)
+        assert not tm.dependencies.is_actionable(report)
+        tm.delete_task(outline)
+        assert tm.dependencies.is_actionable(report)
+        print("  ✓ Completing, reopening and deleting update dependents")
+
+        # Random changes must leave the counters equal to a full recomputation
+        rng = random.Random(7)
+        ids = [tm.add_task(f"Task {i}") for i in range(60)]
+        for _ in range(400):
+            a, b = rng.sample(ids, 2)
+            action = rng.random()
+            try:
+                if action < 0.4:
+                    tm.add_dependency(a, b)
+                elif action < 0.55:
+                    tm.set_parent(a, b if rng.random() < 0.8 else None)
+                elif action < 0.65:
+                    tm.remove_dependency(a, b)
+                elif action < 0.9:
+                    (tm.mark_complete if rng.random() < 0.6 else tm.mark_incomplete)(a)
+                else:
+                    tm.delete_task(a)
+                    ids.remove(a)
+                    ids.append(tm.add_task("Replacement"))
+            except ValueError:
+                pass
+
+        def expected(manager):
+            by_id = {task['id']: task for task in manager.tasks}
+            waits = {task['id']: set(task.get('blocked_by') or []) for task in manager.tasks}
+            for task in manager.tasks:
+                if task.get('parent_id') in waits:
+                    waits[task['parent_id']].add(task['id'])
+            return {task_id for task_id, blockers in waits.items()
+                    if not by_id[task_id]['completed']
+                    and all(b not in by_id or by_id[b]['completed'] for b in blockers)}
+
+        assert set(tm.dependencies.actionable_ids()) == expected(tm)
+        reloaded = TaskManager(tm.data_file)
+        assert set(reloaded.dependencies.actionable_ids()) == expected(tm)
+        print("  ✓ Incremental state matches a full recomputation and survives reload")
+
+        order = tm.dependencies.topological_order()
+        position = {task_id: i for i, task_id in enumerate(order)}
+        for task_id in order:
+            for dependent in tm.dependencies.dependents(task_id):
+                if dependent in position:
+                    assert position[task_id] < position[dependent]
+        print("  ✓ Topological order puts blockers first")
+
+        print("✅ Dependency tests passed!")
+
+    except Exception as e:
+        print(f"❌ Dependency test failed: {e}")
+        raise
+    finally:
+        if 'tmp' in locals():
+            import shutil
+            shutil.rmtree(tmp, ignore_errors=True)
+
+def test_ranking():
+    """Test next_tasks ranking"""
+    print("\n🏁 Testing next task ranking...")
+
+    try:
+        import random
+        from clock import VirtualClock
+        from task_manager import TaskManager
+
+        tmp = tempfile.mkdtemp()
+        now = datetime(2025, 3, 3, 9, 0)
+        clock = VirtualClock(now)
+        tm = TaskManager(os.path.join(tmp, "tasks.json"), clock=clock)
+        rng = random.Random(3)
+        with tm.batch():
+            for i in range(3000):
+                clock.set(now - timedelta(hours=rng.uniform(0, 1000)))
+                due = now + timedelta(hours=rng.uniform(-100, 400)) if rng.random() < 0.7 else None
+                tm.add_task(f"Task {i}", due, rng.choice(["High", "Medium", "Low"]))
+        clock.set(now)
+
+        def brute_force(k):
+            pending = [task for task in tm.tasks if not task['completed']]
+            ranked = sorted(pending, key=tm.ranker.score, reverse=True)
+            return [round(tm.ranker.score(task), 6) for task in ranked[:k]]
+
+        def ranked(k):
+            return [round(tm.ranker.score(task), 6) for task in tm.next_tasks(k, actionable_only=False)]
+
+        assert ranked(10) == brute_force(10)
+        print("  ✓ Top k matches a full sort")
+
+        with tm.batch():
+            for _ in range(2000):
+                task = rng.choice(tm.tasks)
+                if rng.random() < 0.3:
+                    tm.mark_complete(task['id'])
+                else:
+                    tm.update_task(task['id'], priority=rng.choice(["High", "Medium", "Low"]))
+        assert ranked(10) == brute_force(10)
+        clock.advance(timedelta(days=20))
+        assert ranked(10) == brute_force(10)
+
+        top = tm.next_tasks(5, actionable_only=False)
+        assert not any(task['completed'] for task in top)
+        tm.mark_complete(top[0]['id'])
+        assert top[0]['id'] not in [task['id'] for task in tm.next_tasks(5, actionable_only=False)]
+        last = tm.next_tasks(50, actionable_only=False)[-1]['id']
+        tm.update_task(last, priority="High", due_date=now - timedelta(days=365))
+        assert ranked(50) == brute_force(50)
+        assert tm.next_tasks(1, actionable_only=False)[0]['id'] == last
+        tm.update_task(last, priority="Low", due_date=now + timedelta(days=3650))
+        assert last not in [task['id'] for task in tm.next_tasks(50, actionable_only=False)]
+        assert ranked(50) == brute_force(50)
+        print("  ✓ Stays correct after edits and completions, and as time passes")
+
+        tm.ranker.set_weights(priority=0.0, age=0.0)
+        top = tm.next_tasks(1, actionable_only=False)[0]
+        assert top['due_date'] == min(task['due_date'] for task in tm.tasks
+                                      if task['due_date'] and not task['completed'])
+        print("  ✓ Weights are configurable")
+
+        blocker = tm.add_task("Blocker", now - timedelta(days=365), "Low")
+        blocked = tm.add_task("Blocked", now - timedelta(days=400), "High")
+        tm.add_dependency(blocked, blocker)
+        ids = [task['id'] for task in tm.next_tasks(2)]
+        assert ids[0] == blocker and blocked not in ids, ids
+        print("  ✓ Blocked tasks are skipped")
+
+        print("✅ Ranking tests passed!")
+
+    except Exception as e:
+        print(f"❌ Ranking test failed: {e}")
+        raise
+    finally:
+        if 'tmp' in locals():
+            import shutil
+            shutil.rmtree(tmp, ignore_errors=True)
+
+def test_nl_parser():
+    """Test natural language quick add"""
+    print("\n💬 Testing quick add parser...")
+
+    try:
+        import time
+        from nl_parser import _parse, parse
+
+        now = datetime(2025, 9, 10, 14, 7)  # a Wednesday afternoon
+        cases = [
+            ("pay rent every 1st at 9am !high",
+             ("pay rent", datetime(2025, 10, 1, 9, 0), "High", 'monthly')),
+            ("call Sam tomorrow 5pm", ("call Sam", datetime(2025, 9, 11, 17, 0), None, None)),
+            ("in 2 hours", ("", datetime(2025, 9, 10, 16, 7), None, None)),
+            ("stand-up every weekday at 9:30",
+             ("stand-up", datetime(2025, 9, 11, 9, 30), None, 'weekly')),
+            ("dentist on sep 15th at 10:30", ("dentist", datetime(2025, 9, 15, 10, 30), None, None)),
+            ("report due friday !l", ("report", datetime(2025, 9, 12, 9, 0), "Low", None)),
+            ("book sat exam", ("book sat exam", None, None, None)),
+            ("pay taxes on 2025-02-30", ("pay taxes on 2025-02-30", None, None, None)),
+        ]
+        for text, (description, due, priority, freq) in cases:
+            result = parse(text, now)
+            assert (result['description'], result['due_date'], result['priority']) == \
+                (description, due, priority), (text, result)
+            assert (result['recurrence'] or {}).get('freq') == freq, (text, result)
+        assert parse("water plants every mon and thu", now)['recurrence']['weekdays'] == [0, 3]
+        print("  ✓ Dates, times, repeats and priorities are extracted")
+
+        _parse.cache_clear()
+        texts = [f"call client {i} next friday at 4:30pm every 2 weeks !high" for i in range(500)]
+        started = time.perf_counter()
+        for text in texts:
+            parse(text, now)
+        cold = (time.perf_counter() - started) / len(texts)
+        assert cold < 0.001, cold
+        started = time.perf_counter()
+        for text in texts:
+            parse(text, now)
+        warm = (time.perf_counter() - started) / len(texts)
+        assert warm < cold, (warm, cold)
+        print(f"  ✓ Parses in {cold * 1e6:.0f}µs, {warm * 1e6:.1f}µs when cached")
+
+        result = parse("call Sam tomorrow 5pm", now)
+        result['due_date'] = None
+        assert parse("call Sam tomorrow 5pm", now)['due_date'] is not None
+        print("  ✓ Cached results are not shared with callers")
+
+        print("✅ Quick add parser tests passed!")
+
+    except Exception as e:
+        print(f"❌ Quick add parser test failed: {e}")
+        raise
+
+def test_dedupe():
+    """Test near duplicate detection"""
+    print("\n👯 Testing near duplicate detection...")
+
+    try:
+        import random
+        import time
+        from dedupe import jaccard, shingles
+        from task_manager import TaskManager
+
+        tmp = tempfile.mkdtemp()
+        tm = TaskManager(os.path.join(tmp, "tasks.json"))
+        original = tm.add_task("Send the quarterly budget report to finance")
+        copy = tm.add_task("send quarterly budget report to Finance!", flag_duplicates=True)
+        other = tm.add_task("Book a dentist appointment", flag_duplicates=True)
+        assert tm.get_task_by_id(copy)['duplicate_of'] == original
+        assert 'duplicate_of' not in tm.get_task_by_id(other)
+        print("  ✓ Similar descriptions are flagged, different ones are not")
+
+        tm.update_task(other, description="Send the quarterly budget report to finance.")
+        assert tm.duplicates.report() == [sorted([original, copy, other])]
+        tm.mark_complete(original)
+        tm.delete_task(copy)
+        assert tm.duplicates.report() == []
+        assert tm.duplicates.report(include_completed=True) == [sorted([original, other])]
+        print("  ✓ Index follows edits, completions and deletions")
+
+        rng = random.Random(5)
+        words = ("call email plan review draft budget client meeting invoice "
+                 "slides report team notes order book fix").split()
+
+        def lookup_seconds():
+            probes = [" ".join(rng.choice(words) for _ in range(5)) for _ in range(200)]
+            started = time.perf_counter()
+            for probe in probes:
+                tm.duplicates.find_duplicates(probe)
+            return (time.perf_counter() - started) / len(probes)
+
+        def grow(size):
+            with tm.batch():
+                while len(tm.tasks) < size:
+                    tm.add_task(" ".join(rng.choice(words) for _ in range(5)) +
+                                f" {rng.randrange(10 ** 6)}")
+
+        grow(1000)
+        small = lookup_seconds()
+        grow(20000)
+        large = lookup_seconds()
+        assert large < 4 * small + 0.0005, (small, large)
+        print(f"  ✓ Lookups take {small * 1e6:.0f}µs at 1k tasks, {large * 1e6:.0f}µs at 20k")
+
+        # Whatever LSH finds must really be similar
+        for similarity, task_id in tm.duplicates.find_duplicates("plan budget review call team"):
+            description = tm.get_task_by_id(task_id)['description']
+            assert similarity == jaccard(shingles("plan budget review call team"), shingles(description))
+            assert similarity >= tm.duplicates.threshold
+
+        tasks = [{'id': f"imported-{i}", 'description': "Renew the car insurance policy"}
+                 for i in range(3)]
+        counts = tm.import_tasks(tasks, flag_duplicates=True)
+        assert counts['added'] == 3
+        assert 'duplicate_of' not in tm.get_task_by_id("imported-0")
+        assert tm.get_task_by_id("imported-2")['duplicate_of'] in ("imported-0", "imported-1")
+        print("  ✓ Imports flag duplicates within the imported tasks")
+
+        print("✅ Near duplicate tests passed!")
+
+    except Exception as e:
+        print(f"❌ Near duplicate test failed: {e}")
+        raise
+    finally:
+        if 'tmp' in locals():
+            import shutil
+            shutil.rmtree(tmp, ignore_errors=True)
+
+def test_similarity():
+    """Test related tasks and themes"""
+    print("\n🧭 Testing related tasks and themes...")
+
+    try:
+        import math
+        import random
+        from similarity import dot
+        from task_manager import TaskManager
+
+        tmp = tempfile.mkdtemp()
+        tm = TaskManager(os.path.join(tmp, "tasks.json"))
+        rng = random.Random(11)
+        topics = [("invoice", "client", "payment", "send"), ("slides", "meeting", "agenda", "prepare"),
+                  ("garden", "water", "plants", "mow"), ("car", "insurance", "renew", "service")]
+        with tm.batch():
+            for i in range(2000):
+                topic = rng.choice(topics)
+                tm.add_task(" ".join(rng.sample(topic, 3)) + f" {rng.choice(['today', 'soon', 'later'])} {i}")
+
+        index = tm.similarity
+        task = tm.tasks[0]
+        related = tm.get_related_tasks(task['id'], 5)
+        words = set(task['description'].split()[:3])
+        assert len(related) == 5 and all(len(words & set(other['description'].split())) >= 2
+                                         for other in related)
+        scores = [score for score, _ in index.related(task['id'], 5)]
+        vector = index._vectors[task['id']]
+        everything = sorted((dot(vector, other) for other_id, other in index._vectors.items()
+                             if other_id != task['id']), reverse=True)
+        assert all(math.isclose(a, b) for a, b in zip(scores, everything[:5])), (scores, everything[:5])
+        print("  ✓ Related tasks match a full cosine scan")
+
+        fits = index.fits
+        with tm.batch():
+            for i in range(2000):
+                target = rng.choice(tm.tasks)
+                if rng.random() < 0.2:
+                    tm.delete_task(target['id'])
+                else:
+                    tm.update_task(target['id'], description=" ".join(rng.sample(rng.choice(topics), 3)))
+        refits = index.fits - fits
+        assert 1 <= refits <= 10, refits
+        document_frequency = dict(index._df)
+        index._refit()
+        incremental = dict(index._vectors)
+        index.rebuild()
+        assert document_frequency == dict(index._df)
+        assert incremental.keys() == index._vectors.keys()
+        assert all(math.isclose(dot(incremental[task_id], vector), 1.0)
+                   for task_id, vector in index._vectors.items() if vector)
+        print(f"  ✓ Edits update vectors in place, {refits} refits for 2000 changes")
+
+        themes = tm.get_task_themes(4)
+        assert len(themes) == 4
+        for theme in themes:
+            topic = next(topic for topic in topics if theme['terms'][0] in topic)
+            assert set(theme['terms']) <= set(topic), theme['terms']
+            assert all(set(topic) & set(task['description'].split()) for task in theme['tasks'])
+        assert tm.get_task_themes(4)[0]['terms'] == themes[0]['terms']
+        first = themes[0]['tasks'][0]['id']
+        tm.mark_complete(first)
+        assert first not in [task['id'] for theme in tm.get_task_themes(4) for task in theme['tasks']]
+        print("  ✓ Themes group pending tasks by topic")
+
+        print("✅ Similarity tests passed!")
+
+    except Exception as e:
+        print(f"❌ Similarity test failed: {e}")
+        raise
+    finally:
+        if 'tmp' in locals():
+            import shutil
+            shutil.rmtree(tmp, ignore_errors=True)
+
+def test_planner():
+    """Test planning tasks into working hours"""
+    print("\n🗓️  Testing planner...")
+
+    try:
+        import random
+        from clock import VirtualClock
+        from planner import BusyCalendar
+        from task_manager import TaskManager
+
+        busy = BusyCalendar()
+        busy.add(datetime(2025, 3, 3, 10), datetime(2025, 3, 3, 11))
+        busy.add(datetime(2025, 3, 3, 12), datetime(2025, 3, 3, 13))
+        busy.add(datetime(2025, 3, 3, 10, 30), datetime(2025, 3, 3, 12))
+        assert list(busy) == [(datetime(2025, 3, 3, 10), datetime(2025, 3, 3, 13))]
+        busy.remove(datetime(2025, 3, 3, 11), datetime(2025, 3, 3, 11, 30))
+        assert len(busy) == 2
+        assert busy.overlapping(datetime(2025, 3, 3, 11), datetime(2025, 3, 3, 11, 30)) == []
+        print("  ✓ Busy blocks merge and split")
+
+        tmp = tempfile.mkdtemp()
+        now = datetime(2025, 3, 3, 8, 0)  # a Monday
+        clock = VirtualClock(now)
+        tm = TaskManager(os.path.join(tmp, "tasks.json"), clock=clock)
+        rng = random.Random(7)
+        with tm.batch():
+            for i in range(10000):
+                due = now + timedelta(days=rng.uniform(0, 120)) if rng.random() < 0.8 else None
+                tm.add_task(f"Task {i}", due, rng.choice(["High", "Medium", "Low"]),
+                            estimate=rng.choice([5, 10, 15, 20]))
+        for day in range(0, 60, 2):
+            start = now + timedelta(days=day, hours=4)
+            tm.planner.add_busy(start, start + timedelta(hours=1))
+
+        planner = tm.planner
+        planner.rebuild()
+        plan = planner.plan()
+        assert len(plan) == 10000, len(plan)
+        print(f"  ✓ Plans 10000 tasks over {(plan[-1]['end'] - now).days} days")
+
+        def check(plan):
+            blocks = [block for entry in plan for block in entry['blocks']]
+            for start, end in blocks:
+                assert start.weekday() < 5 and start.hour >= 9 and (end.hour, end.minute) <= (17, 0)
+                assert not tm.planner.busy.overlapping(start, end)
+            assert all(first[1] <= second[0] for first, second in zip(blocks, blocks[1:]))
+            for entry in plan:
+                task = tm.get_task_by_id(entry['task_id'])
+                minutes = sum((end - start).total_seconds() / 60 for start, end in entry['blocks'])
+                assert minutes == task['estimate'], (minutes, task)
+            dues = [tm.get_task_by_id(entry['task_id'])['due_date'] or datetime.max for entry in plan]
+            assert dues == sorted(dues)
+
+        check(plan)
+        print("  ✓ Tasks fill working hours around busy blocks, earliest deadline first")
+
+        ids = [task['id'] for task in tm.tasks]
+        with tm.batch():
+            for _ in range(200):
+                task_id = rng.choice(ids)
+                change = rng.random()
+                if change < 0.4:
+                    tm.update_task(task_id, estimate=rng.choice([5, 60, 120]))
+                elif change < 0.8:
+                    tm.update_task(task_id, due_date=now + timedelta(days=rng.uniform(0, 120)))
+                else:
+                    tm.mark_complete(task_id)
+                planner.plan(until=now + timedelta(days=7))
+        incremental = planner.plan()
+        check(incremental)
+        planner.rebuild()
+        assert planner.plan() == incremental
+        print("  ✓ Replanning after each change matches a plan from scratch")
+
+        late_id = tm.add_task("Too big", now + timedelta(minutes=1), "High", estimate=600)
+        assert late_id in planner.late_tasks()
+        assert planner.scheduled(late_id)['late']
+        assert planner.scheduled(late_id)['start'] == datetime(2025, 3, 3, 9, 0)
+        print("  ✓ Tasks that cannot be finished in time are reported late")
+
+        signature = planner.signature()
+        clock.advance(timedelta(minutes=30))
+        tm.update_task(late_id, description="Still too big")
+        assert planner.signature() == signature
+        clock.set(datetime(2025, 3, 3, 9, 1))
+        assert planner.signature() != signature
+        signature = planner.signature()
+        tm.update_task(late_id, estimate=30)
+        assert planner.signature() != signature
+        print("  ✓ The plan signature only changes when planned times can move")
+
+        print("✅ Planner tests passed!")
+
+    except Exception as e:
+        print(f"❌ Planner test failed: {e}")
+        raise
+    finally:
+        if 'tmp' in locals():
+            import shutil
+            shutil.rmtree(tmp, ignore_errors=True)
+
+def test_tags():
+    """Test tags and bitmap queries"""
+    print("\n🏷️  Testing tags...")
+
+    try:
+        import random
+        from nl_parser import parse
+        from tags import parse_query
+        from task_index import TaskIndex
+        from task_manager import TaskManager
+
+        for bad in ("", "tag:work AND", "(tag:work", "tag:work )", "OR pending", "colour:red", "#a b"):
+            try:
+                parse_query(bad)
+                assert False, f"{bad!r} should not parse"
+            except ValueError:
+                pass
+        print("  ✓ Malformed queries are rejected")
+
+        tmp = tempfile.mkdtemp()
+        tm = TaskManager(os.path.join(tmp, "tasks.json"))
+        rng = random.Random(5)
+        names = ["work", "home", "urgent", "errands", "someday"]
+        with tm.batch():
+            for i in range(3000):
+                tm.add_task(f"Task {i}", priority=rng.choice(["High", "Medium", "Low"]),
+                            tags=rng.sample(names, rng.randint(0, 3)))
+        index = TaskIndex(tm)
+
+        queries = {
+            "tag:work AND tag:urgent AND NOT completed":
+                lambda t: {'work', 'urgent'} <= set(t.get('tags', ())) and not t['completed'],
+            "(#home OR #errands) priority:high":
+                lambda t: bool({'home', 'errands'} & set(t.get('tags', ()))) and t['priority'] == "High",
+            "NOT (tag:work OR completed)":
+                lambda t: 'work' not in t.get('tags', ()) and not t['completed'],
+            "all": lambda t: True,
+        }
+
+        def check():
+            for query, matches in queries.items():
+                expected = {task['id'] for task in tm.tasks if matches(task)}
+                assert {task['id'] for task in tm.query_tasks(query)} == expected, query
+                assert tm.tag_index.count(query) == len(expected), query
+            for tag, count in tm.get_tag_counts().items():
+                assert count == sum(tag in task.get('tags', ()) for task in tm.tasks)
+            assert set(index.query(tags=["work", "home"])) == \
+                {task['id'] for task in tm.tasks if {'work', 'home'} <= set(task.get('tags', ()))}
+
+        tm.query_tasks("all")
+        check()
+        with tm.batch():
+            for _ in range(1000):
+                task_id = rng.choice(tm.tasks)['id']
+                change = rng.random()
+                if change < 0.3:
+                    tm.update_task(task_id, tags=rng.sample(names, rng.randint(0, 2)))
+                elif change < 0.5:
+                    tm.mark_complete(task_id)
+                elif change < 0.7:
+                    tm.delete_task(task_id)
+                else:
+                    tm.add_task("New task", tags=[rng.choice(names)])
+        check()
+        print("  ✓ Queries match a scan after updates, deletes and added tasks")
+
+        task_id = tm.add_task("Email Ana", tags=["#Work", "work", "Urgent"])
+        assert tm.get_task_by_id(task_id)['tags'] == ["urgent", "work"]
+        tm.update_task(task_id, tags=[])
+        assert 'tags' not in tm.get_task_by_id(task_id)
+        quick = parse("email Ana #work #urgent tomorrow")
+        assert quick['description'] == "email Ana" and quick['tags'] == ["urgent", "work"]
+        print("  ✓ Tags are normalized, removed and typed as #words")
+
+        big = TaskManager(os.path.join(tmp, "big.json"))
+        big.import_tasks({'id': str(i), 'description': "", 'tags': rng.sample(names, 2)}
+                         for i in range(20000))
+        count = big.tag_index.count("tag:work AND tag:urgent AND NOT completed")
+        assert count == sum({'work', 'urgent'} <= set(task['tags']) for task in big.tasks), count
+        print("  ✓ Counts a 3 term query over 20000 tasks")
+
+        print("✅ Tags tests passed!")
+
+    except Exception as e:
+        print(f"❌ Tags test failed: {e}")
+        raise
+    finally:
+        if 'tmp' in locals():
+            import shutil
+            shutil.rmtree(tmp, ignore_errors=True)
+
+def test_rules():
+    """Test the compiled rule engine"""
+    print("\n📐 Testing rules...")
+
+    try:
+        import random
+        from clock import VirtualClock
+        from rules import KeywordMatcher, RuleEngine, check_rule
+        from task_manager import TaskManager
+
+        rng = random.Random(11)
+        matcher = KeywordMatcher(["he", "she", "his", "hers", "Invoice", "voice"])
+        assert {matcher.keywords[i] for i in matcher.find("Ushers send INVOICES")} == \
+            {"he", "she", "hers", "invoice", "voice"}
+        for _ in range(200):
+            keywords = ["".join(rng.choice("abc") for _ in range(rng.randint(1, 4))) for _ in range(8)]
+            text = "".join(rng.choice("abcd") for _ in range(30))
+            matcher = KeywordMatcher(keywords)
+            assert {matcher.keywords[i] for i in matcher.find(text)} == \
+                {word for word in keywords if word in text}, (keywords, text)
+        print("  ✓ Aho-Corasick finds every keyword, overlapping ones included")
+
+        for bad in ({'when': {}, 'then': {'priority': "High"}},
+                    {'when': {'contains': "x"}, 'then': {'priority': "Urgent"}},
+                    {'when': {'due_within': -5}, 'then': {'tags': ["x"]}},
+                    {'when': {'colour': "red"}, 'then': {'tags': ["x"]}},
+                    {'when': ["contains"], 'then': {'tags': ["x"]}},
+                    {'when': {'contains': 5}, 'then': {'tags': ["x"]}},
+                    {'when': {'tags': [["x"]]}, 'then': {'priority': "High"}},
+                    {'when': {'contains': "x"}, 'then': {'priority': ["High"]}},
+                    "not a rule"):
+            try:
+                check_rule(bad)
+                assert False, f"{bad} should be rejected"
+            except ValueError:
+                pass
+        try:
+            RuleEngine(None, {'when': {'contains': "x"}, 'then': {'tags': ["x"]}})
+            assert False, "a single rule object should be rejected"
+        except ValueError:
+            pass
+        print("  ✓ Invalid rules are rejected")
+
+        tmp = tempfile.mkdtemp()
+        now = datetime(2025, 3, 3, 9, 0)
+        clock = VirtualClock(now)
+        tm = TaskManager(os.path.join(tmp, "tasks.json"), clock=clock)
+        words = [f"word{i}" for i in range(400)]
+        with tm.batch():
+            for i in range(5000):
+                due = now + timedelta(hours=rng.uniform(-24, 24 * 14)) if rng.random() < 0.7 else None
+                tm.add_task(" ".join(rng.sample(words, 5)), due, rng.choice(["High", "Medium", "Low"]),
+                            tags=rng.sample(["work", "home"], rng.randint(0, 1)))
+        rules = []
+        for i in range(300):
+            when = {'contains': rng.sample(words, 2)}
+            if rng.random() < 0.3:
+                when['priority'] = rng.choice(["Medium", "Low"])
+            if rng.random() < 0.2:
+                when['due_within'] = rng.choice([60, 1440, 4320])
+            if rng.random() < 0.1:
+                when['tags'] = "work"
+            rules.append({'name': f"rule {i}", 'when': when, 'then': {'tags': [f"r{i}"]}})
+        rules.append({'name': "soon", 'when': {'due_within': 1440, 'priority': "Low"},
+                      'then': {'priority': "Medium"}})
+
+        def naive(task, at):
+            expected = set()
+            if task['completed']:
+                return expected
+            for i, rule in enumerate(rules[:-1]):
+                when = rule['when']
+                if not any(word in task['description'] for word in when['contains']):
+                    continue
+                if 'priority' in when and task['priority'] != when['priority']:
+                    continue
+                if 'tags' in when and "work" not in task.get('tags', ()):
+                    continue
+                if 'due_within' in when and not (task['due_date'] and
+                                                 task['due_date'] <= at + timedelta(minutes=when['due_within'])):
+                    continue
+                expected.add(f"r{i}")
+            return expected
+
+        snapshot = [task.copy() for task in tm.tasks]
+        expected = [naive(task, now) for task in snapshot]
+        assert tm.set_rules(rules) > 0
+        for before, wanted in zip(snapshot, expected):
+            after = tm._by_id[before['id']]
+            assert set(after.get('tags', ())) - set(before.get('tags', ())) - {"work", "home"} == wanted
+        print("  ✓ 301 rules over 5000 tasks match trying one rule at a time")
+
+        task_id = tm.add_task("word7 word8 low task", now + timedelta(hours=30), "Low")
+        assert tm.get_task_by_id(task_id)['priority'] == "Low"
+        seen = []
+        tm.add_listener(lambda event, task: seen.append((event, task['priority'])) if task else None)
+        clock.advance(timedelta(hours=7))
+        assert tm.check_rules() >= 1
+        assert tm.get_task_by_id(task_id)['priority'] == "Medium" and ('updated', "Medium") in seen
+        assert tm.check_rules() == 0
+        print("  ✓ Tasks coming due are re-checked without a full pass")
+
+        seen.clear()
+        plain = next(i for i, rule in enumerate(rules) if list(rule['when']) == ['contains'])
+        first = rules[plain]['when']['contains'][0]
+        task_id = tm.add_task(f"Pay the {first.upper()} bill")
+        assert f"r{plain}" in tm.get_task_by_id(task_id)['tags']
+        assert [event for event, _ in seen] == ["added"], seen
+        tm.update_task(task_id, tags=[])
+        assert f"r{plain}" in tm.get_task_by_id(task_id)['tags']
+        reloaded = TaskManager(tm.data_file)
+        assert f"r{plain}" in reloaded.get_task_by_id(task_id)['tags']
+        print("  ✓ Rules apply to each change before listeners see it, and are saved")
+
+        writes = []
+        tm.save_handler = lambda: writes.append(1)
+        tm.add_task(f"Invoice {first}")
+        assert len(writes) == 1
+        plain_rules = [rules[plain]]
+        other = TaskManager(os.path.join(tmp, "other.json"))
+        other_id = other.add_task(f"Call about {first}")
+        other.save_handler = lambda: writes.append(1)
+        other.set_rules(plain_rules)
+        seen.clear()
+        other.add_listener(lambda event, task: seen.append((event, task and task['id'])))
+        writes.clear()
+        other.load_tasks()
+        assert f"r{plain}" in other.get_task_by_id(other_id)['tags']
+        assert seen == [('loaded', None), ('updated', other_id)] and not writes, (seen, writes)
+        print("  ✓ A change is saved once, and loading announces rule changes without saving")
+
+        tm.set_rules(None)
+        task_id = tm.add_task(f"Another {first}")
+        assert 'tags' not in tm.get_task_by_id(task_id)
+
+        print("✅ Rules tests passed!")
+
+    except Exception as e:
+        print(f"❌ Rules test failed: {e}")
+        raise
+    finally:
+        if 'tmp' in locals():
+            import shutil
+            shutil.rmtree(tmp, ignore_errors=True)
+
+def test_history():
+    """Test task version history and time travel queries"""
+    print("\n🕰️  Testing history...")
+
+    try:
+        import json
+        import random
+        from clock import VirtualClock
+        from history import KEYFRAME_INTERVAL
+        from task_manager import TaskManager, task_to_json
+
+        tmp = tempfile.mkdtemp()
+        data_file = os.path.join(tmp, "tasks.json")
+        start = datetime(2025, 3, 3, 9, 0)
+        clock = VirtualClock(start)
+        tm = TaskManager(data_file, clock=clock)
+        tm.history
+        rng = random.Random(3)
+
+        # Snapshots of the whole list taken along the way are the truth
+        snapshots = []
+        ids = []
+        with tm.batch():
+            for step in range(3000):
+                clock.advance(timedelta(minutes=rng.randint(1, 30)))
+                change = rng.random()
+                if change < 0.15 or not ids:
+                    ids.append(tm.add_task(f"Task {step}", priority=rng.choice(["High", "Low"])))
+                elif change < 0.75:
+                    tm.update_task(rng.choice(ids), description=f"Edited {step}",
+                                   tags=rng.sample(["work", "home"], rng.randint(0, 2)))
+                elif change < 0.85:
+                    tm.mark_complete(rng.choice(ids))
+                elif change < 0.9:
+                    tm.mark_incomplete(rng.choice(ids))
+                else:
+                    task_id = ids.pop(rng.randrange(len(ids)))
+                    tm.delete_task(task_id)
+                if step % 100 == 0:
+                    snapshots.append((clock.now(), sorted((task_to_json(task) for task in tm.tasks),
+                                                          key=lambda task: task['id'])))
+
+        def check(manager):
+            for when, expected in snapshots:
+                found = sorted((task_to_json(task) for task in manager.get_tasks_as_of(when)),
+                               key=lambda task: task['id'])
+                assert found == expected, when
+            assert manager.get_tasks_as_of(start - timedelta(days=1)) == []
+
+        check(tm)
+        print(f"  ✓ The list as of {len(snapshots)} past times matches snapshots taken then")
+
+        reloaded = TaskManager(data_file, clock=clock)
+        check(reloaded)
+        print("  ✓ History is read back from its file")
+
+        task_id = ids[0]
+        versions = reloaded.get_task_versions(task_id)
+        assert 'task' in versions[0] and all('changes' in version for version in versions[1:])
+        before = clock.now()
+        with open(data_file, encoding='utf-8') as file:
+            stored = json.load(file)
+        next(task for task in stored if task['id'] == task_id)['description'] = "Edited by hand"
+        with open(data_file, 'w', encoding='utf-8') as file:
+            json.dump(stored, file)
+        clock.advance(timedelta(hours=1))
+        reloaded.history
+        reloaded.load_tasks()
+        assert reloaded.get_task_versions(task_id)[-1]['changes'] == {'description': "Edited by hand"}
+        assert reloaded.get_task_as_of(task_id, before)['description'] != "Edited by hand"
+        print("  ✓ Changes made outside the app are recorded on reload")
+
+        # Versions go to the file with the tasks, and the file is read on the first query
+        history_file = reloaded.history.path
+        size = os.path.getsize(history_file)
+        deferred = TaskManager(data_file, clock=clock)
+        deferred.save_handler = lambda: None
+        deferred.history
+        clock.advance(timedelta(hours=1))
+        deferred.update_task(task_id, description="Edited again")
+        assert os.path.getsize(history_file) == size
+        deferred.write_tasks()
+        assert os.path.getsize(history_file) > size
+        assert deferred.get_task_as_of(task_id, before)['description'] != "Edited by hand"
+        assert deferred.get_task_versions(task_id)[-1]['changes'] == {'description': "Edited again"}
+        print("  ✓ History is written with the tasks and read on the first query")
+
+        # A long chain still needs at most KEYFRAME_INTERVAL versions per lookup
+        busy_id = tm.add_task("Busy task")
+        with tm.batch():
+            for step in range(5000):
+                clock.advance(timedelta(minutes=1))
+                tm.update_task(busy_id, description=f"Busy task {step}")
+        for step in range(0, 5000, 5):
+            when = clock.now() - timedelta(minutes=5000 - step - 1)
+            assert tm.get_task_as_of(busy_id, when)['description'] == f"Busy task {step}"
+        keyframes = sum('key' in version for version in tm.history._versions[busy_id])
+        assert keyframes >= 5000 // KEYFRAME_INTERVAL, keyframes
+        print("  ✓ Looks a task up in a 5000 version chain, with a keyframe every "
+              f"{KEYFRAME_INTERVAL} versions")
+
+        print("✅ History tests passed!")
+
+    except Exception as e:
+        print(f"❌ History test failed: {e}")
+        raise
+    finally:
+        if 'tmp' in locals():
+            import shutil
+            shutil.rmtree(tmp, ignore_errors=True)
+
 def test_imports():
     """Test all required imports"""
     print("\n📦 Testing imports...")
@@ -138,7 +1702,7 @@ def test_imports():
             print(f"  ✓ {module} ({description})")
         except ImportError:
             print(f"  ❌ {module} ({description}) - REQUIRED")
-            return False
+            raise
 
     # Test optional modules
     for module, description in optional_modules:
@@ -149,7 +1713,6 @@ def test_imports():
             print(f"  ⚠️  {module} ({description}) - OPTIONAL")
 
     print("✅ Import tests completed!")
-    return True
 
 def test_file_structure():
     """Test if all required files exist"""
@@ -173,10 +1736,9 @@ def test_file_structure():
 
     if missing_files:
         print(f"❌ Missing files: {missing_files}")
-        return False
+        raise FileNotFoundError(f"Missing files: {missing_files}")
 
     print("✅ File structure test passed!")
-    return True
 
 def main():
     """Run all tests"""
@@ -187,7 +1749,27 @@ def main():
         ("File Structure", test_file_structure),
         ("Imports", test_imports),
         ("TaskManager", test_task_manager),
-        ("ReminderSystem", test_reminder_system)
+        ("ReminderSystem", test_reminder_system),
+        ("Reminder Rules", test_reminder_rules),
+        ("UI Event Queue", test_ui_bridge),
+        ("Simulation", test_simulation),
+        ("Optimistic Store", test_optimistic_store),
+        ("Task Index", test_task_index),
+        ("Import/Export", test_interchange),
+        ("AsyncTaskManager", test_async_task_manager),
+        ("Daemon", test_daemon),
+        ("Metrics", test_metrics),
+        ("Profiler", test_profiling),
+        ("Recurrence", test_recurrence),
+        ("Dependencies", test_dependencies),
+        ("Ranking", test_ranking),
+        ("Quick Add", test_nl_parser),
+        ("Near Duplicates", test_dedupe),
+        ("Similarity", test_similarity),
+        ("Planner", test_planner),
+        ("Tags", test_tags),
+        ("Rules", test_rules),
+        ("History", test_history)
     ]
 
     passed = 0
@@ -195,10 +1777,8 @@ def main():
 
     for test_name, test_func in tests:
         try:
-            if test_func():
-                passed += 1
-            else:
-                failed += 1
+            test_func()
+            passed += 1
         except Exception as e:
             print(f"❌ {test_name} test crashed: {e}")
             failed += 1
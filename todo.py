@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+"""
+Headless command line interface for Personal To-Do List Assistant
+
+Only the storage layer is imported, so scripting against the task list
+does not pay for tkinter or the notification libraries.
+
+Usage:
+    python todo.py add "Write report" --due "2025-09-15 14:00" --priority High
+    python todo.py add "Stand-up" --due "2025-09-15 09:30" --repeat weekdays
+    python todo.py add "Draft slides" --parent 3f2a --blocked-by 9c1e
+    python todo.py block 3f2a 9c1e
+    python todo.py quick "pay rent every 1st at 9am !high"
+    python todo.py list --pending
+    python todo.py list --actionable
+    python todo.py add "Email Ana" --tag work --tag urgent
+    python todo.py list --query "tag:work AND tag:urgent AND NOT completed"
+    python todo.py tags
+    python todo.py rules rules.json --dry-run
+    python todo.py history 3f2a
+    python todo.py list --as-of "2025-09-01 18:00"
+    python todo.py next -k 3 --weight age=0.5
+    python todo.py add "Write report" --due "2025-09-15 14:00" --estimate 90
+    python todo.py plan --days 5 --busy "2025-09-15 10:00/11:30"
+    python todo.py related 3f2a
+    python todo.py themes -k 5
+    python todo.py dupes
+    python todo.py complete 3f2a
+    python todo.py search report
+    python todo.py stats
+    python todo.py export backup.json
+    python todo.py export tasks.ics
+    python todo.py import sample_tasks.json
+    python todo.py import big.jsonl --progress
+"""
+
+import argparse
+import sys
+from datetime import datetime
+from typing import List, Optional
+
+from task_manager import TaskManager
+
+DATE_FORMAT = "%Y-%m-%d %H:%M"
+PRIORITIES = ["High", "Medium", "Low"]
+# Same as interchange.FORMATS, which is only imported by export and import
+FORMATS = ['json', 'jsonl', 'csv', 'ics']
+
+def parse_due(value: str) -> datetime:
+    """argparse type for due dates"""
+    try:
+        return datetime.strptime(value, DATE_FORMAT)
+    except ValueError:
+        raise argparse.ArgumentTypeError("Invalid date format. Use YYYY-MM-DD HH:MM")
+
+def parse_busy(value: str) -> tuple:
+    """argparse type for busy blocks, START/END with END a full date or just a time"""
+    start, _, end = value.partition("/")
+    try:
+        start = datetime.strptime(start.strip(), DATE_FORMAT)
+        end = end.strip()
+        end = datetime.strptime(end, DATE_FORMAT) if " " in end else \
+            datetime.combine(start.date(), datetime.strptime(end, "%H:%M").time())
+    except ValueError:
+        raise argparse.ArgumentTypeError("Invalid busy block. Use YYYY-MM-DD HH:MM/HH:MM")
+    if end <= start:
+        raise argparse.ArgumentTypeError("A busy block must end after it starts")
+    return start, end
+
+def parse_repeat(value: str) -> dict:
+    """argparse type for repeat rules"""
+    from recurrence import parse_repeat as parse
+    try:
+        return parse(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def parse_tag(value: str) -> str:
+    """argparse type for tags"""
+    from tags import normalize_tag
+    try:
+        return normalize_tag(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def resolve_id(task_manager: TaskManager, prefix: str, ids: Optional[List[str]] = None) -> str:
+    """Expand a unique id prefix to the full task id (of the tasks, or of ids)"""
+    if ids is None and task_manager.get_task_by_id(prefix):
+        return prefix
+    if ids is None:
+        ids = [task['id'] for task in task_manager.tasks]
+    matches = [task_id for task_id in ids if task_id.startswith(prefix)]
+    if len(matches) == 1:
+        return matches[0]
+    if matches:
+        raise SystemExit(f"❌ Id prefix '{prefix}' is ambiguous ({len(matches)} tasks)")
+    raise SystemExit(f"❌ No task with id '{prefix}'")
+
+def format_task(task) -> str:
+    """One line summary of a task"""
+    status = "✓" if task['completed'] else "↻" if task.get('recurrence') else "○"
+    due = task['due_date'].strftime(DATE_FORMAT) if task['due_date'] else "-"
+    indent = "↳ " if task.get('parent_id') else ""
+    tags = "".join(f" #{tag}" for tag in task.get('tags') or ())
+    return f"{task['id'][:8]}  {status}  {task['priority']:<6}  {due:<16}  {indent}{task['description']}{tags}"
+
+def warn_duplicate(task_manager, task_id):
+    """Point at the task a new task looks like, if any"""
+    duplicate_of = task_manager.get_task_by_id(task_id).get('duplicate_of')
+    original = task_manager.get_task_by_id(duplicate_of) if duplicate_of else None
+    if original is not None:
+        print(f"⚠️  Possible duplicate of {original['id'][:8]} '{original['description']}'")
+
+def cmd_add(task_manager, args):
+    if args.repeat and not args.due:
+        raise SystemExit("❌ A repeating task needs --due")
+    parent_id = resolve_id(task_manager, args.parent) if args.parent else None
+    blocker_ids = [resolve_id(task_manager, prefix) for prefix in args.blocked_by]
+    with task_manager.batch():
+        task_id = task_manager.add_task(args.description, args.due, args.priority,
+                                        recurrence=args.repeat, parent_id=parent_id,
+                                        flag_duplicates=True, estimate=args.estimate,
+                                        tags=args.tag)
+        for blocker_id in blocker_ids:
+            task_manager.add_dependency(task_id, blocker_id)
+    print(f"✓ Added task {task_id[:8]}")
+    warn_duplicate(task_manager, task_id)
+
+def cmd_quick(task_manager, args):
+    from nl_parser import parse
+    quick = parse(" ".join(args.text), task_manager.clock.now())
+    if not quick['description']:
+        raise SystemExit("❌ Please enter a task description")
+    if args.dry_run:
+        print(quick)
+        return
+    task_id = task_manager.add_task(quick['description'], quick['due_date'],
+                                    quick['priority'] or "Medium", recurrence=quick['recurrence'],
+                                    flag_duplicates=True, tags=quick['tags'])
+    print(f"✓ Added task {task_id[:8]}")
+    print(format_task(task_manager.get_task_by_id(task_id)))
+    warn_duplicate(task_manager, task_id)
+
+def cmd_list(task_manager, args):
+    if args.as_of:
+        if args.overdue or args.actionable or args.query:
+            raise SystemExit("❌ --as-of only combines with --pending and --completed")
+        tasks = task_manager.get_tasks_as_of(args.as_of)
+        if args.pending or args.completed:
+            tasks = [task for task in tasks if task['completed'] == args.completed]
+    elif args.pending:
+        tasks = task_manager.get_pending_tasks()
+    elif args.completed:
+        tasks = task_manager.get_completed_tasks()
+    elif args.overdue:
+        tasks = task_manager.get_overdue_tasks()
+    elif args.actionable:
+        tasks = task_manager.get_actionable_tasks()
+    elif args.query:
+        try:
+            tasks = task_manager.query_tasks(args.query)
+        except ValueError as e:
+            raise SystemExit(f"❌ {e}")
+    else:
+        tasks = task_manager.get_all_tasks()
+    if args.limit:
+        tasks = tasks[:args.limit]
+    for task in tasks:
+        print(format_task(task))
+
+def cmd_complete(task_manager, args):
+    task_id = resolve_id(task_manager, args.id)
+    task_manager.mark_complete(task_id)
+    task = task_manager.get_task_by_id(task_id)
+    if task['completed']:
+        print(f"✓ Completed task {task_id[:8]}")
+    else:
+        print(f"↻ Task {task_id[:8]} next due {task['due_date'].strftime(DATE_FORMAT)}")
+
+def parse_weight(value: str) -> tuple:
+    """argparse type for ranking weights, NAME=NUMBER"""
+    from ranking import DEFAULT_WEIGHTS
+    name, _, number = value.partition("=")
+    if name not in DEFAULT_WEIGHTS:
+        raise argparse.ArgumentTypeError(f"Weight must be one of {', '.join(DEFAULT_WEIGHTS)}")
+    try:
+        return name, float(number)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid weight value: {number!r}")
+
+def cmd_next(task_manager, args):
+    if args.weight:
+        task_manager.ranker.set_weights(**dict(args.weight))
+    for task in task_manager.next_tasks(args.k, actionable_only=not args.all):
+        print(f"{task_manager.ranker.score(task):>8.1f}  {format_task(task)}")
+
+def cmd_block(task_manager, args):
+    task_id = resolve_id(task_manager, args.id)
+    blocker_id = resolve_id(task_manager, args.blocker)
+    if args.remove:
+        task_manager.remove_dependency(task_id, blocker_id)
+        print(f"✓ Task {task_id[:8]} no longer waits for {blocker_id[:8]}")
+        return
+    try:
+        task_manager.add_dependency(task_id, blocker_id)
+    except ValueError as e:
+        raise SystemExit(f"❌ {e}")
+    print(f"✓ Task {task_id[:8]} now waits for {blocker_id[:8]}")
+
+def cmd_plan(task_manager, args):
+    from datetime import timedelta
+    planner = task_manager.planner
+    for start, end in args.busy:
+        planner.add_busy(start, end)
+    now = task_manager.clock.now()
+    day = None
+    for entry in planner.plan(now, until=now + timedelta(days=args.days)):
+        task = task_manager.get_task_by_id(entry['task_id'])
+        if entry['start'].date() != day:
+            day = entry['start'].date()
+            print(f"# {entry['start'].strftime('%a %Y-%m-%d')}")
+        end_format = "%H:%M" if entry['end'].date() == day else "%a %H:%M"
+        late = "  ⚠️ late" if entry['late'] else ""
+        print(f"{entry['start'].strftime('%H:%M')}-{entry['end'].strftime(end_format)}  "
+              f"{format_task(task)}{late}")
+    late = planner.late_tasks(now)
+    if late:
+        print(f"{len(late)} task(s) cannot be finished by their due date")
+
+def cmd_related(task_manager, args):
+    task_id = resolve_id(task_manager, args.id)
+    for score, other in task_manager.similarity.related(task_id, args.k):
+        print(f"{score:>5.2f}  {format_task(task_manager.get_task_by_id(other))}")
+
+def cmd_themes(task_manager, args):
+    for number, theme in enumerate(task_manager.get_task_themes(args.k)):
+        if number:
+            print()
+        print(f"# {', '.join(theme['terms'])} ({len(theme['tasks'])} tasks)")
+        for task in theme['tasks'][:args.limit]:
+            print(format_task(task))
+
+def cmd_dupes(task_manager, args):
+    if args.threshold is not None:
+        task_manager.duplicates.threshold = args.threshold
+    groups = task_manager.duplicates.report(include_completed=args.all)
+    for number, group in enumerate(groups):
+        if number:
+            print()
+        for task_id in group:
+            print(format_task(task_manager.get_task_by_id(task_id)))
+    print(f"{len(groups)} group(s) of similar tasks")
+
+def cmd_tags(task_manager, args):
+    counts = task_manager.get_tag_counts()
+    for tag, count in sorted(counts.items(), key=lambda item: (-item[1], item[0])):
+        print(f"{count:>6}  #{tag}")
+    print(f"{len(counts)} tag(s)")
+
+def cmd_rules(task_manager, args):
+    from rules import RuleEngine, read_rules, rules_path
+    try:
+        rules = read_rules(args.path or rules_path(task_manager.data_file))
+        engine = RuleEngine(task_manager, rules)
+    except ValueError as e:
+        raise SystemExit(f"❌ {e}")
+    # Shown on copies first, so --dry-run leaves the tasks alone
+    changed = [task for task in (task.copy() for task in task_manager.tasks) if engine.apply_to(task)]
+    for task in changed:
+        print(format_task(task))
+    if not args.dry_run:
+        task_manager.set_rules(rules)
+    print(f"{len(changed)} task(s) {'would change' if args.dry_run else 'changed'}")
+
+def cmd_history(task_manager, args):
+    task_id = resolve_id(task_manager, args.id, task_manager.history.task_ids())
+    for version in task_manager.get_task_versions(task_id):
+        at = version['at'].strftime(DATE_FORMAT)
+        if 'task' in version:
+            print(f"{at}  created  {format_task(version['task'])}")
+        elif version.get('deleted'):
+            print(f"{at}  deleted")
+        else:
+            changes = ", ".join(f"{field}: {'-' if value is None else value}"
+                                for field, value in sorted(version['changes'].items()))
+            print(f"{at}  {changes}")
+
+def cmd_search(task_manager, args):
+    for task in task_manager.search_tasks(args.query):
+        print(format_task(task))
+
+def cmd_stats(task_manager, args):
+    stats = task_manager.get_task_stats()
+    print(f"Total: {stats['total']}, Completed: {stats['completed']}, "
+          f"Pending: {stats['pending']}, Overdue: {stats['overdue']}, "
+          f"Completion rate: {stats['completion_rate']:.1f}%")
+
+def report_progress(progress):
+    """Progress line for long imports and exports, on stderr"""
+    print(f"\r  {progress.count} tasks, {progress.rate:,.0f} tasks/s", end="", file=sys.stderr)
+
+def cmd_export(task_manager, args):
+    from interchange import Progress, export_file
+    progress = Progress(report_progress if args.progress else None, every=50000)
+    result = export_file(task_manager, args.path, args.format, progress)
+    if args.progress:
+        print(file=sys.stderr)
+    # Keep stdout clean when the tasks themselves go there
+    print(f"✓ Exported {result['exported']} tasks to {args.path} "
+          f"in {result['seconds']:.2f}s ({result['rate']:,.0f} tasks/s)",
+          file=sys.stderr if args.path == "-" else sys.stdout)
+
+def cmd_import(task_manager, args):
+    from interchange import Progress, import_file
+    progress = Progress(report_progress if args.progress else None, every=50000)
+    result = import_file(task_manager, args.path, args.format, args.overwrite, progress,
+                         args.flag_duplicates)
+    if args.progress:
+        print(file=sys.stderr)
+    print(f"✓ Imported {result['added']} new, {result['updated']} updated, "
+          f"{result['skipped']} skipped in {result['seconds']:.2f}s "
+          f"({result['rate']:,.0f} tasks/s)")
+    for error in result['errors']:
+        print(f"  Skipped {error}", file=sys.stderr)
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="todo", description="Personal To-Do List Assistant (command line)")
+    parser.add_argument("--file", default="tasks.json", help="task data file (default: tasks.json)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="add a task")
+    add.add_argument("description")
+    add.add_argument("--due", type=parse_due, help="due date, YYYY-MM-DD HH:MM")
+    add.add_argument("--priority", choices=PRIORITIES, default="Medium")
+    add.add_argument("--repeat", type=parse_repeat,
+                     help="repeat rule, e.g. daily, weekdays, 'every 2 weeks on mon, thu', monthly")
+    add.add_argument("--parent", help="make it a subtask of this task (id or prefix)")
+    add.add_argument("--blocked-by", action="append", default=[], metavar="ID",
+                     help="task it waits for (id or prefix), may be repeated")
+    add.add_argument("--estimate", type=int, metavar="MINUTES", help="expected effort in minutes")
+    add.add_argument("--tag", type=parse_tag, action="append", default=[],
+                     help="label the task, may be repeated")
+    add.set_defaults(func=cmd_add, mutates=True)
+
+    quick = commands.add_parser("quick", help="add a task written in plain words")
+    quick.add_argument("text", nargs="+",
+                       help="e.g. call Sam tomorrow 5pm !high, or stand-up every weekday at 9:30")
+    quick.add_argument("--dry-run", action="store_true", help="only show how it is understood")
+    quick.set_defaults(func=cmd_quick, mutates=True)
+
+    list_cmd = commands.add_parser("list", help="list tasks")
+    which = list_cmd.add_mutually_exclusive_group()
+    which.add_argument("--pending", action="store_true")
+    which.add_argument("--completed", action="store_true")
+    which.add_argument("--overdue", action="store_true")
+    which.add_argument("--actionable", action="store_true",
+                       help="pending tasks not waiting for a blocker or subtask")
+    which.add_argument("--query", metavar="EXPR",
+                       help='tag and status query, e.g. "tag:work AND NOT completed"')
+    list_cmd.add_argument("--as-of", type=parse_due, metavar="DATE",
+                          help="the tasks as they were at YYYY-MM-DD HH:MM")
+    list_cmd.add_argument("--limit", type=int, help="show at most N tasks")
+    list_cmd.set_defaults(func=cmd_list)
+
+    complete = commands.add_parser("complete", help="mark a task complete")
+    complete.add_argument("id", help="task id or unique id prefix")
+    complete.set_defaults(func=cmd_complete, mutates=True)
+
+    next_cmd = commands.add_parser("next", help="show the tasks to do next")
+    next_cmd.add_argument("-k", type=int, default=5, help="number of tasks (default: 5)")
+    next_cmd.add_argument("--weight", type=parse_weight, action="append", default=[],
+                          metavar="NAME=VALUE",
+                          help="ranking weight: priority (per level), urgency or age (per hour)")
+    next_cmd.add_argument("--all", action="store_true", help="include blocked tasks")
+    next_cmd.set_defaults(func=cmd_next)
+
+    block = commands.add_parser("block", help="make a task wait for another one")
+    block.add_argument("id", help="task that waits (id or prefix)")
+    block.add_argument("blocker", help="task it waits for (id or prefix)")
+    block.add_argument("--remove", action="store_true", help="remove the dependency instead")
+    block.set_defaults(func=cmd_block, mutates=True)
+
+    plan = commands.add_parser("plan", help="schedule pending tasks into working hours")
+    plan.add_argument("--days", type=int, default=7, help="days shown (default: 7)")
+    plan.add_argument("--busy", type=parse_busy, action="append", default=[],
+                      metavar="START/END", help="time not available for tasks, may be repeated")
+    plan.set_defaults(func=cmd_plan)
+
+    related = commands.add_parser("related", help="show tasks similar to a task")
+    related.add_argument("id", help="task id or unique id prefix")
+    related.add_argument("-k", type=int, default=5, help="number of tasks (default: 5)")
+    related.set_defaults(func=cmd_related)
+
+    themes = commands.add_parser("themes", help="group pending tasks by topic")
+    themes.add_argument("-k", type=int, default=8, help="number of themes (default: 8)")
+    themes.add_argument("--limit", type=int, default=5, help="tasks shown per theme (default: 5)")
+    themes.set_defaults(func=cmd_themes)
+
+    dupes = commands.add_parser("dupes", help="list groups of near duplicate tasks")
+    dupes.add_argument("--threshold", type=float,
+                       help="similarity (0-1) from which tasks count as duplicates (default: 0.6)")
+    dupes.add_argument("--all", action="store_true", help="include completed tasks")
+    dupes.set_defaults(func=cmd_dupes)
+
+    tags = commands.add_parser("tags", help="list tags with their number of tasks")
+    tags.set_defaults(func=cmd_tags)
+
+    rules = commands.add_parser("rules", help="tag and prioritise tasks with rules from a JSON file")
+    rules.add_argument("path", nargs="?", help="rules file (default: rules.json next to --file)")
+    rules.add_argument("--dry-run", action="store_true", help="only show the tasks that would change")
+    rules.set_defaults(func=cmd_rules, mutates=True)
+
+    history = commands.add_parser("history", help="show how a task changed over time")
+    history.add_argument("id", help="task id or unique id prefix, deleted tasks included")
+    history.set_defaults(func=cmd_history)
+
+    search = commands.add_parser("search", help="search task descriptions")
+    search.add_argument("query")
+    search.set_defaults(func=cmd_search)
+
+    stats = commands.add_parser("stats", help="show task statistics")
+    stats.set_defaults(func=cmd_stats)
+
+    export = commands.add_parser("export", help="export tasks")
+    export.add_argument("path", help="output file, or - for stdout")
+    export.set_defaults(func=cmd_export)
+
+    import_cmd = commands.add_parser("import", help="merge tasks from a file")
+    import_cmd.add_argument("path", help="input file, or - for stdin")
+    import_cmd.add_argument("--overwrite", action="store_true",
+                            help="replace tasks whose id already exists")
+    import_cmd.add_argument("--flag-duplicates", action="store_true",
+                            help="mark new tasks that look like a pending task")
+    import_cmd.set_defaults(func=cmd_import, mutates=True)
+
+    for command in (export, import_cmd):
+        command.add_argument("--format", choices=FORMATS,
+                             help="file format (default: from the extension, else json)")
+        command.add_argument("--progress", action="store_true",
+                             help="report progress and throughput while running")
+
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    task_manager = TaskManager(args.file)
+    if getattr(args, 'mutates', False):
+        task_manager.history  # record the change in the task's version history
+    args.func(task_manager, args)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from metrics import METRICS
+
+class UIEventQueue:
+    def __init__(self):
+        """
+        Thread-safe queue carrying events from background threads to Tk
+
+        Background threads call post(); the Tk main thread drains the queue
+        with root.after polling (see attach), so no widget is ever touched
+        from another thread.
+        """
+        self._queue = queue.SimpleQueue()
+        self._root = None
+        self._handler = None
+        self._interval_ms = 100
+        self._batch_limit = 500
+        self._after_id = None
+
+    def post(self, kind: str, payload: Any = None):
+        """Queue an event from any thread"""
+        self._queue.put((kind, payload))
+
+    def drain(self, max_events: Optional[int] = None) -> List[Tuple[str, Any]]:
+        """Remove and return up to max_events queued events"""
+        events = []
+        while max_events is None or len(events) < max_events:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+    def attach(self, root, handler: Callable[[List[Tuple[str, Any]]], None],
+               interval_ms: int = 100, batch_limit: int = 500):
+        """
+        Start draining the queue on the Tk main loop
+
+        Args:
+            root: Tk root window whose after() drives the polling
+            handler: Called on the main thread with each non-empty batch
+            interval_ms: Polling period in milliseconds
+            batch_limit: Maximum events handed over per poll, so a flood of
+                events cannot stall the main loop
+        """
+        self._root = root
+        self._handler = handler
+        self._interval_ms = interval_ms
+        self._batch_limit = batch_limit
+        self._schedule()
+
+    def detach(self):
+        """Stop polling"""
+        if self._root is not None and self._after_id is not None:
+            try:
+                self._root.after_cancel(self._after_id)
+            except Exception:
+                pass
+        self._after_id = None
+        self._root = None
+
+    def _schedule(self, delay_ms: Optional[int] = None):
+        if self._root is not None:
+            delay = self._interval_ms if delay_ms is None else delay_ms
+            self._after_id = self._root.after(delay, self._poll)
+
+    def _poll(self):
+        events = self.drain(self._batch_limit)
+        if events:
+            try:
+                self._handler(events)
+            except Exception as e:
+                print(f"Error handling UI events: {e}")
+        # Come back right away if the batch was cut off by the limit
+        self._schedule(0 if len(events) >= self._batch_limit else None)
+
+class LatestOnlyWorker:
+    def __init__(self, event_queue, name: str = "query-worker"):
+        """
+        Run queries on a background thread, keeping only the newest
+
+        Submitting a job supersedes every job submitted before it: queued
+        ones are skipped, a running one can stop early through the
+        cancelled() callable it receives, and results of superseded jobs
+        are never delivered.
+
+        Args:
+            event_queue: UIEventQueue results are posted to as 'query_result'
+            name: Name of the worker thread
+        """
+        self.event_queue = event_queue
+        self._condition = threading.Condition()
+        self._job = None
+        self._generation = 0
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, job: Callable[[Callable[[], bool]], Any],
+               on_result: Callable[[Any], None]) -> int:
+        """
+        Queue job(cancelled) to run in the background
+
+        on_result(result) is called on the main thread through the event
+        queue, unless a newer job was submitted in the meantime.
+        """
+        with self._condition:
+            self._generation += 1
+            self._job = (self._generation, job, on_result)
+            self._condition.notify()
+            return self._generation
+
+    def cancel(self):
+        """Supersede every submitted job without starting a new one"""
+        with self._condition:
+            self._generation += 1
+            self._job = None
+
+    def is_current(self, generation: int) -> bool:
+        """Check whether a job is still the newest one"""
+        return generation == self._generation
+
+    def deliver(self, payload):
+        """Hand a 'query_result' payload to its callback (main thread only)"""
+        generation, result, on_result = payload
+        if self.is_current(generation):
+            on_result(result)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._job is not None)
+                generation, job, on_result = self._job
+                self._job = None
+
+            cancelled = lambda: generation != self._generation
+            try:
+                result = job(cancelled)
+            except Exception as e:
+                print(f"Error in background query: {e}")
+                continue
+            if not cancelled():
+                self.event_queue.post('query_result', (generation, result, on_result))
+
+class FrameTimer:
+    def __init__(self, slow_ms: float = 16.0):
+        """
+        Measure how long Tk callbacks block the main loop
+
+        Wrapped handlers record their duration; the optional heartbeat
+        measures how late root.after callbacks run, which catches blocking
+        work anywhere on the main thread.
+
+        Args:
+            slow_ms: Durations above this are counted as slow frames
+        """
+        self.slow_ms = slow_ms
+        self.stats = {}   # name -> [count, total_ms, max_ms, slow_count]
+        self._root = None
+        self._heartbeat_ms = 50
+        self._expected = None
+
+    def record(self, name: str, elapsed_ms: float):
+        """Add one measurement"""
+        entry = self.stats.get(name)
+        if entry is None:
+            entry = self.stats[name] = [0, 0.0, 0.0, 0]
+        entry[0] += 1
+        entry[1] += elapsed_ms
+        if elapsed_ms > entry[2]:
+            entry[2] = elapsed_ms
+        if elapsed_ms > self.slow_ms:
+            entry[3] += 1
+        METRICS.observe('todo_gui_handler_seconds', elapsed_ms / 1000, handler=name)
+
+    def wrap(self, name: str, func: Callable) -> Callable:
+        """Return func wrapped to record its duration under name"""
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(name, (time.perf_counter() - start) * 1000)
+        return timed
+
+    def start_heartbeat(self, root, interval_ms: int = 50):
+        """Track main loop lag with a periodic root.after callback"""
+        self._root = root
+        self._heartbeat_ms = interval_ms
+        self._expected = time.perf_counter() + interval_ms / 1000
+        root.after(interval_ms, self._beat)
+
+    def _beat(self):
+        now = time.perf_counter()
+        self.record('event_loop_lag', max(0.0, (now - self._expected) * 1000))
+        self._expected = now + self._heartbeat_ms / 1000
+        self._root.after(self._heartbeat_ms, self._beat)
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """Summary per name: count, mean_ms, max_ms and slow frame count"""
+        return {
+            name: {
+                'count': count,
+                'mean_ms': round(total / count, 3) if count else 0.0,
+                'max_ms': round(worst, 3),
+                'slow': slow,
+            }
+            for name, (count, total, worst, slow) in self.stats.items()
+        }